@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    # A unique temp name per write: several worker processes share the directory
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, prefix=f".{path.stem}-", suffix=".tmp", delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, default=str)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+def _file_name(email_id: str) -> str:
+    # Graph IDs can contain characters that are awkward in file names
+    return hashlib.sha256(email_id.encode("utf-8")).hexdigest() + ".json"
+
+
+class CheckpointStore:
+    """
+    Per-email stage outputs, one JSON file per email ID.
+
+    Lets a retry (or a replay from the dead-letter store) pick up from the
+    last completed stage instead of repeating Graph calls and the LLM.
+    """
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, email_id: str) -> Path:
+        return self.root / _file_name(email_id)
+
+    def load(self, email_id: str) -> Dict[str, Any]:
+        """Returns {stage: payload} for every stage saved so far."""
+        path = self._path(email_id)
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("stages", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint for {email_id}: {e}")
+            return {}
+
+    def save(self, email_id: str, stage: str, payload: Any) -> None:
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            stages = self.load(email_id)
+            stages[stage] = payload
+            _write_json_atomic(self._path(email_id), {"email_id": email_id, "stages": stages})
+
+    def clear(self, email_id: str) -> None:
+        with self._lock:
+            try:
+                self._path(email_id).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class DeadLetterStore:
+    """Emails that exhausted their retries (or failed validation), one JSON file each."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, email_id: str) -> Path:
+        return self.root / _file_name(email_id)
+
+    def add(self, email_id: str, stage: str, error: str, attempts: int, mailbox: Optional[str] = None) -> None:
+        record = {
+            "email_id": email_id,
+            "mailbox": mailbox,
+            "stage": stage,
+            "error": error,
+            "attempts": attempts,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            _write_json_atomic(self._path(email_id), record)
+        logger.error(f"[DEAD_LETTER] {email_id} failed at '{stage}' after {attempts} attempt(s): {error}")
+
+    def get(self, email_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(email_id)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.root.exists():
+            return []
+        records = []
+        for path in sorted(self.root.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable dead letter {path.name}: {e}")
+        return sorted(records, key=lambda r: r.get("failed_at", ""))
+
+    def remove(self, email_id: str) -> bool:
+        with self._lock:
+            try:
+                self._path(email_id).unlink()
+                return True
+            except FileNotFoundError:
+                return False
+
+
+checkpoint_store = CheckpointStore(settings.CHECKPOINT_DIR)
+dead_letter_store = DeadLetterStore(settings.DEAD_LETTER_DIR)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 from pathlib import Path
 
 class Settings(BaseSettings):
@@ -8,6 +8,14 @@ class Settings(BaseSettings):
     CLIENT_SECRET: Optional[str] = None
     GRAPH_USER_IDENTIFIER: str
     MAILBOX_UPN: str
+    # All mailboxes to ingest from, as a JSON list, e.g.
+    # MAILBOX_UPNS='["quotes-emea@example.com", "quotes-apac@example.com"]'.
+    # Empty means only MAILBOX_UPN. The signed-in account needs access to each
+    # one (delegated Mail.Read.Shared is requested when there are several).
+    MAILBOX_UPNS: List[str] = []
+    # Max jobs per mailbox talking to Graph at once, so one throttled or
+    # noisy mailbox cannot occupy every worker
+    MAILBOX_MAX_IN_FLIGHT: int = 4
     WEBHOOK_NOTIFICATION_URL: str
     CLIENT_STATE_SECRET: str
     GOOGLE_API_KEY: str
@@ -16,10 +24,206 @@ class Settings(BaseSettings):
     
     # --- THIS IS THE MISSING LINE ---
     HARDCODED_ACCESS_TOKEN: Optional[str] = None
+    # Point at a local stand-in for offline benchmarks
+    GRAPH_BASE_URL: str = "https://graph.microsoft.com/v1.0"
+
+    # --- Graph subscriptions ---
+    # Graph caps message subscriptions at 4230 minutes (just under 3 days)
+    SUBSCRIPTION_LIFETIME_MINUTES: int = 2 * 24 * 60
+    # The leader keeps every mailbox's subscription alive, renewing with
+    # PATCH once less than SUBSCRIPTION_RENEW_BEFORE_MINUTES remain
+    SUBSCRIPTION_AUTO_RENEW: bool = True
+    SUBSCRIPTION_RENEW_BEFORE_MINUTES: int = 12 * 60
+    SUBSCRIPTION_CHECK_SECONDS: float = 300.0
+    # Rich notifications: Graph sends the message itself (encrypted with
+    # this certificate) so jobs skip the first Graph fetch. Create the pair
+    # with generate_notification_cert.py. Graph limits such subscriptions
+    # to one day.
+    RICH_NOTIFICATIONS_ENABLED: bool = False
+    NOTIFICATION_CERT_PATH: Path = Path("/app/data/notification_cert.pem")
+    NOTIFICATION_KEY_PATH: Path = Path("/app/data/notification_key.pem")
+    NOTIFICATION_CERT_ID: str = "qtc-notifications-1"
+
+    # --- Master data ---
+    # CSV export of the client master (client_id, client_name[, aliases,
+    # domains]); extracted client names are resolved against it
+    CLIENT_MASTER_CSV: Optional[Path] = None
+    # Minimum trigram similarity (0-1) for a fuzzy client-name match
+    CLIENT_MATCH_THRESHOLD: float = 0.75
+    # A fuzzy match must beat the best other client by this much, or the
+    # name is treated as ambiguous and left as extracted
+    CLIENT_MATCH_MARGIN: float = 0.05
+    # Port/location index (UN/LOCODE-style: locode, name, country_names)
+    # and our aliases for it; extracted ports are normalized against them
+    PORTS_CSV: Path = Path(__file__).resolve().parent.parent / "data" / "ports.csv"
+    PORT_ALIASES_CSV: Optional[Path] = Path(__file__).resolve().parent.parent / "data" / "port_aliases.csv"
+    PORT_MATCH_THRESHOLD: float = 0.7
+
+    # --- Browser pool (Playwright) ---
+    BROWSER_POOL_ENABLED: bool = True
+    BROWSER_POOL_SIZE: int = 1
+    BROWSER_HEADLESS: bool = True
+    BROWSER_SLOW_MO: int = 50
+    BROWSER_MAX_USES: int = 50
+    BROWSER_MAX_RSS_MB: int = 1024
+
+    # --- QTC form automation ---
+    # The Power App the form automation opens (set per environment)
+    QTC_APP_URL: str = "https://houseofshipping.sharepoint.com/sites/Team-DataScienceAI/..."
+    # JSON object of locators for the deployed form, overriding the
+    # defaults in app/services/qtc_form.py key by key
+    QTC_SELECTORS_FILE: Optional[Path] = None
+    # Fast mode blocks media/analytics/telemetry requests and drops slow_mo.
+    PLAYWRIGHT_FAST_MODE: bool = True
+    QTC_NAVIGATION_TIMEOUT_MS: int = 60000
+    QTC_STEP_TIMEOUT_MS: int = 15000
+    # "sync" uses the browser pool (one page per browser); "async" fills
+    # up to PLAYWRIGHT_CONCURRENCY forms at once in a single browser.
+    PLAYWRIGHT_ENGINE: Literal["sync", "async"] = "sync"
+    PLAYWRIGHT_CONCURRENCY: int = 4
+    # Longest a caller waits for the async engine to fill one form, queue time included
+    QTC_SUBMISSION_TIMEOUT_SECONDS: float = 600.0
+
+    # --- QTC submission backend ---
+    # "playwright" drives the Power App UI; "http" posts the record
+    # straight to the app's data source (e.g. the SharePoint list items
+    # endpoint on Graph: .../sites/{site-id}/lists/{list-id}/items).
+    SUBMISSION_BACKEND: Literal["playwright", "http"] = "playwright"
+    QTC_HTTP_ENDPOINT: Optional[str] = None
+    # "graph": a delegated token for QTC_HTTP_SCOPES from the token cache
+    # (consented by generate_user_tokens.py); "bearer": QTC_HTTP_TOKEN
+    QTC_HTTP_AUTH: Literal["graph", "bearer", "none"] = "graph"
+    # The Mail scopes the jobs use cannot write list items
+    QTC_HTTP_SCOPES: List[str] = ["https://graph.microsoft.com/Sites.ReadWrite.All"]
+    QTC_HTTP_TOKEN: Optional[str] = None
+    QTC_HTTP_TIMEOUT: int = 30
+    # Start loading the QTC form while Gemini is still extracting. A warm-up
+    # holds a browser (or page) for the whole LLM call, so it only happens
+    # while another stays free for submissions that are ready now; with
+    # BROWSER_POOL_SIZE=1 it never does.
+    SPECULATIVE_WARMUP: bool = False
+
+    # --- Job dispatch ---
+    # "inline" runs each email as one background task; "pipeline" feeds the
+    # staged pipeline in app/pipeline.py; "queue" writes to the SQLite job
+    # queue drained by separate job-worker processes (set by app/server.py).
+    JOB_DISPATCH: Literal["inline", "pipeline", "queue"] = "inline"
+    PIPELINE_QUEUE_SIZE: int = 50
+    PIPELINE_FETCH_WORKERS: int = 20
+    PIPELINE_PARSE_WORKERS: int = 2
+    PIPELINE_EXTRACT_WORKERS: int = 4
+    PIPELINE_LLM_WORKERS: int = 8
+    PIPELINE_SUBMIT_WORKERS: int = 4
+    # How long the webhook waits for room in the first queue before
+    # answering 503 so Graph redelivers later
+    PIPELINE_INGEST_TIMEOUT: float = 2.0
+
+    # --- LLM extraction ---
+    # Emails that reach extraction while another Gemini request is out wait
+    # up to LLM_BATCH_WINDOW_MS and share one request (rules and schema sent
+    # once). An email arriving when nothing is out goes alone at once.
+    LLM_BATCHING_ENABLED: bool = True
+    LLM_BATCH_WINDOW_MS: int = 500
+    LLM_BATCH_MAX_DOCUMENTS: int = 8
+    # Estimated input tokens (characters / 4) of the contexts in one batch
+    LLM_BATCH_MAX_TOKENS: int = 100000
+
+    # --- Gemini quota (per process; split the project quota across
+    # API_WORKERS / JOB_WORKER_PROCESSES and replicas) ---
+    GEMINI_REQUESTS_PER_MINUTE: int = 150
+    GEMINI_TOKENS_PER_MINUTE: int = 2000000
+    # Requests in flight adapt between these: +1 per window of successes,
+    # halved on a 429, -10% when latency per token exceeds the average by
+    # GEMINI_LATENCY_SPIKE_FACTOR
+    GEMINI_MIN_CONCURRENCY: int = 1
+    GEMINI_MAX_CONCURRENCY: int = 16
+    GEMINI_INITIAL_CONCURRENCY: int = 4
+    GEMINI_LATENCY_SPIKE_FACTOR: float = 2.0
+    GEMINI_MAX_RETRIES: int = 3
+    GEMINI_RETRY_BASE_SECONDS: float = 5.0
+    GEMINI_RETRY_MAX_SECONDS: float = 60.0
+
+    # --- Priority scheduling ---
+    # Emails are scored (app/priority.py) and the pipeline queues and job
+    # queue serve higher scores first. Sender domains of key clients, as a JSON list:
+    PRIORITY_SENDER_DOMAINS: List[str] = []
+    # Nearly every email here asks for a quote, so "quote"/"quotation"/"rfq"
+    # would mark them all urgent; only words that set one apart belong here
+    PRIORITY_URGENT_KEYWORDS: List[str] = ["urgent", "asap", "bid", "tender"]
+    PRIORITY_BULK_KEYWORDS: List[str] = [
+        "budgetary", "budgeting", "costing purpose", "estimation",
+        "newsletter", "unsubscribe", "webinar", "promotion",
+    ]
+    # A waiting job gains this much score per minute, so low priorities still run
+    PRIORITY_AGING_PER_MINUTE: float = 0.1
+    # End-to-end target per priority class; a job this close to its deadline
+    # jumps the queue (earliest deadline first)
+    PRIORITY_SLA_SECONDS: Dict[str, float] = {"high": 600.0, "normal": 1800.0, "low": 14400.0}
+    PRIORITY_DEADLINE_LEAD_SECONDS: float = 120.0
+
+    # --- Production serving (python -m app.server) ---
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    API_WORKERS: int = 2
+    JOB_WORKER_PROCESSES: int = 2
+    JOB_WORKER_THREADS: int = 2
+    JOB_QUEUE_PATH: Path = Path("/app/data/jobs.sqlite3")
+    JOB_POLL_INTERVAL: float = 1.0
+    WORKER_HEARTBEAT_SECONDS: float = 10.0
+    # A worker silent for this long is considered dead and its jobs are requeued
+    WORKER_HEARTBEAT_TIMEOUT: float = 60.0
+
+    # --- Replica coordination ---
+    # "memory" keeps the leases in each process: every process is its own
+    # leader, so it only suits a single process (app.server runs the
+    # singleton duties in its supervisor for that reason). "sqlite" shares
+    # COORDINATION_DB_PATH (put it on a volume every replica mounts) for
+    # per-email leases, so an email runs on exactly one process, and for
+    # electing the leader that runs singleton duties.
+    COORDINATION_BACKEND: Literal["memory", "sqlite"] = "memory"
+    COORDINATION_DB_PATH: Path = Path("/app/data/coordination.sqlite3")
+    # Names this replica in lease holders; defaults to the host name
+    REPLICA_ID: str = ""
+    # A lease not renewed for this long is free to take over
+    LEASE_TTL_SECONDS: float = 60.0
+    LEASE_HEARTBEAT_SECONDS: float = 15.0
+
+    # --- Conversations ---
+    # Extractions indexed by Graph conversationId: a follow-up in a thread
+    # sends only its new text to Gemini, merged into the earlier form
+    CONVERSATIONS_ENABLED: bool = True
+    CONVERSATION_DB_PATH: Path = Path("/app/data/conversations.sqlite3")
+    CONVERSATION_RETENTION_DAYS: int = 30
+
+    # --- Checkpoints, retries and dead letters ---
+    CHECKPOINTS_ENABLED: bool = True
+    CHECKPOINT_DIR: Path = Path("/app/data/checkpoints")
+    DEAD_LETTER_DIR: Path = Path("/app/data/dead_letters")
+    JOB_MAX_ATTEMPTS: int = 4
+    JOB_RETRY_BASE_SECONDS: float = 5.0
+    JOB_RETRY_MAX_SECONDS: float = 300.0
+
+    # --- Tracing ---
+    # One JSON line per email with its span tree
+    TRACING_ENABLED: bool = True
+    TRACE_EXPORT_PATH: Path = Path("/app/data/traces.jsonl")
+    # The export is rotated to traces.jsonl.1 .. .N once it passes this size
+    TRACE_EXPORT_MAX_MB: int = 100
+    TRACE_EXPORT_BACKUPS: int = 3
+    # Jobs slower than this keep the stack profile of their parse/extract stages
+    TRACE_SLOW_JOB_SECONDS: float = 90.0
+    # Fraction of jobs that run the stack sampler at all (a thread per job)
+    TRACE_PROFILE_SAMPLE_RATE: float = 0.05
+    TRACE_PROFILE_INTERVAL_MS: int = 10
+    PROFILE_DIR: Path = Path("/app/data/profiles")
 
     class Config:
         env_file = Path(__file__).resolve().parent.parent.parent / ".env"
         env_file_encoding = 'utf-8'
         case_sensitive = True
 
+    @property
+    def mailboxes(self) -> List[str]:
+        return self.MAILBOX_UPNS or [self.MAILBOX_UPN]
+
 settings = Settings()
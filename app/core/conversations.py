@@ -0,0 +1,88 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.sqlite import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    email_id TEXT NOT NULL,
+    -- Graph receivedDateTime of that email (ISO 8601, so it sorts as text)
+    received_at TEXT NOT NULL,
+    form TEXT NOT NULL,
+    context TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated_at);
+"""
+
+
+class ConversationStore:
+    """
+    The latest extraction per Graph conversation (email thread): the
+    validated QTC form and the LLM context it came from (subject, table
+    and parsed attachment text). A follow-up in the thread starts from
+    these instead of re-parsing and re-extracting everything.
+
+    SQLite, so replicas sharing CONVERSATION_DB_PATH share the index.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = SQLiteDatabase(path)
+        self.db.connection().executescript(_SCHEMA)
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """{"email_id", "received_at", "form", "context"} of the thread's latest extraction, if any."""
+        row = self.db.connection().execute(
+            "SELECT email_id, received_at, form, context FROM conversations WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"email_id": row[0], "received_at": row[1], "form": json.loads(row[2]), "context": row[3]}
+
+    def save(self, conversation_id: str, email_id: str, received_at: str, form: Dict[str, Any], context: str) -> bool:
+        """
+        Records an extraction unless the thread already has one from a
+        newer email (follow-ups can finish out of order). True if stored.
+        """
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO conversations (conversation_id, email_id, received_at, form, context, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET email_id = excluded.email_id, "
+                "received_at = excluded.received_at, form = excluded.form, context = excluded.context, "
+                "updated_at = excluded.updated_at "
+                "WHERE excluded.received_at >= conversations.received_at",
+                (conversation_id, email_id, received_at, json.dumps(form, default=str), context, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def prune(self, older_than_seconds: float) -> int:
+        with self.db.transaction() as db:
+            cursor = db.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - older_than_seconds,))
+            return cursor.rowcount
+
+
+# --- Process-wide store ---
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+def get_conversation_store() -> ConversationStore:
+    """The store at CONVERSATION_DB_PATH, opened (and pruned of stale threads) on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(settings.CONVERSATION_DB_PATH)
+            pruned = _store.prune(settings.CONVERSATION_RETENTION_DAYS * 86400)
+            if pruned:
+                logger.info(f"Pruned {pruned} conversation(s) idle for over {settings.CONVERSATION_RETENTION_DAYS} days.")
+        return _store
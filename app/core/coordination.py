@@ -0,0 +1,345 @@
+import logging
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.sqlite import SQLiteDatabase
+from app.core.metrics import LEADER
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = "leader"
+# Completed emails are remembered this long so a redelivered notification
+# (to any replica) is not processed again
+COMPLETED_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def _email_lease(email_id: str) -> str:
+    return f"email:{email_id}"
+
+
+class CoordinationBackend(ABC):
+    """
+    Named leases shared by all replicas. A lease has one holder until it
+    expires (the holder stopped heartbeating) or is released; a lease
+    released as completed is not granted again until it is forgotten.
+    """
+    @abstractmethod
+    def acquire(self, name: str, holder: str, ttl: float, mailbox: Optional[str] = None) -> bool:
+        """Takes (or re-takes) the lease. False if another holder has it or it is completed."""
+
+    @abstractmethod
+    def release(self, name: str, holder: str, completed: bool = False) -> None:
+        """Gives the lease up; a `completed` one stays, so it is not granted again."""
+
+    @abstractmethod
+    def forget(self, name: str) -> bool:
+        """Drops a completed lease so it can be acquired again. True if there was one."""
+
+    @abstractmethod
+    def is_completed(self, name: str) -> bool:
+        """True if the lease was released as completed (and not forgotten since)."""
+
+    @abstractmethod
+    def renew(self, holder: str, ttl: float) -> int:
+        """Extends every open lease of `holder`. Returns how many were renewed."""
+
+    @abstractmethod
+    def take_over_expired(self, holder: str, ttl: float, prefix: str) -> List[Tuple[str, Optional[str]]]:
+        """Moves expired, uncompleted leases under `prefix` to `holder`. Returns (name, mailbox) pairs."""
+
+    @abstractmethod
+    def prune(self, older_than_seconds: float) -> int:
+        """Forgets completed leases."""
+
+
+class MemoryCoordination(CoordinationBackend):
+    """Single-replica backend: the same semantics, kept in this process."""
+
+    def __init__(self) -> None:
+        # name -> [holder, expires_at, mailbox, completed_at]
+        self._leases: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str, holder: str, ttl: float, mailbox: Optional[str] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and (lease[3] is not None or (lease[0] != holder and lease[1] > now)):
+                return False
+            self._leases[name] = [holder, now + ttl, mailbox or (lease and lease[2]), None]
+            return True
+
+    def release(self, name: str, holder: str, completed: bool = False) -> None:
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is None or lease[0] != holder:
+                return
+            if completed:
+                lease[3] = time.time()
+            else:
+                del self._leases[name]
+
+    def forget(self, name: str) -> bool:
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is None or lease[3] is None:
+                return False
+            del self._leases[name]
+            return True
+
+    def is_completed(self, name: str) -> bool:
+        with self._lock:
+            lease = self._leases.get(name)
+            return lease is not None and lease[3] is not None
+
+    def renew(self, holder: str, ttl: float) -> int:
+        expires_at = time.time() + ttl
+        renewed = 0
+        with self._lock:
+            for lease in self._leases.values():
+                if lease[0] == holder and lease[3] is None:
+                    lease[1] = expires_at
+                    renewed += 1
+        return renewed
+
+    def take_over_expired(self, holder: str, ttl: float, prefix: str) -> List[Tuple[str, Optional[str]]]:
+        now = time.time()
+        taken = []
+        with self._lock:
+            for name, lease in self._leases.items():
+                if name.startswith(prefix) and lease[3] is None and lease[1] <= now:
+                    lease[0], lease[1] = holder, now + ttl
+                    taken.append((name, lease[2]))
+        return taken
+
+    def prune(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            old = [name for name, lease in self._leases.items() if lease[3] is not None and lease[3] < cutoff]
+            for name in old:
+                del self._leases[name]
+        return len(old)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name         TEXT PRIMARY KEY,
+    holder       TEXT NOT NULL,
+    expires_at   REAL NOT NULL,
+    mailbox      TEXT,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS leases_by_holder ON leases (holder);
+"""
+
+
+class SQLiteCoordination(CoordinationBackend):
+    """
+    Leases in a SQLite file that every replica opens, e.g. on a shared
+    volume. BEGIN IMMEDIATE serialises the check-and-take of a lease.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = SQLiteDatabase(path)
+        self.db.connection().executescript(_SCHEMA)
+
+    def acquire(self, name: str, holder: str, ttl: float, mailbox: Optional[str] = None) -> bool:
+        now = time.time()
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO leases (name, holder, expires_at, mailbox) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at, "
+                "mailbox = COALESCE(excluded.mailbox, leases.mailbox) "
+                "WHERE leases.completed_at IS NULL AND (leases.holder = excluded.holder OR leases.expires_at <= ?)",
+                (name, holder, now + ttl, mailbox, now),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name: str, holder: str, completed: bool = False) -> None:
+        with self.db.transaction() as db:
+            if completed:
+                db.execute(
+                    "UPDATE leases SET completed_at = ? WHERE name = ? AND holder = ?",
+                    (time.time(), name, holder),
+                )
+            else:
+                db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def forget(self, name: str) -> bool:
+        with self.db.transaction() as db:
+            return db.execute("DELETE FROM leases WHERE name = ? AND completed_at IS NOT NULL", (name,)).rowcount == 1
+
+    def is_completed(self, name: str) -> bool:
+        row = self.db.connection().execute(
+            "SELECT 1 FROM leases WHERE name = ? AND completed_at IS NOT NULL", (name,)
+        ).fetchone()
+        return row is not None
+
+    def renew(self, holder: str, ttl: float) -> int:
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "UPDATE leases SET expires_at = ? WHERE holder = ? AND completed_at IS NULL",
+                (time.time() + ttl, holder),
+            )
+            return cursor.rowcount
+
+    def take_over_expired(self, holder: str, ttl: float, prefix: str) -> List[Tuple[str, Optional[str]]]:
+        now = time.time()
+        with self.db.transaction() as db:
+            rows = db.execute(
+                "SELECT name, mailbox FROM leases WHERE name LIKE ? AND completed_at IS NULL AND expires_at <= ?",
+                (prefix + "%", now),
+            ).fetchall()
+            db.executemany(
+                "UPDATE leases SET holder = ?, expires_at = ? WHERE name = ?",
+                [(holder, now + ttl, name) for name, _ in rows],
+            )
+        return [(name, mailbox) for name, mailbox in rows]
+
+    def prune(self, older_than_seconds: float) -> int:
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM leases WHERE completed_at IS NOT NULL AND completed_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+            return cursor.rowcount
+
+
+class Coordinator:
+    """
+    This process's view of the replica group: per-email leases (so each
+    email runs on one replica only) and leader election for singleton
+    duties. A heartbeat thread renews this process's leases, competes for
+    the leader lease and, as leader, takes over emails whose holder died
+    and hands them to `on_orphans`.
+    """
+    def __init__(self, backend: CoordinationBackend, replica_id: str):
+        self.backend = backend
+        self.holder = f"{replica_id}-{os.getpid()}"
+        self.ttl = settings.LEASE_TTL_SECONDS
+        self.on_orphans: Optional[Callable[[List[Tuple[str, Optional[str]]]], None]] = None
+        self._leader = False
+        self._lead = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, lead: bool = True) -> None:
+        """
+        Starts the heartbeat. With `lead=False` it only renews this
+        process's email leases and never stands for leader (one-off tools
+        such as manage_dead_letters.py).
+        """
+        if self._thread is not None:
+            return
+        self._lead = lead
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="coordination", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._leader:
+            self.backend.release(LEADER_LEASE, self.holder)
+            self._set_leader(False)
+
+    # --- Email leases ---
+
+    def claim_email(self, email_id: str, mailbox: Optional[str] = None) -> bool:
+        """True if this process may run the email (it now holds the lease)."""
+        return self.backend.acquire(_email_lease(email_id), self.holder, self.ttl, mailbox)
+
+    def release_email(self, email_id: str, completed: bool) -> None:
+        """Gives the lease up; `completed` keeps other replicas from ever running the email."""
+        try:
+            self.backend.release(_email_lease(email_id), self.holder, completed)
+        except Exception as e:
+            # The lease expires on its own; only a duplicate run is at stake
+            logger.error(f"Could not release the lease for {email_id}: {e}")
+
+    def email_completed(self, email_id: str) -> bool:
+        """True if some replica finished the email (its lease was released as completed)."""
+        return self.backend.is_completed(_email_lease(email_id))
+
+    def reopen_email(self, email_id: str) -> None:
+        """
+        Forgets the email's completed lease so it can be claimed again. For
+        deliberate reruns (dead-letter replay) only: the completed lease is
+        what keeps redelivered notifications from running it twice. A lease
+        some process still holds is left alone.
+        """
+        if self.backend.forget(_email_lease(email_id)):
+            logger.info(f"Reopened the lease for {email_id}.")
+
+    # --- Leadership ---
+
+    def is_leader(self) -> bool:
+        return self._leader
+
+    def _set_leader(self, leader: bool) -> None:
+        if leader != self._leader:
+            logger.info(f"{self.holder} {'is now' if leader else 'is no longer'} the leader.")
+        self._leader = leader
+        LEADER.set(1 if leader else 0)
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            try:
+                self._heartbeat()
+            except Exception as e:
+                # Can't confirm leadership, so stop acting as leader
+                logger.warning(f"Coordination heartbeat failed: {e}")
+                self._set_leader(False)
+            if self._stop.wait(settings.LEASE_HEARTBEAT_SECONDS):
+                return
+
+    def _heartbeat(self) -> None:
+        # Renews the leader lease too, if held
+        self.backend.renew(self.holder, self.ttl)
+        if not self._lead:
+            return
+        self._set_leader(self.backend.acquire(LEADER_LEASE, self.holder, self.ttl))
+        if not self._leader:
+            return
+        self.backend.prune(COMPLETED_RETENTION_SECONDS)
+        orphans = self.backend.take_over_expired(self.holder, self.ttl, _email_lease(""))
+        if orphans:
+            logger.warning(f"Took over {len(orphans)} email(s) from replicas that stopped heartbeating.")
+            emails = [(name[len(_email_lease("")):], mailbox) for name, mailbox in orphans]
+            if self.on_orphans:
+                self.on_orphans(emails)
+            else:
+                for email_id, _ in emails:
+                    self.release_email(email_id, completed=False)
+
+
+# --- Process-wide coordinator ---
+
+_coordinator: Optional[Coordinator] = None
+_coordinator_lock = threading.Lock()
+
+def get_coordinator() -> Coordinator:
+    """Returns this process's coordinator, created from settings on first use."""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            if settings.COORDINATION_BACKEND == "sqlite":
+                backend: CoordinationBackend = SQLiteCoordination(settings.COORDINATION_DB_PATH)
+            else:
+                backend = MemoryCoordination()
+            _coordinator = Coordinator(backend, settings.REPLICA_ID or socket.gethostname())
+        return _coordinator
+
+def shutdown_coordinator() -> None:
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is not None:
+            _coordinator.stop()
+            _coordinator = None
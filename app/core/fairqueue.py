@@ -0,0 +1,175 @@
+import itertools
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class _Entry:
+    item: Any
+    priority: float
+    # Aging counts from here (monotonic), e.g. when the job was created
+    since: float
+    deadline: Optional[float]
+    seq: int
+
+
+class FairQueue:
+    """
+    A blocking queue made of one bounded sub-queue per key (mailbox).
+
+    `get()` serves keys round-robin, so a key with a deep backlog cannot
+    starve the others; `put()` only blocks when that key's own sub-queue
+    is full. A key can also be capped in how many of its items are being
+    worked on at once (`max_in_flight_per_key`, released by `task_done`)
+    and paused for a while, e.g. when Graph throttles that mailbox.
+
+    Items may carry a priority and a deadline. Each key serves its best
+    item first: any item within `deadline_lead` seconds of its deadline
+    (earliest deadline first), else the highest priority plus
+    `aging_per_second` for every second since the item's `since`, so low
+    priorities cannot starve. Across keys, the key whose best item is due
+    or sits on a higher whole priority level goes first; keys on the same
+    level still take turns. With no priorities this is plain FIFO per key.
+    """
+    def __init__(
+        self,
+        maxsize_per_key: int,
+        max_in_flight_per_key: Optional[int] = None,
+        aging_per_second: float = 0.0,
+        deadline_lead: float = 0.0,
+    ):
+        self.maxsize_per_key = maxsize_per_key
+        self.max_in_flight_per_key = max_in_flight_per_key
+        self.aging_per_second = aging_per_second
+        self.deadline_lead = deadline_lead
+        self._queues: "OrderedDict[str, List[_Entry]]" = OrderedDict()
+        self._seq = itertools.count()
+        self._in_flight: Dict[str, int] = {}
+        # Room held per key by reserve() for a batch about to be put
+        self._reserved: Dict[str, int] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._control: Deque[Any] = deque()
+        self._cond = threading.Condition()
+
+    def put(
+        self,
+        key: str,
+        item: Any,
+        timeout: Optional[float] = None,
+        priority: float = 0.0,
+        deadline: Optional[float] = None,
+        since: Optional[float] = None,
+        reserved: bool = False,
+    ) -> None:
+        """
+        Blocks while `key`'s sub-queue is full; raises queue.Full after
+        `timeout`. `deadline` and `since` are time.monotonic() values.
+        With `reserved`, uses room held by `reserve()` and never blocks.
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            pending = self._queues.setdefault(key, [])
+            if reserved:
+                self._reserved[key] = max(0, self._reserved.get(key, 0) - 1)
+            while not reserved and self.maxsize_per_key and len(pending) + self._reserved.get(key, 0) >= self.maxsize_per_key:
+                remaining = None if give_up_at is None else give_up_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self._cond.wait(remaining)
+            since = time.monotonic() if since is None else since
+            pending.append(_Entry(item, priority, since, deadline, next(self._seq)))
+            self._cond.notify_all()
+
+    def reserve(self, key: str, count: int, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until `key`'s sub-queue has room for `count` more items and
+        holds it for `put(..., reserved=True)`; raises queue.Full after
+        `timeout`. A batch larger than the sub-queue waits for it to empty.
+        Room that will not be used must be given back with `unreserve()`.
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            pending = self._queues.setdefault(key, [])
+            needed = min(count, self.maxsize_per_key)
+            while self.maxsize_per_key and len(pending) + self._reserved.get(key, 0) + needed > self.maxsize_per_key:
+                remaining = None if give_up_at is None else give_up_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self._cond.wait(remaining)
+            self._reserved[key] = self._reserved.get(key, 0) + count
+
+    def unreserve(self, key: str, count: int) -> None:
+        with self._cond:
+            self._reserved[key] = max(0, self._reserved.get(key, 0) - count)
+            self._cond.notify_all()
+
+    def put_control(self, item: Any) -> None:
+        """Queues an item (e.g. a stop sentinel) that is served before any key."""
+        with self._cond:
+            self._control.append(item)
+            self._cond.notify_all()
+
+    def get(self) -> Tuple[Optional[str], Any]:
+        """Returns (key, item) for the next eligible key in rotation; (None, item) for control items."""
+        with self._cond:
+            while True:
+                if self._control:
+                    return None, self._control.popleft()
+                now = time.monotonic()
+                wake_at = None
+                chosen: Optional[Tuple[Tuple[Any, ...], str, int]] = None
+                for key, pending in self._queues.items():
+                    if not pending:
+                        continue
+                    paused_until = self._paused_until.get(key, 0.0)
+                    if paused_until > now:
+                        wake_at = paused_until if wake_at is None else min(wake_at, paused_until)
+                        continue
+                    if self.max_in_flight_per_key and self._in_flight.get(key, 0) >= self.max_in_flight_per_key:
+                        continue
+                    rank, index = max((self._rank(entry, now), i) for i, entry in enumerate(pending))
+                    # Strictly better only, so keys on the same level keep their turn order
+                    if chosen is None or rank[:3] > chosen[0][:3]:
+                        chosen = (rank, key, index)
+                if chosen is not None:
+                    _, key, index = chosen
+                    # Rotate: the served key goes to the back of the line
+                    self._queues.move_to_end(key)
+                    self._in_flight[key] = self._in_flight.get(key, 0) + 1
+                    entry = self._queues[key].pop(index)
+                    self._cond.notify_all()
+                    return key, entry.item
+                self._cond.wait(None if wake_at is None else wake_at - now)
+
+    def _rank(self, entry: _Entry, now: float) -> Tuple[Any, ...]:
+        """Sort key, higher first: (due, earliest deadline, priority level, exact priority, oldest)."""
+        due = entry.deadline is not None and entry.deadline - now <= self.deadline_lead
+        effective = entry.priority + self.aging_per_second * (now - entry.since)
+        return (due, -entry.deadline if due else 0.0, math.floor(effective), effective, -entry.seq)
+
+    def task_done(self, key: Optional[str]) -> None:
+        """Marks an item from `key` as no longer being worked on."""
+        if key is None:
+            return
+        with self._cond:
+            self._in_flight[key] = max(0, self._in_flight.get(key, 0) - 1)
+            self._cond.notify_all()
+
+    def pause(self, key: str, seconds: float) -> None:
+        """Holds back `key`'s items for `seconds` (other keys are unaffected)."""
+        with self._cond:
+            self._paused_until[key] = max(self._paused_until.get(key, 0.0), time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return sum(len(pending) for pending in self._queues.values())
+
+    def sizes(self) -> Dict[str, int]:
+        with self._cond:
+            return {key: len(pending) for key, pending in self._queues.items()}
@@ -0,0 +1,242 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import JOB_QUEUE_DEPTH
+from app.core.sqlite import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    email_id    TEXT PRIMARY KEY,
+    mailbox     TEXT NOT NULL DEFAULT '',
+    status      TEXT NOT NULL,          -- pending | running | done
+    enqueued_at REAL NOT NULL,
+    claimed_by  TEXT,
+    claimed_at  REAL,
+    finished_at REAL,
+    -- A released job is not claimed again before this time
+    not_before  REAL,
+    -- Score from app/priority.py and SLA deadline (epoch seconds), set at enqueue
+    priority    REAL NOT NULL DEFAULT 0,
+    deadline    REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, enqueued_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id    TEXT PRIMARY KEY,
+    host         TEXT NOT NULL,
+    pid          INTEGER NOT NULL,
+    started_at   REAL NOT NULL,
+    ready_at     REAL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """
+    Email jobs shared between API processes (which enqueue) and job-worker
+    processes (which claim and run them), stored in SQLite.
+
+    An email ID is only ever queued once, so Graph redelivering a
+    notification does not run the job twice. Jobs claimed by a worker that
+    stopped heartbeating go back to pending. Claims follow each job's
+    priority and SLA deadline (see claim), favour the mailbox with the
+    fewest running jobs and keep at most MAILBOX_MAX_IN_FLIGHT of each
+    running.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = SQLiteDatabase(path)
+        db = self.db.connection()
+        db.executescript(_SCHEMA)
+        self._migrate(db)
+
+    def _migrate(self, db: sqlite3.Connection) -> None:
+        # Queues created before multi-mailbox support have no mailbox column
+        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+        if "mailbox" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN mailbox TEXT NOT NULL DEFAULT ''")
+        if "not_before" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+        if "priority" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+            db.execute("ALTER TABLE jobs ADD COLUMN deadline REAL")
+
+    # --- Jobs ---
+
+    def enqueue(
+        self,
+        email_id: str,
+        mailbox: Optional[str] = None,
+        priority: float = 0.0,
+        deadline: Optional[float] = None,
+    ) -> bool:
+        """Queues an email. Returns False if it was queued (or run) before."""
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO jobs (email_id, mailbox, status, enqueued_at, priority, deadline) "
+                "VALUES (?, ?, 'pending', ?, ?, ?)",
+                (email_id, mailbox or settings.MAILBOX_UPN, time.time(), priority, deadline),
+            )
+        self.publish_depth()
+        return cursor.rowcount == 1
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Takes the next pending job, skipping mailboxes at
+        MAILBOX_MAX_IN_FLIGHT, ranked like FairQueue: jobs within
+        PRIORITY_DEADLINE_LEAD_SECONDS of their deadline first (earliest
+        first), then by aged priority (whole points, so the mailbox with
+        the fewest running jobs wins between near-equal scores), then the
+        oldest. Returns (email_id, mailbox), or None if nothing can be claimed.
+        """
+        now = time.time()
+        aging = settings.PRIORITY_AGING_PER_MINUTE / 60
+        with self.db.transaction() as db:
+            row = db.execute(
+                "SELECT p.email_id, p.mailbox, "
+                "p.deadline IS NOT NULL AND p.deadline - :now <= :lead AS due, "
+                "p.priority + :aging * (:now - p.enqueued_at) AS effective "
+                "FROM jobs p "
+                "LEFT JOIN (SELECT mailbox, COUNT(*) AS running FROM jobs WHERE status = 'running' GROUP BY mailbox) r "
+                "ON r.mailbox = p.mailbox "
+                "WHERE p.status = 'pending' AND COALESCE(r.running, 0) < :cap AND COALESCE(p.not_before, 0) <= :now "
+                "ORDER BY due DESC, CASE WHEN due THEN p.deadline END, "
+                # floor(effective); SQLite has no FLOOR before 3.35
+                "CAST(effective AS INTEGER) - (effective < CAST(effective AS INTEGER)) DESC, "
+                "COALESCE(r.running, 0), effective DESC, p.enqueued_at LIMIT 1",
+                {
+                    "now": now,
+                    "lead": settings.PRIORITY_DEADLINE_LEAD_SECONDS,
+                    "aging": aging,
+                    "cap": settings.MAILBOX_MAX_IN_FLIGHT,
+                },
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', claimed_by = ?, claimed_at = ? WHERE email_id = ?",
+                (worker_id, now, row[0]),
+            )
+        self.publish_depth()
+        return row[0], row[1] or settings.MAILBOX_UPN
+
+    def complete(self, email_id: str) -> None:
+        with self.db.transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? WHERE email_id = ?",
+                (time.time(), email_id),
+            )
+        self.publish_depth()
+
+    def release(self, email_id: str, delay: float) -> None:
+        """Puts a claimed job that did not run back to pending, claimable again after `delay` seconds."""
+        with self.db.transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'pending', claimed_by = NULL, claimed_at = NULL, not_before = ? "
+                "WHERE email_id = ?",
+                (time.time() + delay, email_id),
+            )
+        self.publish_depth()
+
+    def depth(self) -> Dict[str, int]:
+        rows = self.db.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def publish_depth(self) -> None:
+        """Sets the qtc_job_queue_depth gauge from depth()."""
+        depth = self.depth()
+        for status in ("pending", "running"):
+            JOB_QUEUE_DEPTH.labels(status=status).set(depth.get(status, 0))
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Forgets finished jobs, after which the same email ID could be queued again."""
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND finished_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+            return cursor.rowcount
+
+    # --- Workers ---
+
+    def register_worker(self, worker_id: str) -> None:
+        now = time.time()
+        with self.db.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+                (worker_id, socket.gethostname(), os.getpid(), now, now),
+            )
+
+    def mark_worker_ready(self, worker_id: str) -> None:
+        self.heartbeat(worker_id, ready=True)
+
+    def heartbeat(self, worker_id: str, ready: bool = False) -> None:
+        """
+        Refreshes the worker's heartbeat (and marks it ready). A worker that
+        requeue_orphans dropped after stalling past the timeout is
+        registered again, so /ready counts it and it is not dropped on
+        every later requeue.
+        """
+        now = time.time()
+        ready_at = now if ready else None
+        with self.db.transaction() as db:
+            cursor = db.execute(
+                "UPDATE workers SET heartbeat_at = ?, ready_at = COALESCE(ready_at, ?) WHERE worker_id = ?",
+                (now, ready_at, worker_id),
+            )
+            if cursor.rowcount == 0:
+                db.execute(
+                    "INSERT INTO workers (worker_id, host, pid, started_at, ready_at, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (worker_id, socket.gethostname(), os.getpid(), now, ready_at, now),
+                )
+                logger.warning(f"Worker {worker_id} had been dropped as dead; registered it again.")
+
+    def remove_worker(self, worker_id: str) -> None:
+        with self.db.transaction() as db:
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def ready_workers(self, timeout: float) -> List[Dict[str, Any]]:
+        """Workers that finished warm-up and heartbeated within `timeout` seconds."""
+        db = self.db.connection()
+        rows = db.execute(
+            "SELECT worker_id, host, pid, ready_at, heartbeat_at FROM workers "
+            "WHERE ready_at IS NOT NULL AND heartbeat_at >= ?",
+            (time.time() - timeout,),
+        ).fetchall()
+        return [dict(zip(("worker_id", "host", "pid", "ready_at", "heartbeat_at"), row)) for row in rows]
+
+    def requeue_orphans(self, timeout: float) -> int:
+        """Puts jobs held by dead workers (no heartbeat for `timeout` seconds) back to pending."""
+        cutoff = time.time() - timeout
+        with self.db.transaction() as db:
+            db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'pending', claimed_by = NULL, claimed_at = NULL "
+                "WHERE status = 'running' AND claimed_by NOT IN (SELECT worker_id FROM workers)"
+            )
+            requeued = cursor.rowcount
+        if requeued:
+            logger.warning(f"Requeued {requeued} job(s) left behind by dead workers.")
+            self.publish_depth()
+        return requeued
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Returns the shared job queue, opened on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(settings.JOB_QUEUE_PATH)
+        return _job_queue
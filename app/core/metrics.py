@@ -0,0 +1,116 @@
+from typing import ContextManager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Seconds; covers fast parsers (ms) up to slow LLM calls and browser runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "qtc_stage_duration_seconds",
+    "Time spent in each step of process_email_job.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    "qtc_job_duration_seconds",
+    "End-to-end time per email, from notification to final outcome.",
+    buckets=LATENCY_BUCKETS,
+)
+JOB_SECONDS_BY_PRIORITY = Histogram(
+    "qtc_job_duration_by_priority_seconds",
+    "End-to-end time per email by priority class (high, normal, low).",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+SLA_MISSES = Counter(
+    "qtc_sla_misses_total",
+    "Emails that finished after their priority class's deadline.",
+    ["priority"],
+)
+JOBS = Counter(
+    "qtc_jobs_total",
+    "Emails by outcome (started, succeeded, unchanged, validation_failed, dead_lettered).",
+    ["outcome"],
+)
+FAILURES = Counter(
+    "qtc_stage_failures_total",
+    "Failed attempts by stage (each retry counts).",
+    ["stage"],
+)
+CACHE_HITS = Counter(
+    "qtc_cache_hits_total",
+    "Work skipped because a cached or checkpointed result was reused.",
+    ["cache"],
+)
+ENTITY_RESOLUTION = Counter(
+    "qtc_entity_resolution_total",
+    "Extracted values resolved against master data, by field and what matched (or unmatched).",
+    ["field", "source"],
+)
+LLM_BATCH_SIZE = Histogram(
+    "qtc_llm_batch_documents",
+    "Emails per Gemini extraction request.",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+LLM_BATCH_FALLBACKS = Counter(
+    "qtc_llm_batch_fallbacks_total",
+    "Emails re-sent alone after their batch failed, left them out or answered invalid data.",
+    ["reason"],
+)
+GEMINI_THROTTLED = Counter(
+    "qtc_gemini_throttled_total",
+    "Gemini requests answered 429 / overloaded (each retry counts).",
+)
+# multiprocess_mode only matters under app/server.py (PROMETHEUS_MULTIPROC_DIR)
+QUEUE_DEPTH = Gauge(
+    "qtc_queue_depth",
+    "Jobs waiting in each pipeline queue.",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+# Read from the shared SQLite queue, so every process sees the same
+# numbers; the one written last wins
+JOB_QUEUE_DEPTH = Gauge(
+    "qtc_job_queue_depth",
+    "Jobs in the shared job queue by status (pending, running).",
+    ["status"],
+    multiprocess_mode="mostrecent",
+)
+JOBS_IN_PROGRESS = Gauge(
+    "qtc_jobs_in_progress",
+    "Emails currently being processed.",
+    multiprocess_mode="livesum",
+)
+LEADER = Gauge(
+    "qtc_leader",
+    "1 in the process that holds the replica-group leader lease.",
+    multiprocess_mode="livesum",
+)
+GEMINI_CONCURRENCY_LIMIT = Gauge(
+    "qtc_gemini_concurrency_limit",
+    "Gemini requests allowed in flight right now (adaptive).",
+    multiprocess_mode="livesum",
+)
+GEMINI_IN_FLIGHT = Gauge(
+    "qtc_gemini_requests_in_flight",
+    "Gemini requests currently out.",
+    multiprocess_mode="livesum",
+)
+GEMINI_WAITERS = Gauge(
+    "qtc_gemini_waiters",
+    "Gemini requests queued for a concurrency slot or rate-limit room.",
+    multiprocess_mode="livesum",
+)
+SUBSCRIPTION_SECONDS_LEFT = Gauge(
+    "qtc_subscription_seconds_remaining",
+    "Seconds until each mailbox's Graph subscription expires (as last seen by the leader).",
+    ["mailbox"],
+    multiprocess_mode="livemax",
+)
+
+def stage_timer(stage: str) -> ContextManager[None]:
+    """`with stage_timer("gemini"): ...` records the block's duration."""
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
@@ -0,0 +1,115 @@
+"""
+Encryption for Graph change notifications with resource data
+(includeResourceData). Graph encrypts each notification's resource with
+a random AES key, encrypts that key with our certificate's RSA public key
+(OAEP) and signs the ciphertext with HMAC-SHA256 under the AES key.
+
+`cryptography` is imported on first use so the API starts without it.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+
+class DecryptionError(ValueError):
+    """The encrypted content is malformed, for another certificate, or its signature does not match."""
+
+
+def _oaep() -> Any:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    # Graph uses OAEP with SHA-1
+    return padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA1()), algorithm=hashes.SHA1(), label=None)
+
+def _aes_cbc(key: bytes) -> Any:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    # The IV is the first 16 bytes of the symmetric key
+    return Cipher(algorithms.AES(key), modes.CBC(key[:16]))
+
+
+class NotificationDecryptor:
+    """Decrypts `encryptedContent` blocks with our certificate's private key."""
+
+    def __init__(self, cert_path: Path, key_path: Path, cert_id: str):
+        from cryptography import x509
+        from cryptography.hazmat.primitives import serialization
+
+        self.cert_id = cert_id
+        self.certificate = x509.load_pem_x509_certificate(cert_path.read_bytes())
+        self._private_key = serialization.load_pem_private_key(key_path.read_bytes(), password=None)
+
+    def certificate_b64(self) -> str:
+        """The certificate as Graph wants it in the subscription (base64 DER)."""
+        from cryptography.hazmat.primitives import serialization
+
+        return base64.b64encode(self.certificate.public_bytes(serialization.Encoding.DER)).decode()
+
+    def decrypt(self, encrypted_content: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns the resource (e.g. the message JSON). Raises DecryptionError."""
+        from cryptography.hazmat.primitives import padding
+
+        if encrypted_content.get("encryptionCertificateId") != self.cert_id:
+            raise DecryptionError(f"Unknown certificate ID {encrypted_content.get('encryptionCertificateId')!r}")
+        try:
+            key = self._private_key.decrypt(base64.b64decode(encrypted_content["dataKey"]), _oaep())
+            data = base64.b64decode(encrypted_content["data"])
+            signature = base64.b64decode(encrypted_content["dataSignature"])
+        except (KeyError, ValueError) as e:
+            raise DecryptionError(f"Malformed encrypted content: {e}") from e
+        if not hmac.compare_digest(hmac.new(key, data, hashlib.sha256).digest(), signature):
+            raise DecryptionError("Signature mismatch")
+
+        decryptor = _aes_cbc(key).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        try:
+            plain = unpadder.update(decryptor.update(data) + decryptor.finalize()) + unpadder.finalize()
+            return json.loads(plain)
+        except ValueError as e:
+            raise DecryptionError(f"Could not decrypt resource data: {e}") from e
+
+
+def encrypt_resource(certificate_pem: bytes, cert_id: str, resource: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What Graph does on its side: builds an `encryptedContent` block for
+    `resource`. Used to make local fixtures (see generate_notification_cert.py).
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import padding
+
+    key = os.urandom(32)
+    padder = padding.PKCS7(128).padder()
+    plain = padder.update(json.dumps(resource).encode()) + padder.finalize()
+    encryptor = _aes_cbc(key).encryptor()
+    data = encryptor.update(plain) + encryptor.finalize()
+    public_key = x509.load_pem_x509_certificate(certificate_pem).public_key()
+    return {
+        "data": base64.b64encode(data).decode(),
+        "dataSignature": base64.b64encode(hmac.new(key, data, hashlib.sha256).digest()).decode(),
+        "dataKey": base64.b64encode(public_key.encrypt(key, _oaep())).decode(),
+        "encryptionCertificateId": cert_id,
+    }
+
+
+# --- Process-wide decryptor ---
+
+_decryptor: Optional[NotificationDecryptor] = None
+_decryptor_lock = threading.Lock()
+
+def get_decryptor() -> NotificationDecryptor:
+    """Returns the decryptor for NOTIFICATION_CERT_PATH / NOTIFICATION_KEY_PATH, loaded on first use."""
+    global _decryptor
+    with _decryptor_lock:
+        if _decryptor is None:
+            _decryptor = NotificationDecryptor(
+                settings.NOTIFICATION_CERT_PATH, settings.NOTIFICATION_KEY_PATH, settings.NOTIFICATION_CERT_ID
+            )
+        return _decryptor
@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator
+
+
+class SQLiteDatabase:
+    """
+    A SQLite file shared by threads, processes and (on a shared volume)
+    replicas: the job queue, coordination leases and conversation index.
+
+    Each thread gets its own connection in autocommit mode with WAL and
+    synchronous=NORMAL; writes go through `transaction()`, whose BEGIN
+    IMMEDIATE takes the write lock up front so read-then-write steps
+    cannot interleave.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
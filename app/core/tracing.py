@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    duration_ms: float = 0.0
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """
+    The span tree for one email. Spans are opened with `span()` from any
+    code running while the trace is active (see `activate()`), so services
+    don't need the trace passed in.
+    """
+    def __init__(self, email_id: str, profile: bool = False):
+        self.trace_id = uuid.uuid4().hex
+        self.email_id = email_id
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        # Only sampled jobs collect stacks; they are kept if the job turns out slow
+        self.profile = profile
+        self.stack_counts: "Counter[str]" = Counter()
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def add_stacks(self, counts: "Counter[str]") -> None:
+        with self._lock:
+            self.stack_counts.update(counts)
+
+    @property
+    def duration_seconds(self) -> float:
+        return time.time() - self.started_at
+
+    def finish(self) -> None:
+        """Exports the trace (and a profile if the job was slow). Idempotent."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        duration = self.duration_seconds
+        profile_path = None
+        if self.stack_counts and duration >= settings.TRACE_SLOW_JOB_SECONDS:
+            profile_path = _write_profile(self)
+            logger.warning(f"[SLOW_JOB] {self.email_id} took {duration:.1f}s; profile written to {profile_path}")
+        _export(self, duration, profile_path)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def start_trace(email_id: str) -> Optional[Trace]:
+    if not settings.TRACING_ENABLED:
+        return None
+    return Trace(email_id, profile=random.random() < settings.TRACE_PROFILE_SAMPLE_RATE)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Generator[None, None, None]:
+    """Makes `trace` the target of `span()` calls in this thread/task."""
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Generator[Optional[Span], None, None]:
+    """Records a child span of the current span. A no-op outside a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start=time.time(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = str(e)
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        _current_span.reset(token)
+        trace.add(current)
+
+def set_attribute(key: str, value: Any) -> None:
+    """Adds an attribute to the innermost open span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+# --- Slow-job profiling ---
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds and counts
+    the collapsed stacks (flame-graph "folded" format). Wall-clock based,
+    which for the CPU-bound parsing and extraction stages is CPU time.
+    """
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: "Counter[str]" = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> "Counter[str]":
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+
+@contextmanager
+def profiled() -> Generator[None, None, None]:
+    """Samples the current thread while the block runs, if the active trace is sampled."""
+    trace = _current_trace.get()
+    if trace is None or not trace.profile:
+        yield
+        return
+    sampler = StackSampler(threading.get_ident(), settings.TRACE_PROFILE_INTERVAL_MS / 1000)
+    sampler.start()
+    try:
+        yield
+    finally:
+        trace.add_stacks(sampler.stop())
+
+
+# --- Export ---
+
+_export_lock = threading.Lock()
+
+def _write_profile(trace: Trace) -> Path:
+    settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = settings.PROFILE_DIR / f"{trace.trace_id}.folded"
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in trace.stack_counts.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+def _export(trace: Trace, duration: float, profile_path: Optional[Path]) -> None:
+    record = {
+        "trace_id": trace.trace_id,
+        "email_id": trace.email_id,
+        "started_at": trace.started_at,
+        "duration_ms": round(duration * 1000, 3),
+        "profile": str(profile_path) if profile_path else None,
+        "spans": [asdict(s) for s in sorted(trace.spans, key=lambda s: s.start)],
+    }
+    try:
+        with _export_lock:
+            path = settings.TRACE_EXPORT_PATH
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _rotate(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not export trace for {trace.email_id}: {e}")
+
+def _rotate(path: Path) -> None:
+    """
+    Shifts path -> path.1 -> ... -> path.N once path passes
+    TRACE_EXPORT_MAX_MB, dropping the oldest. Worker processes may both
+    rotate at the same moment; that only shifts the backups once more.
+    """
+    try:
+        if path.stat().st_size < settings.TRACE_EXPORT_MAX_MB * 1024 * 1024:
+            return
+    except FileNotFoundError:
+        return
+    backups = max(0, settings.TRACE_EXPORT_BACKUPS)
+    for n in range(backups, 0, -1):
+        source = path if n == 1 else path.with_name(f"{path.name}.{n - 1}")
+        try:
+            os.replace(source, path.with_name(f"{path.name}.{n}"))
+        except FileNotFoundError:
+            pass
+    if backups == 0:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,105 @@
+import hmac
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Graph sends e.g. "Users/<user-id>/Messages/<message-id>"
+_MESSAGE_RESOURCE = re.compile(r"/messages/([^/]+)$", re.IGNORECASE)
+
+_client_state = settings.CLIENT_STATE_SECRET.encode()
+# UPNs are case-insensitive; map any casing back to the configured one
+_mailboxes = {mailbox.lower(): mailbox for mailbox in settings.mailboxes}
+
+
+class InvalidPayload(ValueError):
+    """The notification body is not a Graph change-notification collection."""
+
+
+def client_state_ok(value: Any) -> bool:
+    """Constant-time check of a notification's clientState."""
+    return isinstance(value, str) and hmac.compare_digest(value.encode(), _client_state)
+
+def resolve_mailbox(value: Optional[str]) -> Optional[str]:
+    """
+    The configured mailbox a notification URL's `mailbox` parameter names.
+    Subscriptions created before multi-mailbox support carry none and map to
+    MAILBOX_UPN; unknown mailboxes give None.
+    """
+    if not value:
+        return settings.MAILBOX_UPN
+    return _mailboxes.get(value.lower())
+
+def message_id(notification: dict) -> Optional[str]:
+    """The message ID a notification refers to, or None if it is not about a message."""
+    resource_data = notification.get("resourceData")
+    if resource_data is not None and not isinstance(resource_data, dict):
+        return None
+    if resource_data and isinstance(resource_data.get("id"), str) and resource_data["id"]:
+        return resource_data["id"]
+    resource = notification.get("resource")
+    match = _MESSAGE_RESOURCE.search(resource) if isinstance(resource, str) else None
+    return match.group(1) if match else None
+
+def parse_notifications(body: bytes) -> Tuple[List[str], int, Dict[str, Dict[str, Any]]]:
+    """
+    Validates a raw notification body. Returns the message IDs to enqueue
+    (duplicates within the batch dropped, order kept), how many
+    notifications were rejected, and the still-encrypted resource data of
+    rich notifications by message ID (see store_resource_data).
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise InvalidPayload(str(e)) from e
+    if not isinstance(payload, dict):
+        raise InvalidPayload("Expected a JSON object")
+
+    email_ids: List[str] = []
+    encrypted: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    rejected = 0
+    for notification in payload.get("value") or ():
+        if not isinstance(notification, dict) or not client_state_ok(notification.get("clientState")):
+            rejected += 1
+            continue
+        email_id = message_id(notification)
+        if email_id is None:
+            rejected += 1
+        elif email_id not in seen:
+            seen.add(email_id)
+            email_ids.append(email_id)
+            if isinstance(notification.get("encryptedContent"), dict):
+                encrypted[email_id] = notification["encryptedContent"]
+    return email_ids, rejected, encrypted
+
+def store_resource_data(encrypted: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Decrypts rich-notification messages and saves each as the job's "email"
+    checkpoint, so the job starts without fetching the message from Graph.
+    Undecryptable ones are skipped (the job fetches them as usual). Must run
+    before the jobs are queued, and off the event loop (RSA is slow-ish).
+    Returns the decrypted messages by email ID.
+    """
+    if not encrypted:
+        return {}
+    from app.core.checkpoints import checkpoint_store
+    from app.core.notification_crypto import DecryptionError, get_decryptor
+
+    decryptor = get_decryptor()
+    messages: Dict[str, Dict[str, Any]] = {}
+    for email_id, content in encrypted.items():
+        try:
+            message = decryptor.decrypt(content)
+        except DecryptionError as e:
+            logger.warning(f"Could not decrypt resource data for {email_id}, will fetch it: {e}")
+            continue
+        message.setdefault("id", email_id)
+        if settings.CHECKPOINTS_ENABLED:
+            checkpoint_store.save(email_id, "email", message)
+        messages[email_id] = message
+    return messages
@@ -1,20 +1,142 @@
 import logging
-from typing import Dict, Any
+import os
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 from fastapi import FastAPI, Request, HTTPException, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 
+# Only light modules here. The job stack (pandas, parsers, Gemini, MSAL,
+# Playwright) is imported by the warm-up thread or on first use, so the
+# API answers as soon as uvicorn is up.
+from app.core import metrics as _metrics  # noqa: F401  (registers the metric families)
 from app.core.config import settings
-from app.processing import process_email_job
+from app.ingest import InvalidPayload, parse_notifications, resolve_mailbox, store_resource_data
+from app import warmup
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-app = FastAPI(title="QTC Data Entry Agent - Prototype")
 logger = logging.getLogger(__name__)
 
+def _warm_up() -> None:
+    """Warms up the job stack if this process runs jobs, then starts the pipeline."""
+    # In queue mode the job workers warm up; the API only enqueues
+    warmup.warm_up(run_jobs=settings.JOB_DISPATCH != "queue")
+    if settings.JOB_DISPATCH == "pipeline":
+        get_pipeline().start()
+
+def _start_coordination() -> None:
+    from app.core.coordination import get_coordinator
+
+    coordinator = get_coordinator()
+    if settings.JOB_DISPATCH != "queue":
+        # The job queue requeues its own orphans
+        coordinator.on_orphans = _dispatch_orphans
+    coordinator.start()
+    if settings.SUBSCRIPTION_AUTO_RENEW:
+        from app.subscriptions import start_subscription_renewer
+
+        start_subscription_renewer()
+
+def _dispatch_orphans(emails: List[Tuple[str, Optional[str]]]) -> None:
+    """Runs emails whose replica died; called on the leader, off the heartbeat thread."""
+    def run() -> None:
+        for email_id, mailbox in emails:
+            if settings.JOB_DISPATCH == "pipeline":
+                get_pipeline().submit(email_id, mailbox=mailbox)
+            else:
+                process_email_job(email_id, mailbox)
+
+    threading.Thread(target=run, name="orphan-dispatch", daemon=True).start()
+
+def _shut_down() -> None:
+    from app.core.coordination import shutdown_coordinator
+
+    if settings.SUBSCRIPTION_AUTO_RENEW:
+        from app.subscriptions import shutdown_subscription_renewer
+
+        shutdown_subscription_renewer()
+    shutdown_coordinator()
+    if settings.JOB_DISPATCH == "queue":
+        return
+    from app.pipeline import shutdown_pipeline
+    from app.services.llm_batch import shutdown_extraction_batcher
+    from app.services.submission import shutdown_submission_backend
+
+    shutdown_pipeline()
+    shutdown_extraction_batcher()
+    shutdown_submission_backend()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    warm_up = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+    warm_up.start()
+    await run_in_threadpool(_start_coordination)
+    yield
+    await run_in_threadpool(warm_up.join)
+    await run_in_threadpool(_shut_down)
+
+def process_email_job(email_id: str, mailbox: Optional[str] = None) -> None:
+    """
+    Background-task entry point; the job stack is imported on first use.
+    Retries wait on a timer, not on the shared threadpool.
+    """
+    from app.processing import process_email_job as run_job
+
+    run_job(email_id, mailbox, defer_retries=True)
+
+def get_pipeline() -> Any:
+    from app.pipeline import get_pipeline as get_shared_pipeline
+
+    return get_shared_pipeline()
+
+app = FastAPI(title="QTC Data Entry Agent - Prototype", lifespan=lifespan)
+
 @app.get("/")
 def health_check() -> Dict[str, str]:
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness() -> Response:
+    """
+    200 once warm-up has finished (in queue mode: once at least one job
+    worker has warmed up and is heartbeating), 503 before that.
+    """
+    from app.core.coordination import get_coordinator
+
+    state = warmup.status()
+    coordinator = get_coordinator()
+    state["replica"] = coordinator.holder
+    state["leader"] = coordinator.is_leader()
+    if settings.JOB_DISPATCH == "queue":
+        from app.core.jobqueue import get_job_queue
+
+        workers = get_job_queue().ready_workers(settings.WORKER_HEARTBEAT_TIMEOUT)
+        state["job_workers"] = len(workers)
+        state["ready"] = state["ready"] and bool(workers)
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus scrape endpoint: per-stage latency histograms and job counters."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # app/server.py: aggregate across the API and job-worker processes
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/pipeline/stats")
+def pipeline_stats() -> List[Dict[str, Any]]:
+    if settings.JOB_DISPATCH != "pipeline":
+        raise HTTPException(status_code=404, detail="Pipeline dispatch is not enabled")
+    return get_pipeline().stats()
+
 @app.post("/notifications")
 async def handle_notifications(
     request: Request,
@@ -27,35 +149,61 @@ async def handle_notifications(
         logger.info("Received validation token handshake.")
         return Response(content=validation_token, media_type="text/plain", status_code=200)
 
-    # 2. Process the notification
+    # 2. Validate. Graph wants an answer within seconds, so this stays cheap:
+    # raw bytes to json.loads, constant-time clientState check, no payload logging.
     try:
-        body = await request.json()
-        logger.info(f"Received notification: {body}")
-    except Exception as e:
+        email_ids, rejected, encrypted = parse_notifications(await request.body())
+    except InvalidPayload as e:
         logger.error(f"Error parsing notification payload: {e}")
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if rejected:
+        logger.warning(f"Skipped {rejected} notification(s) with invalid client state or resource.")
+    # Each mailbox's subscription posts to the webhook URL with ?mailbox=<upn>
+    mailbox = resolve_mailbox(request.query_params.get("mailbox"))
+    if mailbox is None:
+        logger.warning("Notification for a mailbox that is not configured. Skipping.")
+        return Response(status_code=202, content="Accepted")
 
-    # 3. Validate and Enqueue
-    if "value" in body:
-        for notification in body["value"]:
-            if notification.get("clientState") != settings.CLIENT_STATE_SECRET:
-                logger.warning("Invalid client state. Skipping.")
-                continue
-
-            resource = notification.get("resource", "")
-            
-            # --- THIS IS THE FIX ---
-            if "/messages/" in resource.lower():
-            # --- THIS IS THE FIX ---
-            
-                # Get the last part of the resource string as the ID
-                email_id = resource.split("/")[-1]
-                logger.info(f"Adding job to background tasks for email: {email_id}")
-                
-                background_tasks.add_task(process_email_job, email_id)
-            
-            else:
-                logger.warning(f"Unexpected resource format: {resource}")
+    # 3. Enqueue. Rich notifications' messages are decrypted in the same
+    # threadpool hop, before their jobs can start.
+    if email_ids:
+        if settings.JOB_DISPATCH == "pipeline":
+            try:
+                # One threadpool hop for the whole batch
+                await run_in_threadpool(_enqueue_pipeline, email_ids, mailbox, encrypted)
+            except queue.Full:
+                # Backpressure: Graph redelivers the notification later
+                logger.warning(f"Pipeline is full for {mailbox}, rejecting {len(email_ids)} notification(s).")
+                return Response(status_code=503, content="Busy")
+        elif settings.JOB_DISPATCH == "queue":
+            await run_in_threadpool(_enqueue_job_queue, email_ids, mailbox, encrypted)
+        else:
+            if encrypted:
+                await run_in_threadpool(store_resource_data, encrypted)
+            for email_id in email_ids:
+                background_tasks.add_task(process_email_job, email_id, mailbox)
+        logger.info(f"Queued {len(email_ids)} email(s) for {mailbox}.")
 
     # 4. Respond immediately
     return Response(status_code=202, content="Accepted")
+
+def _enqueue_pipeline(email_ids: List[str], mailbox: str, encrypted: Dict[str, Dict[str, Any]]) -> None:
+    store_resource_data(encrypted)
+    # All or nothing: on queue.Full none is queued, so the 503 (and Graph's
+    # redelivery of the whole notification) runs no email twice
+    get_pipeline().submit_many(email_ids, settings.PIPELINE_INGEST_TIMEOUT, mailbox=mailbox)
+
+def _enqueue_job_queue(email_ids: List[str], mailbox: str, encrypted: Dict[str, Dict[str, Any]]) -> None:
+    from app.core.jobqueue import get_job_queue
+    from app.priority import score_message, sla_seconds
+
+    # Rich notifications carry sender and subject, so those jobs are
+    # scored now; the rest queue as "normal"
+    messages = store_resource_data(encrypted)
+    job_queue = get_job_queue()
+    for email_id in email_ids:
+        priority = score_message(messages[email_id]) if email_id in messages else None
+        score, label = (priority.score, priority.label) if priority else (0.0, "normal")
+        deadline = time.time() + sla_seconds(label)
+        if not job_queue.enqueue(email_id, mailbox, priority=score, deadline=deadline):
+            logger.info(f"Email {email_id} was already queued, ignoring redelivery.")
@@ -0,0 +1,172 @@
+import csv
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.parsing.fuzzy_index import TrigramIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+# Dropped before matching, so "Atiq Al Dhaheri & Co. L.L.C" and
+# "ATIQ AL DHAHERI & CO LLC" look the same
+_LEGAL_SUFFIXES = re.compile(
+    r"\b(?:L ?L ?C|LTD|LIMITED|CO|COMPANY|CORP|CORPORATION|INC|FZE|FZCO|FZ ?LLC|DMCC|WLL|PJSC|PSC|LLP|PLC|GMBH|BV|SA|AND|THE)\b"
+)
+# Sender domains that say nothing about the client
+_FREE_MAIL_DOMAINS = {"gmail.com", "hotmail.com", "outlook.com", "yahoo.com", "live.com", "icloud.com"}
+
+
+@dataclass(frozen=True)
+class Client:
+    client_id: str
+    name: str
+
+
+@dataclass(frozen=True)
+class ClientMatch:
+    client: Client
+    score: float
+    # What matched: extracted name, sender domain or sender display name
+    source: str
+
+
+def match_key(name: str) -> str:
+    return " ".join(_LEGAL_SUFFIXES.sub(" ", normalize(name)).split())
+
+def email_domain(address: Optional[str]) -> Optional[str]:
+    if not address or "@" not in address:
+        return None
+    return address.rsplit("@", 1)[1].strip().lower()
+
+
+class ClientDirectory:
+    """
+    Client master data (a CSV export) indexed for resolving extracted or
+    raw names and sender domains to the canonical client.
+
+    CSV columns: client_id, client_name, and optionally aliases and
+    domains (each ';'-separated).
+    """
+    def __init__(self, clients: List[Client], aliases: Dict[str, List[str]], domains: Dict[str, Client]):
+        self.clients = clients
+        self.domains = domains
+        self.names: TrigramIndex[Client] = TrigramIndex()
+        for client in clients:
+            for name in [client.name] + aliases.get(client.client_id, []):
+                key = match_key(name)
+                if not key:
+                    # Nothing but legal words, e.g. "SA CO LLC": it can never match
+                    logger.warning(f"Client name '{name}' ({client.client_id}) is empty once legal suffixes are dropped; skipped.")
+                    continue
+                self.names.add(key, client)
+
+    @classmethod
+    def load(cls, path: Path) -> "ClientDirectory":
+        clients: List[Client] = []
+        aliases: Dict[str, List[str]] = {}
+        domains: Dict[str, Client] = {}
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                if not row.get("client_name"):
+                    continue
+                client = Client(client_id=(row.get("client_id") or row["client_name"]).strip(), name=row["client_name"].strip())
+                clients.append(client)
+                aliases[client.client_id] = [a.strip() for a in (row.get("aliases") or "").split(";") if a.strip()]
+                for domain in (row.get("domains") or "").split(";"):
+                    if domain.strip():
+                        domains[domain.strip().lower()] = client
+        logger.info(f"Loaded {len(clients)} clients ({len(domains)} domains) from {path}.")
+        return cls(clients, aliases, domains)
+
+    def match_name(self, name: str) -> Optional[Tuple[Client, float]]:
+        """
+        The client whose name best matches `name`, or None if there is no
+        match or the runner-up (another client) scores within
+        CLIENT_MATCH_MARGIN of it.
+        """
+        # A few candidates, since several may be aliases of the same client
+        matches = self.names.search(match_key(name), settings.CLIENT_MATCH_THRESHOLD, limit=5)
+        if not matches:
+            return None
+        best, score = matches[0]
+        runner_up = next((other for other in matches[1:] if other[0] != best), None)
+        if runner_up and score - runner_up[1] < settings.CLIENT_MATCH_MARGIN:
+            logger.info(
+                f"Client name '{name}' is ambiguous: '{best.name}' ({score:.2f}) vs "
+                f"'{runner_up[0].name}' ({runner_up[1]:.2f}); not matched."
+            )
+            return None
+        return best, score
+
+    def resolve(
+        self,
+        extracted_name: Optional[str],
+        sender_email: Optional[str] = None,
+        sender_name: Optional[str] = None,
+    ) -> Optional[ClientMatch]:
+        """
+        The client an email is from: the name the LLM extracted, or, only
+        when no name was extracted, the sender's domain, then the sender's
+        display name. An extracted name that does not match is left as
+        extracted: the sender may be an agent or forwarder quoting for
+        someone else, so the sender's company is only logged as a hint.
+        """
+        if extracted_name and extracted_name.strip():
+            found = self.match_name(extracted_name)
+            if found:
+                return ClientMatch(found[0], found[1], "extracted_name")
+            hint = self.match_sender(sender_email, sender_name)
+            if hint is not None:
+                logger.info(
+                    f"Client '{extracted_name}' is unmatched; the sender is '{hint.client.name}' "
+                    f"({hint.source}), which may be an agent. Keeping the extracted name."
+                )
+            return None
+        return self.match_sender(sender_email, sender_name)
+
+    def match_sender(self, sender_email: Optional[str], sender_name: Optional[str]) -> Optional[ClientMatch]:
+        """The sender's company by email domain, then by display name."""
+        domain = email_domain(sender_email)
+        if domain and domain not in _FREE_MAIL_DOMAINS:
+            # Also try the parent domain, e.g. mail.example.ae -> example.ae
+            parent = domain.split(".", 1)[-1]
+            for candidate in (domain, parent) if "." in parent else (domain,):
+                if candidate in self.domains:
+                    return ClientMatch(self.domains[candidate], 1.0, "sender_domain")
+        if sender_name:
+            found = self.match_name(sender_name)
+            if found:
+                return ClientMatch(found[0], found[1], "sender_name")
+        return None
+
+
+# --- Process-wide directory ---
+
+_directory: Optional[ClientDirectory] = None
+_directory_failed = False
+_directory_lock = threading.Lock()
+
+def get_client_directory() -> Optional[ClientDirectory]:
+    """
+    The directory from CLIENT_MASTER_CSV, loaded on first use. None if none
+    is configured or it could not be read (client names then stay as extracted).
+    """
+    global _directory, _directory_failed
+    if settings.CLIENT_MASTER_CSV is None:
+        return None
+    with _directory_lock:
+        if _directory is None and not _directory_failed:
+            try:
+                directory = ClientDirectory.load(settings.CLIENT_MASTER_CSV)
+            except (OSError, csv.Error) as e:
+                logger.error(f"Could not load client master data from {settings.CLIENT_MASTER_CSV}: {e}")
+                _directory_failed = True
+                return None
+            # Build the lookup arrays now rather than on the first email
+            directory.names.build()
+            _directory = directory
+        return _directory
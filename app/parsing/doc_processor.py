@@ -1,9 +1,11 @@
 import os
-import pandas as pd
-import PyPDF2
-from docx import Document
 from typing import Optional, Dict, List, Any
 
+from app.parsing.packing_list import summarize_packing_list
+
+# pandas, PyPDF2 and python-docx are imported by the methods that need
+# them, so only the formats actually seen are paid for.
+
 class DocumentProcessor:
     """Process various document formats (Excel, PDF, Word) to extract text."""
 
@@ -21,6 +23,8 @@ class DocumentProcessor:
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF file."""
+        import PyPDF2
+
         try:
             text = ""
             with open(pdf_path, 'rb') as file:
@@ -34,6 +38,8 @@ class DocumentProcessor:
 
     def extract_text_from_word(self, docx_path: str) -> str:
         """Extract text from Word document."""
+        from docx import Document
+
         try:
             doc = Document(docx_path)
             text: List[str] = []
@@ -57,24 +63,40 @@ class DocumentProcessor:
 
     def extract_data_from_excel(self, excel_path: str) -> List[Dict[str, Any]]:
         """Extract data from Excel file, handling multiple sheets."""
+        import pandas as pd
+
         try:
             excel_file = pd.ExcelFile(excel_path)
             all_data: List[Dict[str, Any]] = []
 
             for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
+                # Parsed from the already-open workbook rather than re-reading the file per sheet
+                df = excel_file.parse(sheet_name)
                 
                 # NaNs can cause issues, fill them
                 df = df.fillna("")
                 
                 text_data = f"Sheet: {sheet_name}\n"
-                text_data += df.to_string(index=False)
+                try:
+                    summary = summarize_packing_list(df)
+                except Exception as e:
+                    print(f"Could not total packing list in sheet {sheet_name}: {e}")
+                    summary = None
+                if summary is not None:
+                    # Hundreds of line items become the sheet's text details
+                    # (title rows, ports, goods...) followed by computed totals
+                    if summary.details:
+                        text_data += summary.details + "\n"
+                    text_data += summary.to_text(sheet_name)
+                else:
+                    text_data += df.to_string(index=False)
 
                 sheet_data = {
                     'sheet_name': sheet_name,
                     'text': text_data,
                     'dataframe': df,
-                    'rows': len(df)
+                    'rows': len(df),
+                    'packing_summary': summary
                 }
                 all_data.append(sheet_data)
 
@@ -96,6 +96,17 @@ def parse_key_value_table(html_content: str) -> Dict[str, str]:
     
     return data
 
+def html_to_text(html_content: str) -> str:
+    """
+    The readable text of an HTML (or plain) message body, one line per
+    block, blank lines dropped.
+    """
+    if not html_content:
+        return ''
+    text = BeautifulSoup(html_content, 'html.parser').get_text('\n')
+    lines = (clean_text(line) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
 def clean_text(text: str) -> str:
     """Cleans and normalizes text content."""
     if not text:
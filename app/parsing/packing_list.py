@@ -0,0 +1,324 @@
+"""
+Packing-list totals from the DataFrames `DocumentProcessor` reads out of
+Excel attachments. Instead of sending hundreds of line items to Gemini as
+text and leaving it the arithmetic, the columns for dimensions, quantity,
+weight and volume are found by their headers and totalled column-wise:
+packages, CBM, gross weight, volumetric and chargeable weight. Everything
+else on the sheet (rows above the header, columns that are not totalled)
+is kept as text ahead of the totals.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# A sheet needs this many line items before its summary replaces the raw rows
+MIN_LINE_ITEMS = 10
+# Rows scanned for the header when it is not the first row (titles, logos, addresses above it)
+HEADER_SCAN_ROWS = 15
+# IATA volumetric divisor: cm3 per kg
+VOLUMETRIC_DIVISOR = 6000
+# Leading columns searched for a "Total" label
+TOTAL_LABEL_COLUMNS = 3
+# Descriptions listed in the summary, most frequent first
+MAX_GOODS = 10
+# Share of a "size"/"dimensions" column's cells that must read as LxWxH
+MIN_DIMENSION_CELLS = 0.5
+# Column roles that are totalled; the text columns among the rest are kept
+MEASURE_ROLES = {"quantity", "dimensions", "length", "width", "height", "gross_weight", "cbm"}
+
+# Header patterns per column role, matched against lower-cased header text
+_ROLES: Dict[str, "re.Pattern[str]"] = {
+    "quantity": re.compile(r"\b(?:qty|quantity|pcs|pieces|pkgs?|packages?|no\.? of|nos|cartons?|ctns?|pallets?|plts?|units?)\b"),
+    "dimensions": re.compile(r"\b(?:dimensions?|dims?|size|measurements?|l(?:ength)? ?[x×*] ?w(?:idth)? ?[x×*] ?h(?:eight)?)\b"),
+    "length": re.compile(r"^(?:l|len|length)\b"),
+    "width": re.compile(r"^(?:w|wd|wid|width|breadth)\b"),
+    "height": re.compile(r"^(?:h|ht|hgt|height)\b"),
+    "gross_weight": re.compile(r"\b(?:gross|g\.? ?w\.?|gw|weight|wt|kgs?)\b"),
+    "cbm": re.compile(r"\b(?:cbm|m3|m³|volume|vol)\b"),
+    "description": re.compile(r"\b(?:description|desc|goods|commodity|item|material|product)\b"),
+}
+# Weights that are not the gross weight
+_OTHER_WEIGHT = re.compile(r"\b(?:net|n\.? ?w\.?|nw|vol|volumetric|volume|chargeable|dim)\b")
+_CBM_UNIT = re.compile(r"\b(?:cbm|m3|m³)\b")
+# "Pkg type", "Unit of measure": about packages, not how many
+_NOT_A_COUNT = re.compile(r"\b(?:type|kind|uom|of measure|price|value|no\.? ?#?)$")
+# Header says the figure is per package, to be multiplied by the quantity
+_PER_UNIT = re.compile(r"\b(?:unit|per|each|/ ?(?:pc|pkg|ctn|plt))\b")
+_TOTAL_ROW = r"^\s*(?:grand\s+)?(?:sub\s*)?totals?\b"
+_DIMENSIONS = r"(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)"
+# Length unit in a header, e.g. "Length (mm)", and its factor to cm
+_LENGTH_UNITS = [(re.compile(r"\bmm\b"), 0.1), (re.compile(r"\bcm\b"), 1.0), (re.compile(r"\b(?:in|inch|inches)\b"), 2.54),
+                 (re.compile(r"\(m\)|\bmtrs?\b|\bmeters?\b"), 100.0)]
+_LBS = re.compile(r"\b(?:lbs?|pounds?)\b")
+
+
+@dataclass
+class PackingSummary:
+    line_items: int
+    packages: float
+    cbm: float
+    gross_weight_kg: Optional[float]
+    volumetric_weight_kg: float
+    largest_cm: Optional[Tuple[float, float, float]] = None
+    goods: List[str] = field(default_factory=list)
+    # Which header fed each figure, for the summary text
+    columns: Dict[str, str] = field(default_factory=dict)
+    # Rows above the header and the distinct rows of the columns not
+    # totalled (ports, container types, marks...), as text
+    details: str = ""
+
+    @property
+    def chargeable_weight_kg(self) -> Optional[float]:
+        """Air: the greater of gross and volumetric weight."""
+        if self.gross_weight_kg is None:
+            return self.volumetric_weight_kg or None
+        return max(self.gross_weight_kg, self.volumetric_weight_kg)
+
+    @property
+    def revenue_tons(self) -> Optional[float]:
+        """LCL W/M: the greater of CBM and gross weight in tonnes."""
+        if self.gross_weight_kg is None:
+            return self.cbm or None
+        return max(self.cbm, self.gross_weight_kg / 1000)
+
+    def to_text(self, sheet_name: str) -> str:
+        lines = [f"Packing list summary (sheet '{sheet_name}', {self.line_items} line items, totals computed):"]
+        lines.append(f"  Total packages: {self.packages:,.0f}")
+        if self.cbm:
+            lines.append(f"  Total volume: {self.cbm:,.3f} CBM")
+        if self.gross_weight_kg is not None:
+            lines.append(f"  Total gross weight: {self.gross_weight_kg:,.1f} kg")
+        if self.volumetric_weight_kg:
+            lines.append(f"  Volumetric weight (1:{VOLUMETRIC_DIVISOR}): {self.volumetric_weight_kg:,.1f} kg")
+        if self.chargeable_weight_kg is not None:
+            lines.append(f"  Chargeable weight (air): {self.chargeable_weight_kg:,.1f} kg")
+        if self.revenue_tons is not None:
+            lines.append(f"  W/M (LCL revenue tons): {self.revenue_tons:,.3f}")
+        if self.largest_cm is not None:
+            lines.append("  Largest package: {:g} x {:g} x {:g} cm".format(*self.largest_cm))
+        if self.goods:
+            lines.append(f"  Goods: {'; '.join(self.goods)}")
+        lines.append("  Columns used: " + ", ".join(f"{role}={header!r}" for role, header in self.columns.items()))
+        return "\n".join(lines)
+
+
+def _header_text(value: Any) -> str:
+    return " ".join(str(value).lower().replace("_", " ").split())
+
+def find_columns(headers: List[Any]) -> Dict[str, int]:
+    """Role -> column position for the headers that say what they hold (first match wins)."""
+    found: Dict[str, int] = {}
+    per_unit: Dict[str, bool] = {}
+    for position, header in enumerate(headers):
+        text = _header_text(header)
+        if not text or text.startswith("unnamed"):
+            continue
+        for role, pattern in _ROLES.items():
+            if not pattern.search(text):
+                continue
+            if role == "gross_weight" and _OTHER_WEIGHT.search(text) and "gross" not in text:
+                continue
+            if role == "cbm" and _ROLES["gross_weight"].search(text) and not _CBM_UNIT.search(text):
+                continue
+            if role == "quantity" and (
+                _NOT_A_COUNT.search(text)
+                # "Weight (kg)" is not a quantity, "Qty (cartons)" is not a weight
+                or (_ROLES["gross_weight"].search(text) and not re.search(r"\b(?:qty|quantity)\b", text))
+            ):
+                continue
+            # First match wins, except that a line total beats a per-unit figure
+            unit = bool(_PER_UNIT.search(text))
+            if role not in found or (per_unit[role] and not unit):
+                found[role] = position
+                per_unit[role] = unit
+            break
+    return found
+
+def _locate_header(df: Any) -> Optional[Tuple[int, Dict[str, int]]]:
+    """
+    (row, columns) of the header: -1 for the DataFrame's own columns, else
+    the index of the row within the first HEADER_SCAN_ROWS that names the
+    most roles. None if no row names a quantity, dimensions or weight.
+    """
+    best: Optional[Tuple[int, Dict[str, int]]] = None
+    candidates = [(-1, list(df.columns))] + [
+        (row, df.iloc[row].tolist()) for row in range(min(HEADER_SCAN_ROWS, len(df)))
+    ]
+    for row, headers in candidates:
+        columns = find_columns(headers)
+        # "Size" may be a container size or a carton size: only LxWxH values count
+        if "dimensions" in columns and not _holds_dimensions(df.iloc[row + 1:, columns["dimensions"]]):
+            del columns["dimensions"]
+        measures = {"quantity", "dimensions", "length", "gross_weight", "cbm"} & columns.keys()
+        if len(measures) >= 2 and (best is None or len(columns) > len(best[1])):
+            best = (row, columns)
+    return best
+
+def _holds_dimensions(series: Any) -> bool:
+    cells = series.astype(str).str.strip()
+    cells = cells[cells != ""]
+    if cells.empty:
+        return False
+    matched = cells.str.replace(",", ".", regex=False).str.extract(_DIMENSIONS)[0].notna()
+    return float(matched.mean()) >= MIN_DIMENSION_CELLS
+
+def _cell_texts(values: List[Any]) -> List[str]:
+    texts = [str(v).strip() for v in values]
+    return [t for t in texts if t and t.lower() != "nan" and not t.startswith("Unnamed:")]
+
+def _is_numeric(series: Any) -> bool:
+    """Mostly plain numbers (line numbers, net weights, prices): per-line figures, not details."""
+    import pandas as pd
+
+    cells = series.astype(str).str.strip()
+    cells = cells[cells != ""]
+    if cells.empty:
+        return False
+    numbers = pd.to_numeric(cells.str.replace(",", "", regex=False), errors="coerce")
+    return float(numbers.notna().mean()) >= 0.5
+
+def _details(df: Any, header_row: int, headers: List[str], roles: Dict[str, int], keep: Any) -> str:
+    """
+    The sheet minus its per-line figures: rows above the header, then the
+    distinct rows of the text columns (ports, container types, goods...).
+    """
+    lines = []
+    above = [list(df.columns)] + [df.iloc[row].tolist() for row in range(header_row)] if header_row >= 0 else []
+    for values in above:
+        texts = _cell_texts(values)
+        if texts:
+            lines.append(" | ".join(texts))
+
+    measured = {position for role, position in roles.items() if role in MEASURE_ROLES}
+    body = df.iloc[header_row + 1:][keep]
+    others = [
+        position for position in range(df.shape[1])
+        if position not in measured and headers[position] and not headers[position].startswith("unnamed")
+        and not _is_numeric(body.iloc[:, position])
+    ]
+    if others:
+        table = body.iloc[:, others].astype(str).apply(lambda c: c.str.strip())
+        names = list(df.columns) if header_row < 0 else df.iloc[header_row].tolist()
+        table.columns = [str(names[position]) for position in others]
+        table = table[(table != "").any(axis=1)].drop_duplicates()
+        if not table.empty:
+            lines.append(table.to_string(index=False))
+    return "\n".join(lines)
+
+def _numbers(series: Any) -> Any:
+    """A column as float64, NaN where a cell holds no number ("1,200 kg" -> 1200.0)."""
+    import pandas as pd
+
+    text = series.astype(str).str.replace(",", "", regex=False).str.extract(r"(-?\d+(?:\.\d+)?)", expand=False)
+    return pd.to_numeric(text, errors="coerce").to_numpy(dtype="float64")
+
+def _length_factor(header: str) -> float:
+    for pattern, factor in _LENGTH_UNITS:
+        if pattern.search(header):
+            return factor
+    return 1.0
+
+def summarize_packing_list(df: Any) -> Optional[PackingSummary]:
+    """
+    Totals for a packing-list sheet, or None if the sheet does not look
+    like one (no recognisable quantity/dimension/weight columns, or fewer
+    than MIN_LINE_ITEMS line items). Every figure is computed for all rows
+    at once; rows labelled as totals are left out so nothing counts twice.
+    """
+    import numpy as np
+
+    located = _locate_header(df)
+    if located is None:
+        return None
+    header_row, roles = located
+    headers = [_header_text(h) for h in (df.columns if header_row < 0 else df.iloc[header_row].tolist())]
+    body = df.iloc[header_row + 1:]
+    if body.empty:
+        return None
+
+    def column(role: str) -> Any:
+        return body.iloc[:, roles[role]]
+
+    # Drop "Total" rows: a leading cell (or the description) starting with the word
+    label_columns = sorted(set(range(min(TOTAL_LABEL_COLUMNS, body.shape[1]))) | {roles.get("description", 0)})
+    text_cells = body.iloc[:, label_columns].astype(str)
+    is_total = np.zeros(len(body), dtype=bool)
+    for position in range(text_cells.shape[1]):
+        is_total |= text_cells.iloc[:, position].str.match(_TOTAL_ROW, case=False).to_numpy(dtype=bool)
+
+    length = width = height = None
+    if {"length", "width", "height"} <= roles.keys():
+        length, width, height = (_numbers(column(r)) * _length_factor(headers[roles[r]]) for r in ("length", "width", "height"))
+    elif "dimensions" in roles:
+        parts = column("dimensions").astype(str).str.replace(",", ".", regex=False).str.extract(_DIMENSIONS)
+        factor = _length_factor(headers[roles["dimensions"]])
+        length, width, height = (parts[i].astype("float64").to_numpy() * factor for i in range(3))
+
+    quantity = _numbers(column("quantity")) if "quantity" in roles else np.full(len(body), np.nan)
+    weight = _numbers(column("gross_weight")) if "gross_weight" in roles else None
+    volume = _numbers(column("cbm")) if "cbm" in roles else None
+
+    if length is not None:
+        has_dims = ~(np.isnan(length) | np.isnan(width) | np.isnan(height))
+    else:
+        has_dims = np.zeros(len(body), dtype=bool)
+    measured = has_dims | ~np.isnan(quantity)
+    if weight is not None:
+        measured |= ~np.isnan(weight)
+    if volume is not None:
+        measured |= ~np.isnan(volume)
+    line = measured & ~is_total
+    if int(line.sum()) < MIN_LINE_ITEMS:
+        return None
+
+    # A line with measures but no quantity is one package
+    packages = np.where(np.isnan(quantity), 1.0, quantity)[line]
+    columns = {role: str(headers[position]) for role, position in roles.items()}
+
+    cbm_dims = np.zeros(int(line.sum()))
+    if length is not None:
+        cbm_dims = np.nan_to_num(length[line] * width[line] * height[line] / 1e6) * packages
+    if volume is not None:
+        listed = volume[line]
+        if _PER_UNIT.search(headers[roles["cbm"]]):
+            listed = listed * packages
+        # Use the sheet's own CBM where a line has one, the dimensions elsewhere
+        line_cbm = np.where(np.isnan(listed), cbm_dims, listed)
+    else:
+        line_cbm = cbm_dims
+    cbm = float(line_cbm.sum())
+
+    gross = None
+    if weight is not None:
+        line_weight = weight[line]
+        if _PER_UNIT.search(headers[roles["gross_weight"]]):
+            line_weight = line_weight * packages
+        if _LBS.search(headers[roles["gross_weight"]]):
+            line_weight = line_weight * 0.45359237
+        gross = float(np.nansum(line_weight))
+
+    largest = None
+    if length is not None and has_dims[line].any():
+        sizes = np.where(has_dims[line], length[line] * width[line] * height[line], -1.0)
+        biggest = int(np.argmax(sizes))
+        largest = (float(length[line][biggest]), float(width[line][biggest]), float(height[line][biggest]))
+
+    goods: List[str] = []
+    if "description" in roles:
+        described = column("description").astype(str).str.strip()[line]
+        counts = described[described != ""].value_counts()
+        goods = counts.index[:MAX_GOODS].tolist()
+        if len(counts) > MAX_GOODS:
+            goods.append(f"(+{len(counts) - MAX_GOODS} more)")
+
+    return PackingSummary(
+        line_items=int(line.sum()),
+        packages=float(packages.sum()),
+        cbm=cbm,
+        gross_weight_kg=gross,
+        volumetric_weight_kg=cbm * 1e6 / VOLUMETRIC_DIVISOR,
+        largest_cm=largest,
+        goods=goods,
+        columns=columns,
+        details=_details(df, header_row, headers, roles, ~is_total),
+    )
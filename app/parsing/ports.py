@@ -0,0 +1,142 @@
+import csv
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.parsing.fuzzy_index import TrigramIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+_LOCODE = re.compile(r"^[A-Z]{2} ?[A-Z2-9]{3}$")
+# Words that only say "this is a port"
+_PORT_WORDS = re.compile(r"\b(?:PORT OF|SEAPORT|PORT|HARBOU?R|TERMINAL|CONTAINER|CY|ICD)\b")
+# Where the place name ends and country/extra detail begins: "Shanghai, China", "Jebel Ali (JAFZA)"
+_SEPARATORS = re.compile(r"[,(]")
+# A place part naming alternatives, e.g. "Jebel Ali / Abu Dhabi": never collapsed to one port
+_ALTERNATIVES = re.compile(r"[/;&]|\bOR\b|\bAND\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Port:
+    locode: str
+    name: str
+
+
+def match_key(text: str) -> str:
+    return " ".join(_PORT_WORDS.sub(" ", normalize(text)).split())
+
+
+class PortDirectory:
+    """
+    Port and location names from a UN/LOCODE-style CSV (locode, name,
+    country_names) plus an alias table (alias, locode), indexed for exact,
+    prefix and fuzzy lookup. Each port is also indexed as "<name>
+    <country>", which tells apart same-named ports ("Manzanillo, Panama");
+    a bare name shared by several ports resolves to none of them.
+    """
+    def __init__(self, ports: List[Port], countries: Dict[str, List[str]], aliases: Dict[str, str]):
+        self.by_code = {port.locode: port for port in ports}
+        self.names: TrigramIndex[Port] = TrigramIndex()
+        for port in ports:
+            self.names.add(match_key(port.name), port)
+            for country in countries.get(port.locode, []):
+                self.names.add(match_key(f"{port.name} {country}"), port)
+        for alias, locode in aliases.items():
+            if locode in self.by_code:
+                self.names.add(match_key(alias), self.by_code[locode])
+            else:
+                logger.warning(f"Port alias '{alias}' points at unknown LOCODE {locode}.")
+
+    @classmethod
+    def load(cls, ports_path: Path, aliases_path: Optional[Path]) -> "PortDirectory":
+        ports: List[Port] = []
+        countries: Dict[str, List[str]] = {}
+        with open(ports_path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                port = Port(locode=row["locode"].strip().upper(), name=row["name"].strip())
+                ports.append(port)
+                countries[port.locode] = [c.strip() for c in (row.get("country_names") or "").split(";") if c.strip()]
+        aliases: Dict[str, str] = {}
+        if aliases_path is not None:
+            with open(aliases_path, "r", encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    aliases[row["alias"].strip()] = row["locode"].strip().upper()
+        logger.info(f"Loaded {len(ports)} ports and {len(aliases)} aliases from {ports_path.parent}.")
+        return cls(ports, countries, aliases)
+
+    def resolve(self, text: Optional[str]) -> Optional[Port]:
+        """
+        The port `text` names: a LOCODE, an exact name or alias (with or
+        without country), a fuzzy match, or an unambiguous prefix.
+        """
+        if not text or not text.strip():
+            return None
+        code = normalize(text).replace(" ", "")
+        if _LOCODE.match(normalize(text)) and code in self.by_code:
+            return self.by_code[code]
+
+        key = match_key(text)
+        found = self.names.exact(key) if key else []
+        if len(found) == 1:
+            return found[0]
+        if len(found) > 1:
+            return self._ambiguous(text, found)
+        head = _SEPARATORS.split(text, 1)[0]
+        if _ALTERNATIVES.search(head):
+            logger.warning(f"Port '{text}' names more than one place; leaving it unmatched.")
+            return None
+
+        place = match_key(head)
+        if place and place != key:
+            found = self.names.exact(place)
+            if len(found) == 1:
+                return found[0]
+            if len(found) > 1:
+                return self._ambiguous(text, found)
+        for candidate in dict.fromkeys([key, place]):
+            if not candidate:
+                continue
+            matches = self.names.search(candidate, settings.PORT_MATCH_THRESHOLD, limit=5)
+            if matches:
+                best = {port for port, score in matches if score == matches[0][1]}
+                return best.pop() if len(best) == 1 else self._ambiguous(text, sorted(best, key=lambda p: p.locode))
+        if len(place) >= 4:
+            starts = set(self.names.prefix(place, limit=5))
+            if len(starts) == 1:
+                return starts.pop()
+        return None
+
+
+    def _ambiguous(self, text: str, ports: List[Port]) -> Optional[Port]:
+        codes = ", ".join(port.locode for port in ports)
+        logger.warning(f"Port '{text}' could be any of {codes}; leaving it unmatched.")
+        return None
+
+
+# --- Process-wide directory ---
+
+_directory: Optional[PortDirectory] = None
+_directory_failed = False
+_directory_lock = threading.Lock()
+
+def get_port_directory() -> Optional[PortDirectory]:
+    """
+    The bundled port index (PORTS_CSV, PORT_ALIASES_CSV), loaded on first
+    use. None if it could not be read (ports then stay as extracted).
+    """
+    global _directory, _directory_failed
+    with _directory_lock:
+        if _directory is None and not _directory_failed:
+            try:
+                directory = PortDirectory.load(settings.PORTS_CSV, settings.PORT_ALIASES_CSV)
+            except (OSError, csv.Error, KeyError) as e:
+                logger.error(f"Could not load port data from {settings.PORTS_CSV}: {e}")
+                _directory_failed = True
+                return None
+            directory.names.build()
+            _directory = directory
+        return _directory
@@ -1,27 +1,10 @@
-from app.models.qtc_models import QTCFormData
-
-def get_extraction_prompt(email_context: str) -> str:
-    """
-    Generates the master prompt for the AI, combining the
-    extraction rules (from the PDF) with the raw email context.
-    """
-
-    # Get the Pydantic model's JSON schema as a string
-    # This tells the AI *exactly* what fields and types to return.
-    json_schema = QTCFormData.model_json_schema()
+import json
+from typing import Any, Dict, List, Tuple
 
-    prompt = f"""
-    You are an expert logistics data extraction agent. Your task is to analyze an
-    unstructured email for a freight quote request and extract the information
-    needed to fill a QTC (Quote-to-Customer) form.
-
-    You MUST return your answer in a valid JSON format that adheres to the
-    following JSON Schema:
-    
-    <JSON_SCHEMA>
-    {json_schema}
-    </JSON_SCHEMA>
+from app.models.qtc_models import QTCFormData
 
+# Shared by the single and the batch prompt
+_EXTRACTION_RULES = """\
     ---
     EXTRACTION RULES (from QTC v3 Documentation):
     Follow these rules precisely.
@@ -33,8 +16,8 @@ def get_extraction_prompt(email_context: str) -> str:
 
     2.  **client_name**:
         - Extract the company name from the email signature or body.
-        - This will be validated against a database later, so get the
-          most accurate name (e.g., "ATIQ AL DHAHERI & CO LLC").
+        - Copy it as written (e.g., "ATIQ AL DHAHERI & CO LLC"); it is
+          matched against the client master data afterwards.
 
     3.  **product**:
         - Keywords "ocean", "sea", "vessel", "FCL", "LCL" -> "Ocean"
@@ -59,12 +42,11 @@ def get_extraction_prompt(email_context: str) -> str:
     6.  **containers** (if ocean_type is "FCL"):
         - Parse strings like "2x20ft", "1 x 40HC".
         - Populate a list of objects:
-          [ {{"container_type": "20GP", "quantity": 2}},
-            {{"container_type": "40HC", "quantity": 1}} ]
+          [ {"container_type": "20GP", "quantity": 2},
+            {"container_type": "40HC", "quantity": 1} ]
 
     7.  **port_of_loading** & **port_of_discharge**:
-        - Extract origin and destination ports/cities.
-        - Standardize names (e.g., "Jebel Ali" not "JAFZA").
+        - Extract origin and destination ports/cities as written.
 
     8.  **commodity**:
         - **CRITICAL**: This field is mandatory.
@@ -80,7 +62,31 @@ def get_extraction_prompt(email_context: str) -> str:
         - Default to `false`.
         - Set to `true` if email mentions "DG", "hazardous", "IMDG", or
           has an "MSDS" attachment.
+"""
+
+def get_extraction_prompt(email_context: str) -> str:
+    """
+    Generates the master prompt for the AI, combining the
+    extraction rules (from the PDF) with the raw email context.
+    """
+
+    # Get the Pydantic model's JSON schema as a string
+    # This tells the AI *exactly* what fields and types to return.
+    json_schema = QTCFormData.model_json_schema()
+
+    prompt = f"""
+    You are an expert logistics data extraction agent. Your task is to analyze an
+    unstructured email for a freight quote request and extract the information
+    needed to fill a QTC (Quote-to-Customer) form.
+
+    You MUST return your answer in a valid JSON format that adheres to the
+    following JSON Schema:
+    
+    <JSON_SCHEMA>
+    {json_schema}
+    </JSON_SCHEMA>
 
+{_EXTRACTION_RULES}
     ---
     EMAIL CONTEXT TO ANALYZE:
     This includes the email body and text from all attachments.
@@ -99,3 +105,94 @@ def get_extraction_prompt(email_context: str) -> str:
     """
     
     return prompt
+
+def get_batch_extraction_prompt(documents: List[Tuple[str, str]]) -> str:
+    """
+    One prompt for several emails, given as (document id, email context)
+    pairs. The schema and rules are sent once; the answer is a JSON array
+    with one object per document, tagged with its "document_id".
+    """
+    json_schema = QTCFormData.model_json_schema()
+    blocks = "\n".join(
+        f'<DOCUMENT id="{document_id}">\n{context}\n</DOCUMENT>' for document_id, context in documents
+    )
+
+    return f"""
+    You are an expert logistics data extraction agent. Your task is to analyze
+    several unrelated emails, each a freight quote request, and extract from
+    each one the information needed to fill a QTC (Quote-to-Customer) form.
+
+    For EACH document you MUST return one JSON object that adheres to the
+    following JSON Schema, plus a "document_id" field holding the id of the
+    <DOCUMENT> it was extracted from:
+
+    <JSON_SCHEMA>
+    {json_schema}
+    </JSON_SCHEMA>
+
+{_EXTRACTION_RULES}
+    ---
+    EMAILS TO ANALYZE:
+    Each <DOCUMENT> holds one email body and the text of its attachments.
+    Treat every document on its own; never carry a value from one document
+    over to another.
+
+{blocks}
+
+    ---
+    TASK:
+    Analyze each <DOCUMENT> using the EXTRACTION RULES and return *only* a
+    valid JSON array containing exactly one object per document
+    ({len(documents)} in total), each with its "document_id".
+    Do not include any other text, greetings, or explanations.
+    If a mandatory field (commodity, freetime_requirement) is not found in a
+    document, you MUST return "NOT_FOUND_HIL" as its value for that document.
+    """
+
+def get_delta_extraction_prompt(current_form: Dict[str, Any], new_message: str) -> str:
+    """
+    For a follow-up in a thread already extracted: the form as it stands
+    and only the new message, to be merged into an updated form.
+    """
+    json_schema = QTCFormData.model_json_schema()
+    current = json.dumps(current_form, indent=2, default=str)
+
+    return f"""
+    You are an expert logistics data extraction agent. A customer has
+    followed up on a freight quote request that was already extracted into
+    a QTC (Quote-to-Customer) form. Update the form with what the new
+    message changes or adds.
+
+    You MUST return the complete, updated form as valid JSON that adheres
+    to the following JSON Schema:
+
+    <JSON_SCHEMA>
+    {json_schema}
+    </JSON_SCHEMA>
+
+{_EXTRACTION_RULES}
+    ---
+    CURRENT FORM (extracted from the earlier messages in the thread):
+
+    <CURRENT_FORM>
+    {current}
+    </CURRENT_FORM>
+
+    ---
+    NEW MESSAGE:
+    Only the text the customer just added (plus any new attachments).
+
+    <NEW_MESSAGE>
+    {new_message}
+    </NEW_MESSAGE>
+
+    ---
+    TASK:
+    Apply the NEW_MESSAGE to the CURRENT_FORM using the EXTRACTION RULES.
+    - Change a field only if the new message corrects, replaces or adds to it
+      (e.g. "correction, make it 3x40HC" replaces the containers).
+    - Keep every other field exactly as it is in the CURRENT_FORM.
+    - A "NOT_FOUND_HIL" field that the new message now answers gets the new value.
+    Return *only* the updated JSON object adhering to the <JSON_SCHEMA>.
+    Do not include any other text, greetings, or explanations.
+    """
@@ -0,0 +1,324 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.coordination import get_coordinator
+from app.core.fairqueue import FairQueue
+from app.core.metrics import JOBS, JOBS_IN_PROGRESS, QUEUE_DEPTH
+from app.processing import (
+    EmailJob,
+    extract_attachments,
+    extract_with_llm,
+    fetch_email,
+    finish_trace,
+    observe_job_end,
+    parse_email,
+    record_failure,
+    restore_checkpoint,
+    resume_stage,
+    run_stage,
+    submit_form,
+)
+from app.services.graph_api import GraphThrottledError
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of the pipeline: a bounded queue drained by its own workers.
+    The queue is split per mailbox and served round-robin, so one busy
+    mailbox cannot starve the others; within that, higher-priority and
+    nearly-due jobs go first (see app/priority.py).
+
+    A worker only takes the next job once it has handed the current one to
+    the next stage. When a downstream queue is full, workers here block,
+    this queue fills up, and the backpressure travels upstream.
+    """
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[EmailJob], None],
+        workers: int,
+        queue_size: int,
+        max_in_flight_per_mailbox: Optional[int] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = FairQueue(
+            queue_size,
+            max_in_flight_per_mailbox,
+            aging_per_second=settings.PRIORITY_AGING_PER_MINUTE / 60,
+            deadline_lead=settings.PRIORITY_DEADLINE_LEAD_SECONDS,
+        )
+        # Set on every put and get: set_function gauges are not exported
+        # under PROMETHEUS_MULTIPROC_DIR
+        self._depth = QUEUE_DEPTH.labels(stage=name)
+        self.next_stage: Optional["Stage"] = None
+        self.on_error: Optional[Callable[["Stage", EmailJob, Exception], None]] = None
+        self.on_done: Optional[Callable[[EmailJob], None]] = None
+
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._started_at = 0.0
+        self._processed = 0
+        self._failed = 0
+        self._busy = 0
+        self._busy_seconds = 0.0
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"stage-{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self.queue.put_control(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def put(self, job: EmailJob, timeout: Optional[float] = None, reserved: bool = False) -> None:
+        """
+        Blocks while the job's mailbox queue is full; raises queue.Full
+        after `timeout`. `reserved` uses room held by `queue.reserve()`.
+        Jobs are served by priority and deadline.
+        """
+        self.queue.put(
+            job.mailbox,
+            (job, time.monotonic()),
+            timeout=timeout,
+            priority=job.priority,
+            deadline=job.deadline,
+            since=job.created_at,
+            reserved=reserved,
+        )
+        self._depth.set(self.queue.qsize())
+
+    def _work(self) -> None:
+        while True:
+            mailbox, item = self.queue.get()
+            self._depth.set(self.queue.qsize())
+            if item is _STOP:
+                break
+            job, queued_at = item
+
+            with self._lock:
+                self._busy += 1
+            start = time.monotonic()
+            try:
+                with tracing.activate(job.trace):
+                    run_stage(job, self.name, self.fn, queue_wait_ms=round((start - queued_at) * 1000, 1))
+                failed = None
+            except Exception as e:
+                failed = e
+            self.queue.task_done(mailbox)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._busy -= 1
+                self._busy_seconds += elapsed
+                if failed is None:
+                    self._processed += 1
+                else:
+                    self._failed += 1
+
+            if failed is not None:
+                logger.error(f"[{self.name}] Job {job.email_id} failed: {failed}", exc_info=failed)
+                if self.on_error:
+                    self.on_error(self, job, failed)
+            elif job.done or self.next_stage is None:
+                if self.on_done:
+                    self.on_done(job)
+            else:
+                self.next_stage.put(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            completed = self._processed + self._failed
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "busy": self._busy,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue_size,
+                "queue_depth_by_mailbox": self.queue.sizes(),
+                "processed": self._processed,
+                "failed": self._failed,
+                "throughput_per_min": round(completed / uptime * 60, 2),
+                "avg_seconds": round(self._busy_seconds / completed, 3) if completed else 0.0,
+            }
+
+
+class EmailPipeline:
+    """
+    fetch -> parse -> extract -> llm -> submit, each stage with its own
+    bounded queue and worker count, so e.g. 20 Graph fetches can be in
+    flight while 4 browsers submit. Graph fetches are additionally capped
+    per mailbox (MAILBOX_MAX_IN_FLIGHT), and a mailbox Graph throttles is
+    paused for its Retry-After without holding up the others.
+
+    Speculative form warm-up is not used here: the submit stage already
+    overlaps page loads with other jobs' LLM calls, and holding browsers
+    for jobs still queued could starve the submit workers.
+    """
+    def __init__(self, queue_size: int, workers: Dict[str, int]):
+        self.stages = [
+            Stage("fetch", fetch_email, workers["fetch"], queue_size, settings.MAILBOX_MAX_IN_FLIGHT),
+            Stage("parse", parse_email, workers["parse"], queue_size),
+            Stage("extract", extract_attachments, workers["extract"], queue_size),
+            Stage("llm", extract_with_llm, workers["llm"], queue_size),
+            Stage("submit", submit_form, workers["submit"], queue_size),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        for stage in self.stages:
+            stage.on_done = self._job_done
+            stage.on_error = self._job_failed
+
+        self._started = False
+
+    def start(self) -> None:
+        if self._started:
+            return
+        for stage in self.stages:
+            stage.start()
+        self._started = True
+        logger.info("Pipeline started: " + ", ".join(f"{s.name}x{s.workers}" for s in self.stages))
+
+    def stop(self) -> None:
+        if not self._started:
+            return
+        # Stop from the front so in-flight jobs can still drain downstream
+        for stage in self.stages:
+            stage.stop()
+        self._started = False
+        logger.info("Pipeline stopped.")
+
+    def submit(self, email_id: str, timeout: Optional[float] = None, mailbox: Optional[str] = None) -> None:
+        """
+        Enqueues an email at the first stage it still needs (after any
+        checkpoint). Raises queue.Full if that queue stays full. Emails
+        another replica holds or has finished are skipped.
+        """
+        self.submit_many([email_id], timeout, mailbox)
+
+    def submit_many(self, email_ids: List[str], timeout: Optional[float] = None, mailbox: Optional[str] = None) -> int:
+        """
+        Enqueues a batch of one mailbox's emails all or nothing: room for
+        every email is reserved in the queue it enters before any is
+        queued. If a queue stays full, queue.Full is raised with none of
+        them queued, so a redelivered notification runs no email twice.
+        Returns how many were queued.
+        """
+        coordinator = get_coordinator()
+        key = mailbox or settings.MAILBOX_UPN
+        jobs: List[EmailJob] = []
+        for email_id in dict.fromkeys(email_ids):
+            if not coordinator.claim_email(email_id, mailbox):
+                logger.info(f"Skipping {email_id}: already handled by another replica.")
+                continue
+            job = EmailJob(email_id=email_id, mailbox=key, trace=tracing.start_trace(email_id))
+            jobs.append(job)
+
+        reserved: List[Tuple[Stage, int]] = []
+        try:
+            by_stage: Dict[str, List[EmailJob]] = {}
+            for job in jobs:
+                restore_checkpoint(job)
+                by_stage.setdefault(resume_stage(job), []).append(job)
+            for name, group in by_stage.items():
+                stage = self._stage(name)
+                stage.queue.reserve(key, len(group), timeout)
+                reserved.append((stage, len(group)))
+        except Exception:
+            for stage, count in reserved:
+                stage.queue.unreserve(key, count)
+            for job in jobs:
+                coordinator.release_email(job.email_id, completed=False)
+            raise
+
+        for job in jobs:
+            logger.info(f"[JOB_START] Queueing email: {job.email_id}")
+            self._stage(resume_stage(job)).put(job, reserved=True)
+            JOBS.labels(outcome="started").inc()
+            JOBS_IN_PROGRESS.inc()
+        return len(jobs)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [stage.stats() for stage in self.stages]
+
+    def _job_done(self, job: EmailJob) -> None:
+        elapsed = time.monotonic() - job.created_at
+        JOBS_IN_PROGRESS.dec()
+        observe_job_end(job)
+        finish_trace(job)
+        get_coordinator().release_email(job.email_id, completed=True)
+        logger.info(f"[JOB_END] Finished processing: {job.email_id} in {elapsed:.1f}s. Result: {job.result}")
+
+    def _stage(self, name: str) -> Stage:
+        return next(stage for stage in self.stages if stage.name == name)
+
+    def _job_failed(self, stage: Stage, job: EmailJob, error: Exception) -> None:
+        job.stage = stage.name
+        if isinstance(error, GraphThrottledError):
+            # Hold back the rest of this mailbox's fetches too
+            stage.queue.pause(job.mailbox, error.retry_after)
+        delay = record_failure(job, error)
+        if delay is None:
+            logger.error(f"FATAL error in {stage.name} stage: {job.email_id} moved to dead letters.")
+            JOBS_IN_PROGRESS.dec()
+            observe_job_end(job)
+            finish_trace(job)
+            get_coordinator().release_email(job.email_id, completed=True)
+            return
+        # Re-enter at the first stage without a result, off the worker thread
+        timer = threading.Timer(delay, self._retry, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, job: EmailJob) -> None:
+        if not self._started:
+            logger.warning(f"Pipeline stopped, dropping retry for {job.email_id} (checkpoint kept).")
+            get_coordinator().release_email(job.email_id, completed=False)
+            return
+        self._stage(resume_stage(job)).put(job)
+
+
+# --- Process-wide pipeline ---
+
+_pipeline: Optional[EmailPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> EmailPipeline:
+    """Returns the shared pipeline, created from settings on first use."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = EmailPipeline(
+                queue_size=settings.PIPELINE_QUEUE_SIZE,
+                workers={
+                    "fetch": settings.PIPELINE_FETCH_WORKERS,
+                    "parse": settings.PIPELINE_PARSE_WORKERS,
+                    "extract": settings.PIPELINE_EXTRACT_WORKERS,
+                    "llm": settings.PIPELINE_LLM_WORKERS,
+                    "submit": settings.PIPELINE_SUBMIT_WORKERS,
+                },
+            )
+        return _pipeline
+
+def shutdown_pipeline() -> None:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
@@ -0,0 +1,90 @@
+"""
+Scores emails for priority scheduling (the pipeline's queues and the job
+queue) from signals that are cheap to get once the email is parsed: who
+sent it, its subject and whether the body carries a quote table. The
+score decides the job's priority class ("high", "normal", "low"), and the
+class its SLA deadline.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.parsing.clients import email_domain, get_client_directory
+
+PRIORITY_CLASSES = ("high", "normal", "low")
+
+# Score weights
+KEY_CLIENT_DOMAIN = 3.0
+KNOWN_CLIENT_DOMAIN = 1.0
+URGENT_SUBJECT = 2.0
+BULK_SUBJECT = -3.0
+QUOTE_TABLE = 1.0
+# Rows parse_key_value_table must find before the body counts as a quote table
+MIN_QUOTE_TABLE_ROWS = 3
+
+# Class boundaries: score >= HIGH is "high", score < LOW is "low"
+HIGH = 3.0
+LOW = 0.0
+
+
+@dataclass(frozen=True)
+class Priority:
+    score: float
+    label: str
+    # What contributed, e.g. ("key_client", "quote_table"), for the logs
+    reasons: Tuple[str, ...]
+
+
+def _keyword_pattern(keywords: List[str]) -> Optional["re.Pattern[str]"]:
+    if not keywords:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b", re.IGNORECASE)
+
+_URGENT = _keyword_pattern(settings.PRIORITY_URGENT_KEYWORDS)
+_BULK = _keyword_pattern(settings.PRIORITY_BULK_KEYWORDS)
+_KEY_DOMAINS = {domain.lower() for domain in settings.PRIORITY_SENDER_DOMAINS}
+
+
+def score_email(parsed_email: Dict[str, Any]) -> Priority:
+    """The priority of an email, from the output of parse_full_email."""
+    score = 0.0
+    reasons: List[str] = []
+
+    domain = email_domain((parsed_email.get("sender") or {}).get("email"))
+    if domain:
+        directory = get_client_directory()
+        if domain in _KEY_DOMAINS or domain.split(".", 1)[-1] in _KEY_DOMAINS:
+            score += KEY_CLIENT_DOMAIN
+            reasons.append("key_client")
+        elif directory is not None and domain in directory.domains:
+            score += KNOWN_CLIENT_DOMAIN
+            reasons.append("known_client")
+
+    subject = parsed_email.get("subject") or ""
+    if _BULK is not None and _BULK.search(subject):
+        score += BULK_SUBJECT
+        reasons.append("bulk_subject")
+    elif _URGENT is not None and _URGENT.search(subject):
+        score += URGENT_SUBJECT
+        reasons.append("urgent_subject")
+
+    if len(parsed_email.get("table_data") or {}) >= MIN_QUOTE_TABLE_ROWS:
+        score += QUOTE_TABLE
+        reasons.append("quote_table")
+
+    label = "high" if score >= HIGH else "low" if score < LOW else "normal"
+    return Priority(score, label, tuple(reasons))
+
+def score_message(message: Dict[str, Any]) -> Priority:
+    """
+    The priority of a Graph message that is not parsed yet (e.g. from a
+    rich notification, at enqueue): sender and subject only, since the
+    quote table is only known once the body is parsed.
+    """
+    sender = ((message.get("from") or {}).get("emailAddress") or {}).get("address")
+    return score_email({"sender": {"email": sender}, "subject": message.get("subject")})
+
+def sla_seconds(label: str) -> float:
+    """How long a job of this class may take end to end."""
+    return settings.PRIORITY_SLA_SECONDS.get(label, settings.PRIORITY_SLA_SECONDS["normal"])
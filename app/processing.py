@@ -1,76 +1,512 @@
 import logging
+import random
 import tempfile
 import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
 from pydantic import ValidationError
 from app.models.qtc_models import QTCFormData
 
-from app.services.graph_api import get_graph_service_sync, GraphApiService
-from app.services.gemini import get_structured_data_from_ai
-from app.services.playwright import fill_qtc_form_job
-from app.parsing.email_parser import parse_full_email
+from app.services.graph_api import get_graph_service_sync, GraphApiService, GraphThrottledError
+from app.services.gemini import GeminiThrottledError, get_structured_data_from_ai, get_structured_delta_from_ai
+from app.core import tracing
+from app.core.config import settings
+from app.core.checkpoints import checkpoint_store, dead_letter_store
+from app.core.conversations import get_conversation_store
+from app.core.coordination import get_coordinator
+from app.core.metrics import (
+    CACHE_HITS,
+    ENTITY_RESOLUTION,
+    FAILURES,
+    JOB_SECONDS,
+    JOB_SECONDS_BY_PRIORITY,
+    JOBS,
+    JOBS_IN_PROGRESS,
+    SLA_MISSES,
+    observe_stage,
+    stage_timer,
+)
+from app.services.submission import submit_qtc_record, prepare_submission, release_submission
+from app.parsing.email_parser import html_to_text, parse_full_email
 from app.parsing.doc_processor import DocumentProcessor
+from app.parsing.clients import get_client_directory
+from app.parsing.ports import get_port_directory
+from app.priority import score_email, sla_seconds
 
 logger = logging.getLogger(__name__)
 
-def run_automation_job(validated_data: QTCFormData) -> None:
+@dataclass
+class EmailJob:
+    """Everything one email accumulates on its way through the stages."""
+    email_id: str
+    # Mailbox the email lives in (one of settings.mailboxes)
+    mailbox: str = ""
+    email_data: Optional[Dict[str, Any]] = None
+    attachments: List[Dict[str, Any]] = field(default_factory=list)
+    parsed_email: Optional[Dict[str, Any]] = None
+    full_context: Optional[str] = None
+    validated_data: Optional[QTCFormData] = None
+    prepared: Optional[Any] = None
+    result: Optional[str] = None
+    # Set when the job should not go on to the next stage (e.g. invalid data)
+    done: bool = False
+    # Name of the stage currently (or last) running, and failed attempts so far
+    stage: str = "fetch"
+    failures: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    trace: Optional[tracing.Trace] = None
+    # Set by prioritize() once the email is parsed; deadline is time.monotonic()-based
+    priority: float = 0.0
+    priority_class: str = "normal"
+    deadline: Optional[float] = None
+    # The thread's earlier extraction when this email is a follow-up (see find_conversation)
+    conversation: Optional[Dict[str, Any]] = None
+
+class SubmissionError(Exception):
+    """The submission backend reported a failure."""
+
+def run_automation_job(validated_data: QTCFormData, prepared: Optional[Any] = None) -> str:
     try:
         logger.info(f"[AUTOMATION_START] Running for: {validated_data.client_name}")
-        result = fill_qtc_form_job(validated_data) 
-        logger.info(f"[AUTOMATION_END] Complete. Result: {result}")
+        result = submit_qtc_record(validated_data, prepared=prepared)
+        logger.info(f"[AUTOMATION_END] Complete. Result: {result.message}")
+        if not result.ok:
+            raise SubmissionError(result.message)
+        return result.message
     except Exception as e:
         logger.error(f"FATAL error in run_automation_job: {e}", exc_info=True)
         raise
 
-def process_email_job(email_id: str) -> None:
-    try:
-        logger.info(f"[JOB_START] Processing email: {email_id}")
-        
-        logger.info("Authenticating to Microsoft Graph...")
-        graph_service: GraphApiService = get_graph_service_sync()
-        
-        logger.info(f"Fetching email data for ID: {email_id}")
-        email_data = graph_service.get_email_by_id(email_id)
-        
-        logger.info("Parsing email body...")
-        parsed_email = parse_full_email(email_data)
-        full_context = f"Email Subject: {parsed_email.get('subject', '')}\n\n"
+# --- Stages ---
+# Each stage takes the job, fills in its own fields and leaves the rest.
+# process_email_job runs them back to back; app/pipeline.py runs each one
+# on its own worker pool.
+
+def fetch_email(job: EmailJob) -> None:
+    """
+    Graph: message and attachments. The message may already be here (from
+    a checkpoint or a rich notification); with no attachments either, no
+    Graph call is made.
+    """
+    if job.email_data is not None and job.email_data.get("hasAttachments") is False:
+        job.attachments = []
+        return
+
+    logger.info("Authenticating to Microsoft Graph...")
+    graph_service: GraphApiService = get_graph_service_sync(job.mailbox)
+
+    if job.email_data is None:
+        logger.info(f"Fetching email data for ID: {job.email_id}")
+        with stage_timer("graph_fetch"):
+            job.email_data = graph_service.get_email_by_id(job.email_id)
+        save_checkpoint(job, "email", job.email_data)
+
+    logger.info("Fetching attachments...")
+    with stage_timer("attachment_download"):
+        job.attachments = graph_service.get_attachments(job.email_id)
+
+def parse_email(job: EmailJob) -> None:
+    """Sender, recipients, subject and the key/value table from the body."""
+    logger.info("Parsing email body...")
+    with stage_timer("parse_email"):
+        job.parsed_email = parse_full_email(job.email_data)
+    prioritize(job)
+
+def prioritize(job: EmailJob) -> None:
+    """Scores the parsed email and sets the job's priority class and SLA deadline."""
+    priority = score_email(job.parsed_email)
+    job.priority = priority.score
+    job.priority_class = priority.label
+    job.deadline = job.created_at + sla_seconds(priority.label)
+    tracing.set_attribute("priority", priority.label)
+    if priority.reasons:
+        logger.info(f"Priority {priority.label} ({priority.score:+.0f}: {', '.join(priority.reasons)}) for {job.email_id}.")
+
+def extract_attachments(job: EmailJob) -> None:
+    """
+    Builds the LLM context from the parsed email and attachment text. For
+    a follow-up in an extracted thread, only what is new: the message's
+    own text and its own attachments.
+    """
+    parsed_email = job.parsed_email
+    job.conversation = find_conversation(job)
+    full_context = f"Email Subject: {parsed_email.get('subject', '')}\n\n"
+    if job.conversation is None:
         full_context += f"Email Body Table Data:\n{parsed_email.get('table_data', {})}\n\n"
-        
-        logger.info("Fetching attachments...")
-        attachments = graph_service.get_attachments(email_id)
-        doc_processor = DocumentProcessor()
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for att in attachments:
-                file_path = os.path.join(temp_dir, att['name'])
-                logger.info(f"Processing attachment: {att['name']}")
-                with open(file_path, 'wb') as f:
-                    f.write(att['content_bytes'])
-                
+    else:
+        full_context += f"New Message Text:\n{new_message_text(job.email_data)}\n\n"
+    full_context += attachment_context(job.attachments)
+
+    job.full_context = full_context
+    # The raw bytes are not needed past this point
+    job.attachments = []
+    save_checkpoint(
+        job,
+        "context",
+        {"parsed_email": job.parsed_email, "full_context": full_context, "conversation": job.conversation},
+    )
+
+def attachment_context(attachments: List[Dict[str, Any]]) -> str:
+    """The text of every parseable (non-image) attachment, one section each."""
+    text = ""
+    doc_processor = DocumentProcessor()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for att in attachments:
+            file_path = os.path.join(temp_dir, att['name'])
+            logger.info(f"Processing attachment: {att['name']}")
+            with open(file_path, 'wb') as f:
+                f.write(att['content_bytes'])
+
+            start = time.perf_counter()
+            with tracing.span("parse.attachment", file=att['name'], bytes=len(att['content_bytes'])):
                 processed_doc = doc_processor.process_document(file_path)
-                if processed_doc and processed_doc['type'] != 'image':
-                    full_context += f"--- Attachment: {att['name']} ---\n"
-                    full_text = processed_doc.get('text', '')
-                    if full_text:
-                        full_context += full_text
-                    full_context += "\n-----------------------------------\n\n"
-                
+                if processed_doc:
+                    tracing.set_attribute("type", processed_doc['type'])
+                    tracing.set_attribute("chars", len(processed_doc.get('text') or ''))
+            if processed_doc:
+                observe_stage(f"parser_{processed_doc['type']}", time.perf_counter() - start)
+            if processed_doc and processed_doc['type'] != 'image':
+                text += f"--- Attachment: {att['name']} ---\n"
+                full_text = processed_doc.get('text', '')
+                if full_text:
+                    text += full_text
+                text += "\n-----------------------------------\n\n"
+    return text
+
+def new_message_text(email_data: Dict[str, Any]) -> str:
+    """What the sender wrote in this message, without the quoted thread (uniqueBody) when Graph gives it."""
+    body = email_data.get("uniqueBody") or email_data.get("body") or {}
+    return html_to_text(body.get("content", ""))
+
+# --- Conversations ---
+
+def find_conversation(job: EmailJob) -> Optional[Dict[str, Any]]:
+    """
+    The stored extraction of an earlier email in this email's thread, or
+    None if this is the first contact (or the index is off or unavailable).
+    """
+    email_data = job.email_data or {}
+    conversation_id = email_data.get("conversationId")
+    if not settings.CONVERSATIONS_ENABLED or not conversation_id:
+        return None
+    try:
+        earlier = get_conversation_store().get(conversation_id)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Conversation index unavailable, extracting {job.email_id} in full: {e}")
+        return None
+    if earlier is None or earlier["email_id"] == job.email_id:
+        return None
+    if earlier["received_at"] > (email_data.get("receivedDateTime") or ""):
+        # An older message delivered late; the thread has already moved on
+        return None
+    CACHE_HITS.labels(cache="conversation").inc()
+    logger.info(f"{job.email_id} follows up on {earlier['email_id']}; extracting only the new message.")
+    return earlier
+
+def thread_context(job: EmailJob) -> str:
+    """The full LLM context for the job: for a follow-up, the thread's earlier context plus the new message."""
+    if job.conversation is None:
+        return job.full_context
+    return f"{job.conversation['context']}\n--- Follow-up message ---\n{job.full_context}"
+
+def remember_conversation(job: EmailJob) -> None:
+    """
+    Indexes the submitted form under the email's thread, for follow-ups to
+    build on. Only called once the submission succeeded, so a failed one
+    never becomes the base of the next delta.
+    """
+    email_data = job.email_data or {}
+    conversation_id = email_data.get("conversationId")
+    if not settings.CONVERSATIONS_ENABLED or not conversation_id:
+        return
+    try:
+        get_conversation_store().save(
+            conversation_id,
+            job.email_id,
+            email_data.get("receivedDateTime") or "",
+            job.validated_data.model_dump(),
+            thread_context(job),
+        )
+    except (sqlite3.Error, OSError) as e:
+        # Only an optimisation for later follow-ups; this job is fine
+        logger.warning(f"Could not index conversation of {job.email_id}: {e}")
+
+def extract_follow_up(job: EmailJob) -> Optional[Dict[str, Any]]:
+    """The thread's form updated with the new message, or None if Gemini's answer does not validate."""
+    logger.info("Sending the follow-up message to Gemini to merge into the thread's form...")
+    with stage_timer("gemini_delta"):
+        extracted_json = get_structured_delta_from_ai(job.conversation["form"], job.full_context)
+    try:
+        QTCFormData(**extracted_json)
+    except ValidationError as e:
+        logger.warning(f"Follow-up merge for {job.email_id} did not validate ({e}); extracting the thread in full.")
+        return None
+    return extracted_json
+
+def unchanged_by_follow_up(job: EmailJob) -> bool:
+    """True if the follow-up's form is the one the thread already submitted."""
+    try:
+        return QTCFormData(**job.conversation["form"]) == job.validated_data
+    except ValidationError:
+        return False
+
+def extract_with_llm(job: EmailJob) -> None:
+    """Gemini extraction (a delta merge for follow-ups) and Pydantic validation."""
+    extracted_json = extract_follow_up(job) if job.conversation is not None else None
+    if extracted_json is None:
         logger.info("Sending full context to Gemini for extraction...")
-        extracted_json = get_structured_data_from_ai(full_context)
-        
+        with stage_timer("gemini"):
+            extracted_json = get_structured_data_from_ai(thread_context(job), job.email_id)
+
+    try:
+        with stage_timer("validation"):
+            job.validated_data = QTCFormData(**extracted_json)
+        logger.info("Data validated by Pydantic.")
+        normalize_entities(job)
+        if job.conversation is not None and unchanged_by_follow_up(job):
+            # e.g. "thanks, received": the thread's record is already in QTC
+            logger.info(f"{job.email_id} changes nothing in its thread's form; not submitting it again.")
+            job.result = "No changes"
+            job.done = True
+            JOBS.labels(outcome="unchanged").inc()
+            if settings.CHECKPOINTS_ENABLED:
+                checkpoint_store.clear(job.email_id)
+            return
+        save_checkpoint(job, "validated", job.validated_data.model_dump())
+    except ValidationError as e:
+        logger.error(f"Data validation failed: {e}", exc_info=False)
+        logger.error(f"AI Output: {extracted_json}")
+        job.result = "Validation failed"
+        job.done = True
+        JOBS.labels(outcome="validation_failed").inc()
+        # Retrying would give the same answer; park it for a human (HIL)
+        dead_letter_store.add(job.email_id, "llm", f"Validation failed: {e}", job.failures + 1, job.mailbox)
+
+def normalize_entities(job: EmailJob) -> None:
+    """Replaces extracted names with their master-data spelling where they resolve."""
+    data = job.validated_data
+    directory = get_client_directory()
+    if directory is not None:
+        sender = (job.parsed_email or {}).get("sender") or {}
+        with stage_timer("client_resolution"):
+            match = directory.resolve(data.client_name, sender.get("email"), sender.get("name"))
+        if match is None:
+            ENTITY_RESOLUTION.labels(field="client_name", source="unmatched").inc()
+            logger.warning(f"Client '{data.client_name}' is not in the client master data.")
+        else:
+            ENTITY_RESOLUTION.labels(field="client_name", source=match.source).inc()
+            if match.client.name != data.client_name:
+                logger.info(
+                    f"Resolved client '{data.client_name}' -> '{match.client.name}' "
+                    f"via {match.source} ({match.score:.2f})."
+                )
+                data.client_name = match.client.name
+
+    ports = get_port_directory()
+    if ports is not None:
+        with stage_timer("port_resolution"):
+            for field_name in ("port_of_loading", "port_of_discharge"):
+                extracted = getattr(data, field_name)
+                port = ports.resolve(extracted)
+                ENTITY_RESOLUTION.labels(field=field_name, source="unmatched" if port is None else "port_index").inc()
+                if port is None:
+                    logger.warning(f"{field_name} '{extracted}' is not in the port index; keeping it as extracted.")
+                elif port.name != extracted:
+                    logger.info(f"Normalized {field_name} '{extracted}' -> '{port.name}' ({port.locode}).")
+                    setattr(data, field_name, port.name)
+
+def submit_form(job: EmailJob) -> None:
+    """Hands the validated data (and any prepared page) to the submission backend."""
+    # The prepared page is handed over (and released) by the filler
+    handover, job.prepared = job.prepared, None
+    job.result = run_automation_job(job.validated_data, prepared=handover)
+    job.done = True
+    JOBS.labels(outcome="succeeded").inc()
+    remember_conversation(job)
+    if settings.CHECKPOINTS_ENABLED:
+        checkpoint_store.clear(job.email_id)
+
+STAGES = [
+    ("fetch", fetch_email),
+    ("parse", parse_email),
+    ("extract", extract_attachments),
+    ("llm", extract_with_llm),
+    ("submit", submit_form),
+]
+
+# CPU-bound stages that get a stack profile when the job is sampled
+PROFILED_STAGES = {"parse", "extract"}
+
+def run_stage(job: EmailJob, name: str, fn: Callable[[EmailJob], None], **attributes: Any) -> None:
+    """Runs one stage as a span of the job's trace (the trace must be active)."""
+    with tracing.span(f"stage.{name}", attempt=job.failures + 1, **attributes):
+        if name in PROFILED_STAGES:
+            with tracing.profiled():
+                fn(job)
+        else:
+            fn(job)
+
+def observe_job_end(job: EmailJob) -> None:
+    """Records the job's end-to-end time, overall and for its priority class."""
+    elapsed = time.monotonic() - job.created_at
+    JOB_SECONDS.observe(elapsed)
+    JOB_SECONDS_BY_PRIORITY.labels(priority=job.priority_class).observe(elapsed)
+    if elapsed > sla_seconds(job.priority_class):
+        SLA_MISSES.labels(priority=job.priority_class).inc()
+
+def finish_trace(job: EmailJob) -> None:
+    if job.trace is not None:
+        job.trace.finish()
+
+# --- Checkpoints and retries ---
+
+def save_checkpoint(job: EmailJob, stage: str, payload: Any) -> None:
+    if settings.CHECKPOINTS_ENABLED:
+        checkpoint_store.save(job.email_id, stage, payload)
+
+def restore_checkpoint(job: EmailJob) -> None:
+    """Loads whatever earlier attempts saved for this email into the job."""
+    if not settings.CHECKPOINTS_ENABLED:
+        return
+    saved = checkpoint_store.load(job.email_id)
+    if "email" in saved:
+        job.email_data = saved["email"]
+    if "context" in saved:
+        job.parsed_email = saved["context"]["parsed_email"]
+        job.full_context = saved["context"]["full_context"]
+        job.conversation = saved["context"].get("conversation")
+        prioritize(job)
+    if "validated" in saved:
+        job.validated_data = QTCFormData(**saved["validated"])
+    if saved:
+        CACHE_HITS.labels(cache="checkpoint").inc()
+        logger.info(f"Resuming {job.email_id} from checkpoint at stage '{resume_stage(job)}'.")
+
+def resume_stage(job: EmailJob) -> str:
+    """The first stage whose output the job does not have yet."""
+    if job.validated_data is not None:
+        return "submit"
+    if job.full_context is not None:
+        return "llm"
+    return "fetch"
+
+def retry_delay(failures: int) -> float:
+    """Exponential backoff with jitter for the given number of failures."""
+    delay = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** (failures - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def record_failure(job: EmailJob, error: Exception) -> Optional[float]:
+    """
+    Counts a failed attempt. Returns the delay before the next attempt,
+    or None once the job has been moved to the dead-letter store.
+    """
+    job.failures += 1
+    FAILURES.labels(stage=job.stage).inc()
+    if job.stage == "submit":
+        # Not idempotent: the record may have been filed before the error
+        # (e.g. the confirmation wait timed out), so a human checks QTC first
+        dead_letter_store.add(job.email_id, job.stage, f"Submission not retried: {error}", job.failures, job.mailbox)
+        JOBS.labels(outcome="dead_lettered").inc()
+        return None
+    if job.failures >= settings.JOB_MAX_ATTEMPTS:
+        dead_letter_store.add(job.email_id, job.stage, str(error), job.failures, job.mailbox)
+        JOBS.labels(outcome="dead_lettered").inc()
+        return None
+    delay = retry_delay(job.failures)
+    if isinstance(error, (GraphThrottledError, GeminiThrottledError)):
+        # Honour the Retry-After of Graph (for this mailbox) or Gemini
+        delay = max(delay, error.retry_after)
+    logger.warning(
+        f"Attempt {job.failures} for {job.email_id} failed at '{job.stage}': {error}. "
+        f"Retrying in {delay:.1f}s."
+    )
+    return delay
+
+def run_job_stages(job: EmailJob) -> None:
+    """Runs the remaining stages for a job, starting after its last checkpoint."""
+    names = [name for name, _ in STAGES]
+    for name, fn in STAGES[names.index(resume_stage(job)):]:
+        job.stage = name
+        if name == "llm":
+            # Start loading the QTC form now, so page load overlaps the LLM call
+            job.prepared = prepare_submission()
         try:
-            validated_data = QTCFormData(**extracted_json)
-            logger.info("Data validated by Pydantic.")
-            run_automation_job(validated_data)
-        except ValidationError as e:
-            logger.error(f"Data validation failed: {e}", exc_info=False)
-            logger.error(f"AI Output: {extracted_json}")
-            pass
+            run_stage(job, name, fn)
+        except Exception:
+            release_submission(job.prepared)
+            job.prepared = None
+            raise
+        if job.done:
+            break
+    release_submission(job.prepared)
+    job.prepared = None
+
+def process_email_job(email_id: str, mailbox: Optional[str] = None, defer_retries: bool = False) -> bool:
+    """
+    Runs the email end to end. False if it was skipped because another
+    process holds (or completed) its lease.
+
+    With `defer_retries` a failed attempt schedules the next one on a
+    timer and returns, instead of sleeping through the backoff on the
+    caller's thread (FastAPI BackgroundTasks share the request threadpool).
+    The lease stays held, and heartbeated, in between.
+    """
+    coordinator = get_coordinator()
+    if not coordinator.claim_email(email_id, mailbox):
+        logger.info(f"Skipping {email_id}: already handled by another replica.")
+        return False
+    job = EmailJob(email_id=email_id, mailbox=mailbox or settings.MAILBOX_UPN, trace=tracing.start_trace(email_id))
+    logger.info(f"[JOB_START] Processing email: {email_id}")
+    JOBS.labels(outcome="started").inc()
+    JOBS_IN_PROGRESS.inc()
+    run_job_attempts(job, defer_retries)
+    return True
+
+def run_job_attempts(job: EmailJob, defer_retries: bool) -> None:
+    """Attempts the job until it ends, or (with `defer_retries`) until the first backoff."""
+    retry_in: Optional[float] = None
+    completed = False
+    try:
+        with tracing.activate(job.trace):
+            retry_in = _process_email_job(job, defer_retries)
+        # Submitted or dead-lettered: either way no replica should run it again
+        # (manage_dead_letters.py replay reopens the lease deliberately)
+        completed = retry_in is None
+    finally:
+        if retry_in is None:
+            get_coordinator().release_email(job.email_id, completed)
+            JOBS_IN_PROGRESS.dec()
+            observe_job_end(job)
+            finish_trace(job)
+    if retry_in is not None:
+        timer = threading.Timer(retry_in, run_job_attempts, args=(job, True))
+        timer.daemon = True
+        timer.start()
+
+def _process_email_job(job: EmailJob, defer_retries: bool) -> Optional[float]:
+    """Runs attempts; returns the delay before the next one when retries are deferred, else None."""
+    email_id = job.email_id
+    if job.failures == 0:
+        restore_checkpoint(job)
+
+    while True:
+        try:
+            run_job_stages(job)
+            break
         except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}", exc_info=True)
-            pass
+            logger.error(f"Error in process_email_job at '{job.stage}': {e}", exc_info=True)
+            delay = record_failure(job, e)
+            if delay is None:
+                logger.error(f"FATAL error in process_email_job: {email_id} moved to dead letters.")
+                return None
+            if defer_retries:
+                return delay
+            with tracing.span("retry.backoff", delay_s=round(delay, 1)):
+                time.sleep(delay)
 
-        logger.info(f"[JOB_END] Finished processing: {email_id}")
-    except Exception as e:
-        logger.error(f"FATAL error in process_email_job: {e}", exc_info=True)
-        raise
+    logger.info(f"[JOB_END] Finished processing: {email_id}")
+    return None
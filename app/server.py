@@ -0,0 +1,134 @@
+"""
+Production entry point:
+
+    python -m app.server
+
+Runs API_WORKERS uvicorn worker processes (no --reload) that only validate
+and enqueue notifications, plus JOB_WORKER_PROCESSES job-worker processes
+that warm up and then run the jobs from the shared SQLite job queue.
+Job workers that exit are restarted.
+
+Subscription renewal runs once per replica, here in the supervisor, not in
+each API worker: with the memory coordination backend every process would
+be its own leader and renew (or create) the subscriptions in parallel.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+# Must be set before anything imports settings or prometheus_client, here
+# and in every child process
+os.environ["JOB_DISPATCH"] = "queue"
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/app/data/prometheus")
+
+from app.core.config import settings  # noqa: E402
+
+logger = logging.getLogger("server")
+
+RESTART_DELAY_SECONDS = 5
+
+
+class JobWorkerGroup:
+    """Keeps JOB_WORKER_PROCESSES job workers running until stopped."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+        self._stop = threading.Event()
+        self._supervisor = threading.Thread(target=self._supervise, name="job-worker-supervisor", daemon=True)
+
+    def start(self) -> None:
+        for _ in range(self.size):
+            self._processes.append(self._spawn())
+        self._supervisor.start()
+
+    def stop(self, timeout: float = 60) -> None:
+        self._stop.set()
+        self._supervisor.join()
+        for process in self._processes:
+            process.terminate()  # SIGTERM: finish the running job, then exit
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Job worker {process.pid} did not stop in time, killing it.")
+                process.kill()
+                process.join()
+
+    def _spawn(self) -> multiprocessing.process.BaseProcess:
+        from app.worker import run_job_worker
+
+        process = self._context.Process(target=run_job_worker, name="job-worker")
+        process.start()
+        logger.info(f"Started job worker {process.pid}.")
+        return process
+
+    def _supervise(self) -> None:
+        from prometheus_client import multiprocess
+
+        while not self._stop.wait(RESTART_DELAY_SECONDS):
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                logger.error(f"Job worker {process.pid} exited with {process.exitcode}, restarting.")
+                multiprocess.mark_process_dead(process.pid)
+                self._processes[index] = self._spawn()
+
+
+def _reset_metrics_dir() -> None:
+    # Stale files from a previous run would be summed into the new metrics
+    path = Path(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True, exist_ok=True)
+
+def _start_subscription_renewal() -> None:
+    from app.core.coordination import get_coordinator
+    from app.subscriptions import start_subscription_renewer
+
+    # Stands for leader so that, with the sqlite backend, one replica renews
+    get_coordinator().start()
+    start_subscription_renewer()
+
+def _stop_subscription_renewal() -> None:
+    from app.core.coordination import shutdown_coordinator
+    from app.subscriptions import shutdown_subscription_renewer
+
+    shutdown_subscription_renewer()
+    shutdown_coordinator()
+
+def main() -> None:
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    _reset_metrics_dir()
+    # The child processes read this from the environment; only the supervisor renews
+    os.environ["SUBSCRIPTION_AUTO_RENEW"] = "false"
+
+    workers = JobWorkerGroup(settings.JOB_WORKER_PROCESSES)
+    workers.start()
+    if settings.SUBSCRIPTION_AUTO_RENEW:
+        _start_subscription_renewal()
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=settings.SERVER_HOST,
+            port=settings.SERVER_PORT,
+            workers=settings.API_WORKERS,
+            proxy_headers=True,
+            access_log=False,
+        )
+    finally:
+        logger.info("API stopped, stopping job workers...")
+        if settings.SUBSCRIPTION_AUTO_RENEW:
+            _stop_subscription_renewal()
+        workers.stop()
+
+
+if __name__ == "__main__":
+    main()
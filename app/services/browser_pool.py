@@ -0,0 +1,466 @@
+import contextvars
+import json
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional, TypeVar
+
+import psutil
+from playwright.sync_api import (
+    sync_playwright,
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    Route,
+    Error as PlaywrightError
+)
+
+from app.core.config import settings
+from app.services.qtc_form import should_block_request
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Serializes Playwright driver launches so each slot can tell which new
+# child process is its own driver
+_driver_start_lock = threading.Lock()
+
+
+class WarmupFailed(Exception):
+    """The speculative warm-up of a prepared page did not succeed."""
+
+
+def install_request_blocking(context: BrowserContext) -> None:
+    """Aborts image/font/media and analytics/telemetry requests for this context."""
+    def handle(route: Route) -> None:
+        request = route.request
+        if should_block_request(request.resource_type, request.url):
+            route.abort()
+        else:
+            route.continue_()
+
+    context.route("**/*", handle)
+
+
+class _BrowserSlot:
+    """
+    One long-lived Chromium instance.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    call for this slot is funnelled through its own single-thread executor.
+    """
+    def __init__(self, index: int, storage_state: Dict[str, Any], headless: bool,
+                 slow_mo: int, max_uses: int, max_rss_mb: int, block_requests: bool = False):
+        self.index = index
+        self.storage_state = storage_state
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.block_requests = block_requests
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"browser-slot-{index}")
+        self._pw: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._spare: Optional[tuple[BrowserContext, Page]] = None
+        self._uses = 0
+        # The slot's own driver and Chromium processes, for the memory check
+        self._driver_pid: Optional[int] = None
+        self._browser_pid: Optional[int] = None
+        self.closed = False
+
+    # --- Public API (called from any thread) ---
+    # Work is run in a copy of the caller's context so trace spans opened on
+    # the slot thread land in the calling job's trace.
+
+    def start(self) -> None:
+        self._executor.submit(self._start).result()
+
+    def run(self, fn: Callable[[Page], T]) -> T:
+        return self._executor.submit(contextvars.copy_context().run, self._run, fn).result()
+
+    def prepare(self, fn: Callable[[Page], Any]) -> "Future[tuple[BrowserContext, Page]]":
+        return self._executor.submit(contextvars.copy_context().run, self._prepare, fn)
+
+    def run_prepared(self, warmup: "Future[tuple[BrowserContext, Page]]", fn: Callable[[Page], T]) -> T:
+        return self._executor.submit(contextvars.copy_context().run, self._run_prepared, warmup, fn).result()
+
+    def release_prepared(self, warmup: "Future[tuple[BrowserContext, Page]]") -> None:
+        self._executor.submit(self._release_prepared, warmup).result()
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self._executor.submit(self._close).result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    # --- Internals (only ever run on the slot thread) ---
+
+    def _start(self) -> None:
+        with _driver_start_lock:
+            before = _child_pids(psutil.Process())
+            self._pw = sync_playwright().start()
+            self._driver_pid = _new_child_pid(psutil.Process(), before)
+        self._launch_browser()
+
+    def _launch_browser(self) -> None:
+        logger.info(f"[slot {self.index}] Launching Chromium...")
+        driver = self._driver_process()
+        before = _child_pids(driver) if driver else set()
+        self._browser = self._pw.chromium.launch(headless=self.headless, slow_mo=self.slow_mo)
+        # Only this slot's thread launches browsers from its driver
+        self._browser_pid = _new_child_pid(driver, before) if driver else None
+        if self.max_rss_mb and self._browser_pid is None:
+            logger.warning(f"[slot {self.index}] Could not identify the Chromium process; memory recycling is off.")
+        self._uses = 0
+        self._spare = self._new_page()
+        logger.info(f"[slot {self.index}] Browser ready.")
+
+    def _new_page(self) -> tuple[BrowserContext, Page]:
+        # The storage state is held in memory, so a fresh context is
+        # pre-authenticated without re-reading auth.json from disk.
+        context = self._browser.new_context(storage_state=self.storage_state)
+        if self.block_requests:
+            install_request_blocking(context)
+        return context, context.new_page()
+
+    def _driver_process(self) -> Optional[psutil.Process]:
+        try:
+            return psutil.Process(self._driver_pid) if self._driver_pid else None
+        except psutil.Error:
+            return None
+
+    def _browser_rss_mb(self) -> float:
+        """Resident memory of this slot's Chromium and its renderer/GPU processes."""
+        if self._browser_pid is None:
+            return 0.0
+        try:
+            browser = psutil.Process(self._browser_pid)
+            processes = [browser] + browser.children(recursive=True)
+        except psutil.Error:
+            return 0.0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+    def _recycle(self, reason: str) -> None:
+        logger.info(f"[slot {self.index}] Recycling browser: {reason}")
+        self._close_browser()
+        self._launch_browser()
+
+    def _ensure_healthy(self) -> None:
+        if self._browser is None or not self._browser.is_connected():
+            self._recycle("browser disconnected")
+        elif self._uses >= self.max_uses:
+            self._recycle(f"reached {self._uses} uses")
+        elif self.max_rss_mb and self._browser_rss_mb() > self.max_rss_mb:
+            self._recycle(f"memory above {self.max_rss_mb} MB")
+
+    def _acquire(self) -> tuple[BrowserContext, Page]:
+        self._ensure_healthy()
+
+        spare, self._spare = self._spare, None
+        if spare is None or spare[1].is_closed():
+            spare = self._new_page()
+        self._uses += 1
+        return spare
+
+    def _release(self, context: BrowserContext) -> None:
+        try:
+            context.close()
+        except PlaywrightError as e:
+            logger.warning(f"[slot {self.index}] Ignoring error while closing context: {e}")
+        # Pre-create the next context so the following lease starts warm.
+        try:
+            self._spare = self._new_page()
+        except PlaywrightError as e:
+            logger.warning(f"[slot {self.index}] Could not pre-create spare context: {e}")
+
+    @contextmanager
+    def _lease(self) -> Generator[Page, None, None]:
+        context, page = self._acquire()
+        try:
+            yield page
+        finally:
+            self._release(context)
+
+    def _run(self, fn: Callable[[Page], T]) -> T:
+        with self._lease() as page:
+            return fn(page)
+
+    def _prepare(self, fn: Callable[[Page], Any]) -> tuple[BrowserContext, Page]:
+        context, page = self._acquire()
+        try:
+            fn(page)
+        except Exception:
+            self._release(context)
+            raise
+        return context, page
+
+    def _run_prepared(self, warmup: "Future[tuple[BrowserContext, Page]]", fn: Callable[[Page], T]) -> T:
+        # The warm-up was queued earlier on this same thread, so it is done.
+        try:
+            context, page = warmup.result()
+        except Exception as e:
+            raise WarmupFailed(str(e)) from e
+        try:
+            return fn(page)
+        finally:
+            self._release(context)
+
+    def _release_prepared(self, warmup: "Future[tuple[BrowserContext, Page]]") -> None:
+        if warmup.exception() is None:
+            context, _ = warmup.result()
+            self._release(context)
+
+    def _close_browser(self) -> None:
+        if self._spare:
+            try:
+                self._spare[0].close()
+            except PlaywrightError:
+                pass
+            self._spare = None
+        if self._browser:
+            try:
+                self._browser.close()
+            except PlaywrightError as e:
+                logger.warning(f"[slot {self.index}] Ignoring error during browser close: {e}")
+            self._browser = None
+            self._browser_pid = None
+
+    def _close(self) -> None:
+        self._close_browser()
+        if self._pw:
+            try:
+                self._pw.stop()
+            except Exception as e:
+                logger.warning(f"[slot {self.index}] Ignoring error during Playwright shutdown: {e}")
+            self._pw = None
+
+
+def _child_pids(process: psutil.Process) -> set:
+    try:
+        return {child.pid for child in process.children()}
+    except psutil.Error:
+        return set()
+
+def _new_child_pid(process: psutil.Process, before: set) -> Optional[int]:
+    """The one direct child of `process` not in `before`, or None if it is not clear-cut."""
+    new = _child_pids(process) - before
+    return new.pop() if len(new) == 1 else None
+
+
+@dataclass
+class PreparedLease:
+    """A browser reserved by `BrowserPool.prepare()` and its warm-up future."""
+    slot: _BrowserSlot
+    warmup: "Future[tuple[BrowserContext, Page]]"
+
+
+class BrowserPool:
+    """
+    A pool of long-lived, pre-authenticated Chromium browsers.
+
+    Browsers are launched once and reused. Each lease gets a brand-new
+    context (cookies from auth.json, nothing from previous jobs), and each
+    browser is recycled after `max_uses` leases or when memory grows past
+    `max_rss_mb`.
+    """
+    def __init__(self, auth_path: Path, size: int = 1, headless: bool = True,
+                 slow_mo: int = 0, max_uses: int = 50, max_rss_mb: int = 1024,
+                 block_requests: bool = False):
+        self.auth_path = auth_path
+        self.size = size
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.block_requests = block_requests
+
+        self._slots: List[_BrowserSlot] = []
+        # Holds idle slots; None marks a shut-down pool
+        self._idle: "queue.Queue[Optional[_BrowserSlot]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self) -> None:
+        """Launches every browser in the pool. Safe to call more than once."""
+        with self._lock:
+            if self._started:
+                return
+            if not self.auth_path.exists():
+                logger.error(f"FATAL: Playwright auth file not found at: {self.auth_path}")
+                raise FileNotFoundError(f"Storage state file not found: {self.auth_path}")
+
+            logger.info(f"Starting browser pool ({self.size} browser(s)) with storage state: {self.auth_path}")
+            with open(self.auth_path, "r") as f:
+                storage_state = json.load(f)
+
+            # Drop the shutdown marker left by a previous shutdown()
+            self._drain_idle()
+            try:
+                for index in range(self.size):
+                    slot = _BrowserSlot(
+                        index=index,
+                        storage_state=storage_state,
+                        headless=self.headless,
+                        slow_mo=self.slow_mo,
+                        max_uses=self.max_uses,
+                        max_rss_mb=self.max_rss_mb,
+                        block_requests=self.block_requests,
+                    )
+                    # Appended first so a slot that fails half-way is closed too
+                    self._slots.append(slot)
+                    slot.start()
+                    self._idle.put(slot)
+            except Exception:
+                logger.error("Browser pool failed to start; closing the browsers already launched.")
+                self._close_slots()
+                self._drain_idle()
+                raise
+
+            self._started = True
+            logger.info("Browser pool started.")
+
+    def run(self, fn: Callable[[Page], T]) -> T:
+        """
+        Leases a fresh page, calls `fn(page)` on the browser's own thread
+        and returns its result. Blocks while every browser is busy.
+        """
+        if not self._started:
+            self.start()
+
+        slot = self._take()
+        try:
+            return slot.run(fn)
+        finally:
+            self._give(slot)
+
+    def prepare(self, fn: Callable[[Page], Any]) -> Optional["PreparedLease"]:
+        """
+        Reserves an idle browser and starts `fn(page)` (e.g. navigating to
+        the form) on it in the background. Returns None instead of blocking
+        unless another browser stays idle for `run()` callers: the lease is
+        held for the whole LLM call. It must be finished with either
+        `run_prepared()` or `release()`.
+        """
+        if not self._started:
+            return None
+        with self._prepare_lock:
+            if self._idle.qsize() < 2:
+                return None
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if slot is None:
+                self._idle.put(None)
+                return None
+        return PreparedLease(slot=slot, warmup=slot.prepare(fn))
+
+    def run_prepared(self, lease: "PreparedLease", fn: Callable[[Page], T]) -> T:
+        """Calls `fn(page)` on the prepared page, then returns the browser to the pool."""
+        try:
+            return lease.slot.run_prepared(lease.warmup, fn)
+        finally:
+            self._give(lease.slot)
+
+    def release(self, lease: "PreparedLease") -> None:
+        """Gives back a prepared page that will not be used."""
+        try:
+            lease.slot.release_prepared(lease.warmup)
+        finally:
+            self._give(lease.slot)
+
+    def shutdown(self) -> None:
+        """
+        Closes every browser and stops Playwright. Callers still waiting for
+        a browser get a RuntimeError instead of blocking forever.
+        """
+        with self._lock:
+            if not self._started:
+                return
+            logger.info("Shutting down browser pool...")
+            self._started = False
+            self._close_slots()
+            self._drain_idle()
+            # The marker wakes one waiter, which passes it on to the next
+            self._idle.put(None)
+            logger.info("Browser pool stopped.")
+
+    # --- Internals ---
+
+    def _take(self) -> _BrowserSlot:
+        while True:
+            slot = self._idle.get()
+            if slot is None:
+                self._idle.put(None)
+                raise RuntimeError("Browser pool was shut down.")
+            if not slot.closed:
+                return slot
+
+    def _give(self, slot: _BrowserSlot) -> None:
+        # A job that outlived shutdown() must not hand back a closed browser
+        if not slot.closed:
+            self._idle.put(slot)
+
+    def _drain_idle(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                return
+
+    def _close_slots(self) -> None:
+        for slot in self._slots:
+            try:
+                slot.close()
+            except Exception as e:
+                logger.warning(f"Ignoring error during browser pool shutdown: {e}")
+        self._slots = []
+
+
+# --- Process-wide pool ---
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    """Returns the shared browser pool, creating it from settings on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                auth_path=settings.AUTH_JSON_PATH,
+                size=settings.BROWSER_POOL_SIZE,
+                headless=settings.BROWSER_HEADLESS,
+                slow_mo=0 if settings.PLAYWRIGHT_FAST_MODE else settings.BROWSER_SLOW_MO,
+                max_uses=settings.BROWSER_MAX_USES,
+                max_rss_mb=settings.BROWSER_MAX_RSS_MB,
+                block_requests=settings.PLAYWRIGHT_FAST_MODE,
+            )
+        return _pool
+
+def shutdown_browser_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
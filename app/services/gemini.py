@@ -1,13 +1,48 @@
 import logging
+import random
+import re
+import threading
+import time
 import json  # <-- MOVED IMPORT TO THE TOP
-import google.generativeai as genai
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
+from app.core import tracing
 from app.core.config import settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Rough size of a token in characters, for estimating a prompt's cost up front
+CHARS_PER_TOKEN = 4
+# google.api_core puts the server's hint in the error text: "retry_delay { seconds: 23 }"
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+class GeminiThrottledError(Exception):
+    """Gemini kept answering 429 (or overloaded) after our retries; try again after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float, cause: Exception):
+        super().__init__(f"Gemini quota exhausted, retry after {retry_after:.0f}s: {cause}")
+        self.retry_after = retry_after
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def throttle_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to back off if `error` is Gemini pushing back (429 quota or 503
+    overloaded), else None. Uses the server's retry delay when it gives one.
+    """
+    from google.api_core import exceptions as google_exceptions
+
+    if not isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+                              google_exceptions.ServiceUnavailable)):
+        return None
+    hint = _RETRY_DELAY.search(str(error))
+    if hint:
+        return float(hint.group(1))
+    backoff = min(settings.GEMINI_RETRY_MAX_SECONDS, settings.GEMINI_RETRY_BASE_SECONDS * 2 ** attempt)
+    return backoff * random.uniform(0.5, 1.0)
+
 class GeminiService:
     """A service for interacting with the Google Gemini API."""
     
@@ -16,6 +51,9 @@ class GeminiService:
             logger.error("GOOGLE_API_KEY is not set. The AI service cannot start.")
             raise ValueError("GOOGLE_API_KEY is required.")
         
+        # Deferred: google-generativeai takes a noticeable share of startup
+        import google.generativeai as genai
+
         try:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-2.5-pro')
@@ -31,7 +69,7 @@ class GeminiService:
         logger.info("Sending prompt to Gemini...")
         raw_text = "" # Initialize in case of error
         try:
-            response = self.model.generate_content(prompt)
+            response = self.generate(prompt)
             
             raw_text = response.text
             json_text = raw_text.strip().lstrip("```json").rstrip("```")
@@ -44,21 +82,109 @@ class GeminiService:
             logger.error(f"Failed to decode JSON from Gemini response: {e}")
             logger.error(f"Gemini raw response: {raw_text}")
             raise
+        except GeminiThrottledError as e:
+            logger.warning(str(e))
+            raise
         except Exception as e:
             # This will now correctly catch the API Key error
             logger.error(f"Error calling Gemini API: {e}", exc_info=True)
             raise
 
+    def generate(self, prompt: str) -> Any:
+        """
+        `generate_content` under the process-wide rate governor. A 429 (or
+        503 overloaded) is retried up to GEMINI_MAX_RETRIES times after the
+        back-off the server asks for; after that GeminiThrottledError lets
+        the job retry later instead of failing outright.
+        """
+        from app.services.llm_governor import get_gemini_governor
+
+        governor = get_gemini_governor()
+        estimated = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            with governor.slot(estimated):
+                start = time.monotonic()
+                try:
+                    response = self.model.generate_content(prompt)
+                except Exception as e:
+                    delay = throttle_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    governor.throttled(delay)
+                    if attempt >= settings.GEMINI_MAX_RETRIES:
+                        raise GeminiThrottledError(delay, e) from e
+                    logger.warning(f"Gemini pushed back ({type(e).__name__}); retrying in {delay:.1f}s.")
+                    attempt += 1
+                    continue
+                usage = getattr(response, "usage_metadata", None)
+                governor.succeeded(time.monotonic() - start, estimated, getattr(usage, "total_token_count", None))
+                return response
+
+_service: Optional[GeminiService] = None
+_service_lock = threading.Lock()
+
+def get_gemini_service() -> GeminiService:
+    """Returns the process-wide client, configured on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GeminiService(api_key=settings.GOOGLE_API_KEY)
+        return _service
+
 # --- Helper function for our job ---
-def get_structured_data_from_ai(full_context: str) -> Dict[str, Any]:
+def get_structured_data_from_ai(full_context: str, email_id: Optional[str] = None) -> Dict[str, Any]:
     """
     A helper function that our processing.py job can call.
     It combines the context with the rulebook prompt.
+
+    With LLM_BATCHING_ENABLED the context may share a request with other
+    emails extracted at the same moment (see app/services/llm_batch.py).
     """
+    if settings.LLM_BATCHING_ENABLED:
+        from app.services.llm_batch import get_extraction_batcher
+
+        with tracing.span("gemini.generate", context_chars=len(full_context)):
+            structured_data, batch_size = get_extraction_batcher().extract(full_context, email_id)
+            tracing.set_attribute("batch_size", batch_size)
+        return structured_data
+
+    with tracing.span("gemini.generate", context_chars=len(full_context)):
+        return extract_single(full_context)
+
+def extract_single(full_context: str) -> Dict[str, Any]:
+    """One email, one request."""
     from app.parsing.prompts import get_extraction_prompt
-    
-    service = GeminiService(api_key=settings.GOOGLE_API_KEY)
+
+    service = get_gemini_service()
     prompt = get_extraction_prompt(full_context)
-    structured_data = service.get_structured_json(prompt)
-    
-    return structured_data
+    tracing.set_attribute("prompt_chars", len(prompt))
+    return service.get_structured_json(prompt)
+
+def extract_batch(documents: List[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Several emails, given as (document id, context), in one request.
+    Returns the extracted object for each document id Gemini answered for;
+    ids it left out are simply missing.
+    """
+    from app.parsing.prompts import get_batch_extraction_prompt
+
+    service = get_gemini_service()
+    prompt = get_batch_extraction_prompt(documents)
+    answer = service.get_structured_json(prompt)
+    if not isinstance(answer, list):
+        raise ValueError(f"Expected a JSON array for a batch of {len(documents)}, got {type(answer).__name__}")
+    results: Dict[str, Dict[str, Any]] = {}
+    for item in answer:
+        if isinstance(item, dict) and "document_id" in item:
+            results[str(item.pop("document_id"))] = item
+    return results
+
+def get_structured_delta_from_ai(current_form: Dict[str, Any], new_message: str) -> Dict[str, Any]:
+    """A follow-up: the thread's current form updated with the new message (never batched)."""
+    from app.parsing.prompts import get_delta_extraction_prompt
+
+    service = get_gemini_service()
+    prompt = get_delta_extraction_prompt(current_form, new_message)
+    with tracing.span("gemini.generate", prompt_chars=len(prompt), context_chars=len(new_message), delta=True):
+        return service.get_structured_json(prompt)
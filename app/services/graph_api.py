@@ -4,73 +4,123 @@ import base64
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode, urlsplit, urlunsplit
 
+from app.core import tracing
 from app.core.config import settings
 from app.services import graph_auth
 
-GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+GRAPH_BASE = settings.GRAPH_BASE_URL.rstrip("/")
+GRAPH_SCOPES = ['User.Read', 'Mail.Read', 'Mail.Send', 'Mail.ReadWrite']
+# Needed to read mailboxes other than the signed-in user's own
+SHARED_MAILBOX_SCOPES = ['Mail.Read.Shared', 'Mail.ReadWrite.Shared']
+# What jobs read from a message, fetched or carried by rich notifications:
+# everything parse_full_email reads, hasAttachments so attachment-less
+# emails need no Graph call at all, and the thread (conversationId) and
+# new text (uniqueBody) for follow-ups
+MESSAGE_FIELDS = [
+    'subject', 'from', 'toRecipients', 'ccRecipients', 'body', 'hasAttachments', 'receivedDateTime',
+    'conversationId', 'uniqueBody',
+]
+# Graph's cap on subscriptions that include resource data
+RICH_SUBSCRIPTION_MAX_MINUTES = 1440
 
 logger = logging.getLogger(__name__)
 
+class GraphThrottledError(requests.HTTPError):
+    """Graph answered 429 for this mailbox; back off for `retry_after` seconds."""
+
+    def __init__(self, mailbox: str, retry_after: float, response: requests.Response):
+        super().__init__(f"Graph throttled mailbox {mailbox}, retry after {retry_after:.0f}s", response=response)
+        self.mailbox = mailbox
+        self.retry_after = retry_after
+
 class GraphApiService:
     """A service for interacting with the Microsoft Graph API for mail."""
 
-    def __init__(self, session: requests.Session):
+    def __init__(self, session: requests.Session, mailbox: Optional[str] = None):
         if not session:
             raise ValueError("An authenticated requests.Session is required.")
         self.session = session
+        self.mailbox = mailbox or settings.MAILBOX_UPN
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """All Graph calls go through here so each one shows up as a trace span."""
+        with tracing.span("graph.request", method=method, path=url[len(GRAPH_BASE):]) as span:
+            response = self.session.request(method, url, **kwargs)
+            if span is not None:
+                span.attributes["status"] = response.status_code
+                span.attributes["bytes"] = len(response.content)
+            if response.status_code == 429:
+                retry_after = float(response.headers.get("Retry-After", 30))
+                raise GraphThrottledError(self.mailbox, retry_after, response)
+            return response
 
     def get_email_by_id(self, email_id: str) -> Dict[str, Any]:
-        url = f"{GRAPH_BASE}/users/{settings.MAILBOX_UPN}/messages/{email_id}"
-        response = self.session.get(url, timeout=30)
+        url = f"{GRAPH_BASE}/users/{self.mailbox}/messages/{email_id}"
+        response = self._request("GET", url, params={'$select': ",".join(MESSAGE_FIELDS)}, timeout=30)
         response.raise_for_status()
         return response.json()
 
     def get_recent_emails(self, limit: int = 10) -> List[Dict[str, Any]]:
-        url = f"{GRAPH_BASE}/users/{settings.MAILBOX_UPN}/messages"
+        url = f"{GRAPH_BASE}/users/{self.mailbox}/messages"
         params = {'$top': limit, '$orderby': 'receivedDateTime desc'}
-        response = self.session.get(url, params=params, timeout=30)
+        response = self._request("GET", url, params=params, timeout=30)
         response.raise_for_status()
         return response.json().get('value', [])
 
     def send_email(self, to_email: str, subject: str, body_html: str) -> None:
-        url = f"{GRAPH_BASE}/users/{settings.MAILBOX_UPN}/sendMail"
+        url = f"{GRAPH_BASE}/users/{self.mailbox}/sendMail"
         message = { "message": { "subject": subject, "body": { "contentType": "HTML", "content": body_html }, "toRecipients": [{ "emailAddress": { "address": to_email } }] } }
-        response = self.session.post(url, json=message, timeout=30)
+        response = self._request("POST", url, json=message, timeout=30)
         response.raise_for_status()
         print(f"Email sent successfully to {to_email}")
 
     def create_subscription(self) -> Dict[str, Any]:
-        expiration_time = (datetime.now(timezone.utc) + timedelta(days=2)).isoformat()
+        expiration_time = subscription_expiry()
         body = {
             "changeType": "created",
-            "notificationUrl": settings.WEBHOOK_NOTIFICATION_URL,
-            "resource": f"/users/{settings.MAILBOX_UPN}/messages",
+            "notificationUrl": notification_url(self.mailbox),
+            "resource": f"/users/{self.mailbox}/messages",
             "expirationDateTime": expiration_time,
             "clientState": settings.CLIENT_STATE_SECRET
         }
+        if settings.RICH_NOTIFICATIONS_ENABLED:
+            from app.core.notification_crypto import get_decryptor
+
+            body["resource"] += "?$select=" + ",".join(MESSAGE_FIELDS)
+            body["includeResourceData"] = True
+            body["encryptionCertificate"] = get_decryptor().certificate_b64()
+            body["encryptionCertificateId"] = settings.NOTIFICATION_CERT_ID
         url = f"{GRAPH_BASE}/subscriptions"
-        response = self.session.post(url, json=body, timeout=30)
+        response = self._request("POST", url, json=body, timeout=30)
         if response.status_code != 201:
             raise Exception(f"Failed to create subscription: {response.text}")
         return response.json()
 
+    def renew_subscription(self, sub_id: str) -> Dict[str, Any]:
+        """Extends a subscription in place (PATCH), so no notifications are missed."""
+        url = f"{GRAPH_BASE}/subscriptions/{sub_id}"
+        response = self._request("PATCH", url, json={"expirationDateTime": subscription_expiry()}, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
     def list_subscriptions(self) -> List[Dict[str, Any]]:
         url = f"{GRAPH_BASE}/subscriptions"
-        response = self.session.get(url, timeout=30)
+        response = self._request("GET", url, timeout=30)
         response.raise_for_status()
         return response.json().get('value', [])
 
     def delete_subscription(self, sub_id: str) -> None:
         url = f"{GRAPH_BASE}/subscriptions/{sub_id}"
-        response = self.session.delete(url, timeout=30)
+        response = self._request("DELETE", url, timeout=30)
         if response.status_code != 204:
             raise Exception(f"Failed to delete subscription: {response.text}")
         print(f"Subscription {sub_id} deleted.")
 
     def get_attachments(self, email_id: str) -> List[Dict[str, Any]]:
-        url = f"{GRAPH_BASE}/users/{settings.MAILBOX_UPN}/messages/{email_id}/attachments"
-        response = self.session.get(url, timeout=60)
+        url = f"{GRAPH_BASE}/users/{self.mailbox}/messages/{email_id}/attachments"
+        response = self._request("GET", url, timeout=60)
         response.raise_for_status()
         attachments_data = response.json().get('value', [])
         processed_attachments = []
@@ -85,6 +135,28 @@ class GraphApiService:
 
 # --- NEW HELPER FUNCTIONS ---
 
+def subscription_expiry() -> str:
+    """expirationDateTime for a new or renewed subscription."""
+    minutes = settings.SUBSCRIPTION_LIFETIME_MINUTES
+    if settings.RICH_NOTIFICATIONS_ENABLED:
+        minutes = min(minutes, RICH_SUBSCRIPTION_MAX_MINUTES - 1)
+    lifetime = timedelta(minutes=minutes)
+    return (datetime.now(timezone.utc) + lifetime).isoformat()
+
+def notification_url(mailbox: str) -> str:
+    """
+    The webhook URL for one mailbox's subscription. The mailbox rides along
+    as a query parameter so notifications can be routed without a lookup.
+    """
+    parts = urlsplit(settings.WEBHOOK_NOTIFICATION_URL)
+    query = "&".join(filter(None, [parts.query, urlencode({"mailbox": mailbox})]))
+    return urlunsplit(parts._replace(query=query))
+
+def graph_scopes() -> List[str]:
+    if len(settings.mailboxes) > 1:
+        return GRAPH_SCOPES + SHARED_MAILBOX_SCOPES
+    return GRAPH_SCOPES
+
 async def _get_access_token_async() -> str:
     """Async helper to get a token."""
     # DEBUG LOGGING
@@ -103,22 +175,38 @@ async def _get_access_token_async() -> str:
         return settings.HARDCODED_ACCESS_TOKEN
     
     logger.info("⚠️  No hardcoded token. Running semi-auto auth flow...")
-    scopes = ['User.Read', 'Mail.Read', 'Mail.Send', 'Mail.ReadWrite']
-    access_token = await graph_auth.get_delegated_access_token(scopes=scopes)
+    access_token = await graph_auth.get_delegated_access_token(scopes=graph_scopes())
     logger.info("Authentication successful.")
     return access_token
 
-def get_graph_service_sync() -> GraphApiService:
+def get_access_token_sync() -> str:
+    """
+    SYNC helper that returns a Graph access token. Uses asyncio.run().
+    """
+    # This is safe because it is only called from worker threads,
+    # never from inside an event loop
+    return asyncio.run(_get_access_token_async())
+
+def warm_up_access_token() -> bool:
+    """
+    Loads the token provider and refreshes the cached token, without ever
+    starting the interactive device flow. Returns True if a token is ready.
+    """
+    if settings.HARDCODED_ACCESS_TOKEN:
+        return True
+    return graph_auth.get_cached_access_token(graph_scopes()) is not None
+
+def get_graph_service_sync(mailbox: Optional[str] = None) -> GraphApiService:
     """
     SYNC helper for our background job. Uses asyncio.run().
     """
     logger.info("Authenticating to Microsoft Graph (SYNC)...")
-    # This is safe because processing.py is NOT in an event loop
-    access_token = asyncio.run(_get_access_token_async())
-    session = graph_auth.get_graph_client(access_token)
-    return GraphApiService(session)
+    with tracing.span("graph.auth"):
+        access_token = get_access_token_sync()
+        session = graph_auth.get_graph_client(access_token)
+    return GraphApiService(session, mailbox)
 
-async def get_graph_service_async() -> GraphApiService:
+async def get_graph_service_async(mailbox: Optional[str] = None) -> GraphApiService:
     """
     ASYNC helper for our manage_subscription.py script. Uses await.
     """
@@ -126,4 +214,4 @@ async def get_graph_service_async() -> GraphApiService:
     # This is safe because manage_subscription.py IS in an event loop
     access_token = await _get_access_token_async()
     session = graph_auth.get_graph_client(access_token)
-    return GraphApiService(session)
\ No newline at end of file
+    return GraphApiService(session, mailbox)
\ No newline at end of file
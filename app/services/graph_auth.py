@@ -2,12 +2,15 @@ import atexit
 import os
 import requests
 import asyncio
-from typing import Optional, List
-from msal import PublicClientApplication, ConfidentialClientApplication, SerializableTokenCache
+import threading
+from typing import Any, Dict, Optional, List, TYPE_CHECKING
 
 # --- IMPORT SETTINGS FIRST ---
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    from msal import PublicClientApplication, SerializableTokenCache
+
 # --- Shared Configuration ---
 AUTHORITY = f"https://login.microsoftonline.com/{settings.TENANT_ID}"
 
@@ -24,6 +27,8 @@ def get_graph_client(access_token: str) -> requests.Session:
 # --- Method for FULLY AUTOMATED Flow ---
 def get_app_only_access_token() -> str:
     """Gets an app-only token using client credentials."""
+    from msal import ConfidentialClientApplication
+
     if not settings.CLIENT_SECRET:
         raise ValueError("CLIENT_SECRET must be set for the fully automated flow.")
     
@@ -41,10 +46,16 @@ def get_app_only_access_token() -> str:
         raise Exception(f"Could not acquire app-only token: {result.get('error_description')}")
 
 # --- Method for SEMI-AUTOMATED Flow ---
-token_cache = SerializableTokenCache()
+# MSAL and the cache file are only touched on first use, so importing this
+# module (and starting the API) stays cheap.
+_token_cache: Optional["SerializableTokenCache"] = None
+_token_cache_lock = threading.Lock()
 
-def _load_token_cache() -> None:
+def _load_token_cache() -> "SerializableTokenCache":
     """Loads the token cache from the path specified in settings."""
+    from msal import SerializableTokenCache
+
+    token_cache = SerializableTokenCache()
     if os.path.exists(settings.TOKEN_CACHE_FILE):
         token_cache.deserialize(open(settings.TOKEN_CACHE_FILE, "r").read())
         
@@ -53,21 +64,52 @@ def _load_token_cache() -> None:
         if token_cache.has_state_changed
         else None
     )
+    return token_cache
+
+def get_token_cache() -> "SerializableTokenCache":
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = _load_token_cache()
+        return _token_cache
 
-# --- THIS IS THE FIX ---
-# Only try to load the cache if we're not using the hardcoded token
-if not settings.HARDCODED_ACCESS_TOKEN:
-    _load_token_cache()
+_public_client: Optional["PublicClientApplication"] = None
+_public_client_lock = threading.Lock()
+
+def get_public_client() -> "PublicClientApplication":
+    """One MSAL app per process; creating it does authority discovery over the network."""
+    global _public_client
+    with _public_client_lock:
+        if _public_client is None:
+            from msal import PublicClientApplication
+
+            _public_client = PublicClientApplication(
+                settings.CLIENT_ID, 
+                authority=AUTHORITY, 
+                token_cache=get_token_cache()
+            )
+        return _public_client
+
+def get_cached_token_result(scopes: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    The MSAL result (access_token, expires_in) for a delegated token from
+    the cache, refreshing it if needed. Never interactive.
+    """
+    app = get_public_client()
+    accounts = app.get_accounts(username=settings.GRAPH_USER_IDENTIFIER)
+    result = app.acquire_token_silent(scopes, account=accounts[0]) if accounts else None
+    return result if result and "access_token" in result else None
+
+def get_cached_access_token(scopes: List[str]) -> Optional[str]:
+    """A delegated token from the cache (refreshing it if needed), never interactive."""
+    result = get_cached_token_result(scopes)
+    return result["access_token"] if result else None
 
 async def get_delegated_access_token(scopes: List[str]) -> str:
     """
     Gets a user-delegated token using a refresh token or interactive login.
     """
-    app = PublicClientApplication(
-        settings.CLIENT_ID, 
-        authority=AUTHORITY, 
-        token_cache=token_cache
-    )
+    app = get_public_client()
     accounts = app.get_accounts(username=settings.GRAPH_USER_IDENTIFIER)
     
     result = app.acquire_token_silent(scopes, account=accounts[0]) if accounts else None
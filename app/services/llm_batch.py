@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.metrics import LLM_BATCH_FALLBACKS, LLM_BATCH_SIZE
+from app.models.qtc_models import QTCFormData
+from app.services.gemini import CHARS_PER_TOKEN, GeminiThrottledError, extract_batch, extract_single
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingExtraction:
+    context: str
+    email_id: Optional[str]
+    # Resolves to (extracted data, documents in the request that produced it)
+    future: "Future[Tuple[Dict[str, Any], int]]" = field(default_factory=Future)
+
+
+class ExtractionBatcher:
+    """
+    Micro-batches Gemini extractions during bursts.
+
+    Callers block in `extract` while one collector thread groups pending
+    contexts. When no request is out, a context goes alone right away, so a
+    quiet inbox pays no extra latency. While requests are out, the
+    collector waits up to LLM_BATCH_WINDOW_MS for company and sends up to
+    LLM_BATCH_MAX_DOCUMENTS contexts (within LLM_BATCH_MAX_TOKENS) as one
+    request, so the rules and schema go over the wire once per batch.
+
+    Answers are matched back by document id. A batch request that fails,
+    or a document missing from its answer or not valid as QTCFormData, is
+    retried as a single request, which then behaves exactly like the
+    unbatched path (its errors reach the caller).
+    """
+    def __init__(self, window_seconds: float, max_documents: int, max_tokens: int, max_concurrent: int):
+        self.window_seconds = window_seconds
+        self.max_documents = max(1, max_documents)
+        self.max_chars = max_tokens * CHARS_PER_TOKEN
+        self._pending: List[PendingExtraction] = []
+        self._in_flight = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="llm-request")
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def extract(self, full_context: str, email_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        """The extracted JSON for one email and the size of the request it went out in."""
+        pending = PendingExtraction(full_context, email_id)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("LLM batcher is shut down")
+            self._pending.append(pending)
+            self._cond.notify_all()
+        return pending.future.result()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+
+    # --- Collector ---
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                if self._in_flight:
+                    deadline = time.monotonic() + self.window_seconds
+                    while not self._stopped and not self._batch_full():
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._dispatch(batch)
+
+    def _batch_full(self) -> bool:
+        return (
+            len(self._pending) >= self.max_documents
+            or sum(len(p.context) for p in self._pending) >= self.max_chars
+        )
+
+    def _take_batch(self) -> List[PendingExtraction]:
+        """The oldest pending contexts that fit the budget (always at least one)."""
+        batch: List[PendingExtraction] = []
+        chars = 0
+        for pending in self._pending:
+            if batch and (len(batch) >= self.max_documents or chars + len(pending.context) > self.max_chars):
+                break
+            batch.append(pending)
+            chars += len(pending.context)
+        del self._pending[:len(batch)]
+        return batch
+
+    # --- Requests ---
+
+    def _dispatch(self, batch: List[PendingExtraction]) -> None:
+        with self._cond:
+            self._in_flight += 1
+        try:
+            self._executor.submit(self._send, batch)
+        except RuntimeError:
+            # Shutting down: finish it here rather than leave callers waiting
+            self._send(batch)
+
+    def _send(self, batch: List[PendingExtraction]) -> None:
+        try:
+            LLM_BATCH_SIZE.observe(len(batch))
+            if len(batch) == 1:
+                self._send_single(batch[0])
+            else:
+                self._send_batch(batch)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _send_single(self, pending: PendingExtraction) -> None:
+        try:
+            pending.future.set_result((extract_single(pending.context), 1))
+        except BaseException as e:
+            pending.future.set_exception(e)
+
+    def _send_batch(self, batch: List[PendingExtraction]) -> None:
+        documents = {str(n): pending for n, pending in enumerate(batch, start=1)}
+        try:
+            results = extract_batch([(doc_id, pending.context) for doc_id, pending in documents.items()])
+        except GeminiThrottledError as e:
+            # Splitting the batch would only ask more of an exhausted quota
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        except Exception as e:
+            logger.warning(f"Batched extraction of {len(batch)} emails failed ({e}); retrying them one by one.")
+            LLM_BATCH_FALLBACKS.labels(reason="request_failed").inc(len(batch))
+            retry = list(batch)
+        else:
+            retry = []
+            for doc_id, pending in documents.items():
+                data = results.get(doc_id)
+                if data is None:
+                    logger.warning(f"Batched answer has no document for email {pending.email_id}; retrying it alone.")
+                    LLM_BATCH_FALLBACKS.labels(reason="missing").inc()
+                    retry.append(pending)
+                    continue
+                try:
+                    QTCFormData(**data)
+                except (ValidationError, TypeError) as e:
+                    logger.warning(f"Batched answer for email {pending.email_id} is not valid ({e}); retrying it alone.")
+                    LLM_BATCH_FALLBACKS.labels(reason="invalid").inc()
+                    retry.append(pending)
+                    continue
+                pending.future.set_result((data, len(batch)))
+        for pending in retry:
+            self._dispatch([pending])
+
+
+# --- Process-wide batcher ---
+
+_batcher: Optional[ExtractionBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_extraction_batcher() -> ExtractionBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = ExtractionBatcher(
+                window_seconds=settings.LLM_BATCH_WINDOW_MS / 1000,
+                max_documents=settings.LLM_BATCH_MAX_DOCUMENTS,
+                max_tokens=settings.LLM_BATCH_MAX_TOKENS,
+                # The governor decides how many of these actually run at once
+                max_concurrent=settings.GEMINI_MAX_CONCURRENCY,
+            )
+        return _batcher
+
+def shutdown_extraction_batcher() -> None:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.stop()
+            _batcher = None
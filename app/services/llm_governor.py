@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Generator, Optional
+
+from app.core.config import settings
+from app.core.metrics import GEMINI_CONCURRENCY_LIMIT, GEMINI_IN_FLIGHT, GEMINI_THROTTLED, GEMINI_WAITERS
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency average
+_LATENCY_ALPHA = 0.2
+# Successes needed before the latency average is trusted for spike detection
+_LATENCY_WARMUP = 5
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units a minute up to one minute's worth. `take`
+    may drive the level negative (a large prompt, or a correction after the
+    real usage is known); later takers then wait out the debt.
+    """
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be now)."""
+        self._refill(now)
+        # Anything larger than the bucket goes through once it is full
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+
+class GeminiGovernor:
+    """
+    Gates every Gemini request in this process.
+
+    A request waits for a concurrency slot, then for room in two token
+    buckets: requests per minute and (estimated) tokens per minute. The
+    concurrency limit adapts AIMD-style: it grows by about one for every
+    `limit` successful requests, halves on a 429, and shrinks by a tenth
+    when a request is much slower per token than the running average (the
+    quota pressure usually shows up as latency before it turns into 429s).
+    A 429 also holds back every new request for the back-off period.
+    """
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        min_concurrency: int,
+        max_concurrency: int,
+        initial_concurrency: int,
+        latency_spike_factor: float,
+    ):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.latency_spike_factor = latency_spike_factor
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._in_flight = 0
+        self._waiters = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._seconds_per_token: Optional[float] = None
+        self._round_trip = 0.0
+        self._samples = 0
+        self._cond = threading.Condition()
+        GEMINI_CONCURRENCY_LIMIT.set(int(self.limit))
+
+    @contextmanager
+    def slot(self, estimated_tokens: int) -> Generator["GeminiGovernor", None, None]:
+        """`with governor.slot(tokens):` around one request; report its outcome with the methods below."""
+        self._acquire(estimated_tokens)
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                GEMINI_IN_FLIGHT.dec()
+                self._cond.notify_all()
+
+    def _acquire(self, estimated_tokens: int) -> None:
+        with self._cond:
+            self._waiters += 1
+            GEMINI_WAITERS.inc()
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._in_flight < int(self.limit):
+                        wait = max(
+                            self._blocked_until - now,
+                            self._requests.wait_time(1, now),
+                            self._tokens.wait_time(estimated_tokens, now),
+                        )
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                self._requests.take(1, now)
+                self._tokens.take(estimated_tokens, now)
+                self._in_flight += 1
+                GEMINI_IN_FLIGHT.inc()
+            finally:
+                self._waiters -= 1
+                GEMINI_WAITERS.dec()
+
+    # --- Feedback ---
+
+    def succeeded(self, seconds: float, estimated_tokens: int, actual_tokens: Optional[int] = None) -> None:
+        tokens = actual_tokens or estimated_tokens
+        with self._cond:
+            if actual_tokens:
+                # Settle the estimate against what the request really used
+                self._tokens.take(actual_tokens - estimated_tokens, time.monotonic())
+            per_token = seconds / max(tokens, 1)
+            average = self._seconds_per_token
+            self._samples += 1
+            if (
+                average is not None
+                and self._samples > _LATENCY_WARMUP
+                and per_token > average * self.latency_spike_factor
+            ):
+                self._decrease(0.9, "latency spike")
+            else:
+                self._set_limit(self.limit + 1 / self.limit)
+            if average is None:
+                self._seconds_per_token, self._round_trip = per_token, seconds
+            else:
+                self._seconds_per_token = _LATENCY_ALPHA * per_token + (1 - _LATENCY_ALPHA) * average
+                self._round_trip = _LATENCY_ALPHA * seconds + (1 - _LATENCY_ALPHA) * self._round_trip
+            self._cond.notify_all()
+
+    def throttled(self, retry_after: float) -> None:
+        GEMINI_THROTTLED.inc()
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._decrease(0.5, "429 from Gemini")
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        now = time.monotonic()
+        # One decrease per round trip: the requests already out saw the same pressure
+        if now - self._last_decrease < self._round_trip:
+            return
+        self._last_decrease = now
+        before = int(self.limit)
+        self._set_limit(self.limit * factor)
+        logger.info(f"Gemini concurrency {before} -> {int(self.limit)} ({reason}).")
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = min(float(self.max_concurrency), max(float(self.min_concurrency), limit))
+        GEMINI_CONCURRENCY_LIMIT.set(int(self.limit))
+
+
+# --- Process-wide governor ---
+
+_governor: Optional[GeminiGovernor] = None
+_governor_lock = threading.Lock()
+
+def get_gemini_governor() -> GeminiGovernor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = GeminiGovernor(
+                requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+                tokens_per_minute=settings.GEMINI_TOKENS_PER_MINUTE,
+                min_concurrency=settings.GEMINI_MIN_CONCURRENCY,
+                max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+                initial_concurrency=settings.GEMINI_INITIAL_CONCURRENCY,
+                latency_spike_factor=settings.GEMINI_LATENCY_SPIKE_FACTOR,
+            )
+        return _governor
@@ -8,18 +8,22 @@ from playwright.sync_api import (
     Playwright,
     Error as PlaywrightError
 )
-from typing import Generator
+from typing import Any, Generator, Optional
 
 from app.core.config import settings
 from app.models.qtc_models import QTCFormData
+from app.services.browser_pool import WarmupFailed, get_browser_pool, install_request_blocking
+from app.services.playwright_async import get_async_form_engine
+from app.services.qtc_form import (
+    QTC_SELECTORS,
+    StepTimer,
+    build_fill_steps,
+    is_submit_response,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# The target URL for the Power App
-# --- TODO: Update this to the actual QTC App URL ---
-QTC_APP_URL = "https://houseofshipping.sharepoint.com/sites/Team-DataScienceAI/..."
-
 @contextmanager
 def launch_playwright_context() -> Generator[tuple[Playwright, Browser, BrowserContext, Page], None, None]:
     """
@@ -38,16 +42,19 @@ def launch_playwright_context() -> Generator[tuple[Playwright, Browser, BrowserC
     context: BrowserContext | None = None
     
     try:
-        pw_instance = sync_playplaywright().start()
+        pw_instance = sync_playwright().start()
         browser = pw_instance.chromium.launch(
-            headless=True,  # Run headless in Docker
-            slow_mo=50      # Add a small slow_mo for stability
+            headless=settings.BROWSER_HEADLESS,  # Run headless in Docker
+            # Fast mode relies on targeted waits, so slow_mo is not needed
+            slow_mo=0 if settings.PLAYWRIGHT_FAST_MODE else settings.BROWSER_SLOW_MO
         )
         
         logger.info("Browser launched. Creating new context with saved auth.")
         context = browser.new_context(
             storage_state=str(settings.AUTH_JSON_PATH)
         )
+        if settings.PLAYWRIGHT_FAST_MODE:
+            install_request_blocking(context)
         page = context.new_page()
         
         # Yield the resources to the caller
@@ -74,6 +81,24 @@ def launch_playwright_context() -> Generator[tuple[Playwright, Browser, BrowserC
         logger.info("Playwright stopped.")
 
 
+def open_qtc_form(page: Page, timer: StepTimer) -> None:
+    """Navigates to the QTC app and waits until the form can be filled."""
+    with timer.step("navigate"):
+        logger.info(f"Navigating to QTC App URL: {settings.QTC_APP_URL}")
+        page.goto(settings.QTC_APP_URL, wait_until="domcontentloaded", timeout=settings.QTC_NAVIGATION_TIMEOUT_MS)
+
+    with timer.step("form_ready"):
+        page.wait_for_selector(QTC_SELECTORS["form_ready"], state="visible", timeout=settings.QTC_NAVIGATION_TIMEOUT_MS)
+        logger.info(f"Page loaded: {page.title()}")
+
+def _warm_up_form(page: Page) -> None:
+    timer = StepTimer("QTC form warm-up")
+    try:
+        open_qtc_form(page, timer)
+    finally:
+        timer.log()
+
+
 class PlaywrightService:
     """
     A service to interact with the QTC Power App.
@@ -81,74 +106,102 @@ class PlaywrightService:
     def __init__(self, data: QTCFormData):
         self.data = data
 
-    def fill_qtc_form(self) -> str:
+    def submit(self, prepared: Optional[Any] = None) -> str:
         """
-        Launches an authenticated browser, navigates to the QTC app,
-        and fills the form with the provided data.
+        Gets an authenticated page (async engine, warm browser pool, or a
+        one-off browser) and fills the form with the data. Raises on failure.
+        `prepared` is a page handle from `prepare_qtc_form()` that is
+        already on the form.
         """
         logger.info(f"Starting browser automation for: {self.data.client_name}")
-        
+
+        if settings.PLAYWRIGHT_ENGINE == "async":
+            engine = get_async_form_engine()
+            if prepared is not None:
+                return engine.submit_prepared(prepared, self.data)
+            return engine.fill(self.data)
+
+        if settings.BROWSER_POOL_ENABLED:
+            pool = get_browser_pool()
+            if prepared is not None:
+                try:
+                    return pool.run_prepared(prepared, self._fill_form)
+                except WarmupFailed as e:
+                    logger.warning(f"Speculative warm-up failed ({e}), loading the form again.")
+            return pool.run(self._fill_page)
+
+        with launch_playwright_context() as (pw, browser, context, page):
+            return self._fill_page(page)
+
+    def _fill_page(self, page: Page) -> str:
+        """
+        Navigates an already-authenticated page to the QTC app and fills it.
+        """
+        timer = StepTimer(f"QTC submission for {self.data.client_name}")
         try:
-            with launch_playwright_context() as (pw, browser, context, page):
-                
-                logger.info(f"Navigating to QTC App URL: {QTC_APP_URL}")
-                page.goto(QTC_APP_URL, wait_until="networkidle", timeout=60000)
-                logger.info(f"Page loaded: {page.title()}")
-                
-                # --- TODO: This is where we implement the REAL logic ---
-                # This logic is highly dependent on the Power App's HTML structure.
-                # We need to find the locators (CSS Selectors, data-testid, etc.)
-                # for each form field from the PDF.
-                
-                # Example (using locators):
-                # logger.info(f"Setting Client Name: {self.data.client_name}")
-                # page.locator("input[data-testid='client_name_field']").fill(self.data.client_name)
-                
-                # logger.info(f"Setting Product: {self.data.product}")
-                # page.locator(f"button[data-value='{self.data.product}']").click()
-                
-                # logger.info(f"Setting POL: {self.data.port_of_loading}")
-                # page.locator("input[data-testid='pol_field']").fill(self.data.port_of_loading)
-                
-                # logger.info(f"Setting POD: {self.data.port_of_discharge}")
-                # page.locator("input[data-testid='pod_field']").fill(self.data.port_of_discharge)
-
-                # logger.info(f"Setting Commodity: {self.data.commodity}")
-                # page.locator("input[data-testid='commodity_field']").fill(self.data.commodity)
-                
-                # logger.info("All fields filled. Simulating submit.")
-                # page.locator("button[data-testid='submit_button']").click()
-                
-                # --- Placeholder Logic ---
-                logger.info("--- (START) PLACEHOLDER LOGIC ---")
-                logger.info("Pretending to fill form...")
-                page.wait_for_timeout(5000) # Simulate 5 seconds of work
-                logger.info(f"Data used: {self.data.model_dump_json(indent=2)}")
-                logger.info("Pretending to click submit...")
-                page.wait_for_timeout(1000)
-                logger.info("--- (END) PLACEHOLDER LOGIC ---")
-
-                # --- Wait for submission confirmation ---
-                # page.wait_for_selector("div[data-testid='success_message']", timeout=30000)
-                
-                success_message = f"Successfully submitted QTC for {self.data.client_name}"
-                logger.info(success_message)
-                
-                return success_message
-
-        except FileNotFoundError:
-            # This is a critical failure, raised by launch_playwright_context
-            return "Automation failed: Auth file not found."
-        except Exception as e:
-            logger.exception(f"Unhandled exception during form filling: {e}")
-            # HIL Trigger: Notify human that automation failed
-            return f"Automation failed: {str(e)}"
+            open_qtc_form(page, timer)
+            return self._submit_form(page, timer)
+        finally:
+            timer.log()
+
+    def _fill_form(self, page: Page) -> str:
+        """
+        Fills and submits a page that is already showing the QTC form.
+        Every wait targets a specific selector or response, and the time
+        spent in each step is logged when the attempt ends, failed or not.
+        """
+        timer = StepTimer(f"QTC submission for {self.data.client_name}")
+        try:
+            return self._submit_form(page, timer)
+        finally:
+            timer.log()
+
+    def _submit_form(self, page: Page, timer: StepTimer) -> str:
+        timeout = settings.QTC_STEP_TIMEOUT_MS
 
-# --- Helper function for our job ---
-def fill_qtc_form_job(data: QTCFormData) -> str:
+        for step in build_fill_steps(self.data):
+            with timer.step(step.name):
+                if step.action == "fill":
+                    page.fill(step.selector, step.value, timeout=timeout)
+                elif step.action == "click":
+                    page.click(step.selector, timeout=timeout)
+                elif step.action == "check":
+                    page.check(step.selector, timeout=timeout)
+
+        with timer.step("submit"):
+            with page.expect_response(
+                lambda r: is_submit_response(r.request.method, r.url),
+                timeout=timeout,
+            ) as response_info:
+                page.click(QTC_SELECTORS["submit"], timeout=timeout)
+            response = response_info.value
+            if not response.ok:
+                raise RuntimeError(f"QTC submit returned HTTP {response.status}")
+
+        with timer.step("confirmation"):
+            page.wait_for_selector(QTC_SELECTORS["success"], timeout=timeout)
+
+        success_message = f"Successfully submitted QTC for {self.data.client_name}"
+        logger.info(success_message)
+        
+        return success_message
+
+# --- Speculative warm-up helpers ---
+def prepare_qtc_form() -> Optional[Any]:
     """
-    A helper function that our processing.py job can call.
+    Starts loading the QTC form on a reserved page without waiting for it.
+    Returns a handle for `PlaywrightService.submit(prepared=...)` or
+    `release_qtc_form()`, or None if no browser is free.
     """
-    service = PlaywrightService(data=data)
-    result = service.fill_qtc_form()
-    return result
+    if settings.PLAYWRIGHT_ENGINE == "async":
+        return get_async_form_engine().prepare()
+    if settings.BROWSER_POOL_ENABLED:
+        return get_browser_pool().prepare(_warm_up_form)
+    return None
+
+def release_qtc_form(prepared: Any) -> None:
+    """Gives back a prepared page that will not be filled."""
+    if settings.PLAYWRIGHT_ENGINE == "async":
+        get_async_form_engine().release(prepared)
+    else:
+        get_browser_pool().release(prepared)
@@ -0,0 +1,418 @@
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+from playwright.async_api import (
+    async_playwright,
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    Route,
+)
+
+from app.core import tracing
+from app.core.config import settings
+from app.models.qtc_models import QTCFormData
+from app.services.qtc_form import (
+    QTC_SELECTORS,
+    StepTimer,
+    build_fill_steps,
+    is_submit_response,
+    should_block_request,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WorkItem = Tuple[QTCFormData, "asyncio.Future[str]", Optional[tracing.Trace]]
+
+
+async def _install_request_blocking(context: BrowserContext) -> None:
+    async def handle(route: Route) -> None:
+        request = route.request
+        if should_block_request(request.resource_type, request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle)
+
+async def _in_trace(trace: Optional[tracing.Trace], coro: Awaitable[T]) -> T:
+    with tracing.activate(trace):
+        return await coro
+
+
+class AsyncQTCFormEngine:
+    """
+    Fills several QTC forms at once inside one Chromium browser.
+
+    Validated `QTCFormData` items go onto an asyncio queue that
+    `concurrency` workers drain. Every item gets its own browser context,
+    so cookies, storage and routes are never shared between submissions.
+    The engine runs its own event loop on a background thread, so it can
+    be fed from the sync job code through `submit()`.
+    """
+    def __init__(self, auth_path: Path, concurrency: int = 4, headless: bool = True,
+                 block_requests: bool = False, queue_size: int = 100, result_timeout: float = 600.0):
+        self.auth_path = auth_path
+        self.concurrency = concurrency
+        self.headless = headless
+        self.block_requests = block_requests
+        self.queue_size = queue_size
+        self.result_timeout = result_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._queue: Optional["asyncio.Queue[_WorkItem]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._pw: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._pages: Optional[asyncio.Semaphore] = None
+        # Permits of _pages in use (only touched on the loop thread)
+        self._busy_pages = 0
+        self._storage_state: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    # --- Public API (called from any thread) ---
+
+    def start(self) -> None:
+        """Starts the event loop thread, the browser and the workers."""
+        with self._lock:
+            if self._loop is not None:
+                return
+            if not self.auth_path.exists():
+                logger.error(f"FATAL: Playwright auth file not found at: {self.auth_path}")
+                raise FileNotFoundError(f"Storage state file not found: {self.auth_path}")
+            with open(self.auth_path, "r") as f:
+                self._storage_state = json.load(f)
+
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="qtc-async-engine", daemon=True)
+            self._thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._startup(), loop).result()
+            except Exception:
+                # Stop whatever did start (Playwright driver, browser) with the loop
+                try:
+                    asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+                except Exception as e:
+                    logger.warning(f"Ignoring error while cleaning up a failed start: {e}")
+                loop.call_soon_threadsafe(loop.stop)
+                self._thread.join()
+                loop.close()
+                self._thread = None
+                raise
+            self._loop = loop
+            logger.info(f"Async form engine started with {self.concurrency} concurrent page(s).")
+
+    def submit(self, data: QTCFormData) -> "Future[str]":
+        """Queues one form and returns a future for its success message (see `wait()`)."""
+        if self._loop is None:
+            self.start()
+        return self._call(self._enqueue(data))
+
+    def fill(self, data: QTCFormData) -> str:
+        """Queues one form and waits for its success message."""
+        return self.wait(self.submit(data))
+
+    def wait(self, future: "Future[T]") -> T:
+        """
+        The result of a future from this engine, waiting at most
+        `result_timeout`. On timeout the form is withdrawn if it has not
+        been picked up yet, and TimeoutError is raised.
+        """
+        try:
+            return future.result(timeout=self.result_timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"No result from the async form engine within {self.result_timeout:g}s")
+
+    def prepare(self) -> "Optional[Future[Optional[Tuple[BrowserContext, Page]]]]":
+        """
+        Opens a context and starts loading the form in the background.
+        The returned future must be passed to `submit_prepared()` or
+        `release()`. Returns None if the engine is not running.
+        """
+        if self._loop is None:
+            return None
+        return self._call(self._prepare())
+
+    def submit_prepared(self, warmup: "Future[Optional[Tuple[BrowserContext, Page]]]", data: QTCFormData) -> str:
+        """Fills the prepared page, falling back to the queue if the warm-up did not happen."""
+        return self.wait(self._call(self._fill_prepared(warmup, data)))
+
+    def release(self, warmup: "Future[Optional[Tuple[BrowserContext, Page]]]") -> None:
+        """Closes a prepared page that will not be filled."""
+        asyncio.run_coroutine_threadsafe(self._release_prepared(warmup), self._loop).result()
+
+    def fill_many(self, items: List[QTCFormData]) -> List[str]:
+        """Fills all items concurrently and returns their results in order."""
+        futures = [self.submit(item) for item in items]
+        results: List[str] = []
+        for item, future in zip(items, futures):
+            try:
+                results.append(self.wait(future))
+            except Exception as e:
+                logger.error(f"Form for {item.client_name} failed: {e}")
+                results.append(f"Automation failed: {str(e)}")
+        return results
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._loop is None:
+                return
+            logger.info("Shutting down async form engine...")
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+            except Exception as e:
+                logger.warning(f"Ignoring error during async engine shutdown: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+            logger.info("Async form engine stopped.")
+
+    def _call(self, coro: Awaitable[T]) -> "Future[T]":
+        """Schedules `coro` on the engine loop inside the caller's trace."""
+        return asyncio.run_coroutine_threadsafe(_in_trace(tracing.current_trace(), coro), self._loop)
+
+    # --- Event loop side ---
+
+    async def _startup(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._browser_lock = asyncio.Lock()
+        # Caps open contexts, whether from queue workers or speculative warm-ups
+        self._pages = asyncio.Semaphore(self.concurrency)
+        self._pw = await async_playwright().start()
+        await self._ensure_browser()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.concurrency)
+        ]
+
+    async def _ensure_browser(self) -> Browser:
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                logger.info("Launching Chromium for the async form engine...")
+                self._browser = await self._pw.chromium.launch(headless=self.headless)
+            return self._browser
+
+    async def _enqueue(self, data: QTCFormData) -> str:
+        result: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, result, tracing.current_trace()))
+        return await result
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            data, result, trace = await self._queue.get()
+            try:
+                if result.done():
+                    # The caller gave up (timed out) before the form was picked up
+                    continue
+                with tracing.activate(trace):
+                    message = await self._fill_one(data)
+                if not result.done():
+                    result.set_result(message)
+            except asyncio.CancelledError:
+                # Shutting down mid-form: the caller must not wait forever
+                if not result.done():
+                    result.set_exception(RuntimeError("Async form engine shut down during the submission"))
+                raise
+            except Exception as e:
+                logger.error(f"[worker {index}] Form for {data.client_name} failed: {e}")
+                if not result.done():
+                    result.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _take_page(self) -> None:
+        await self._pages.acquire()
+        self._busy_pages += 1
+
+    def _give_page(self) -> None:
+        self._busy_pages -= 1
+        self._pages.release()
+
+    async def _open_context(self) -> Tuple[BrowserContext, Page]:
+        browser = await self._ensure_browser()
+        context = await browser.new_context(storage_state=self._storage_state)
+        try:
+            if self.block_requests:
+                await _install_request_blocking(context)
+            return context, await context.new_page()
+        except Exception:
+            await context.close()
+            raise
+
+    async def _fill_one(self, data: QTCFormData) -> str:
+        await self._take_page()
+        try:
+            context, page = await self._open_context()
+            try:
+                timer = StepTimer(f"QTC submission for {data.client_name}")
+                try:
+                    await self._open_form(page, timer)
+                    return await self._fill_form(page, data, timer)
+                finally:
+                    timer.log()
+            finally:
+                await context.close()
+        finally:
+            self._give_page()
+
+    async def _prepare(self) -> Optional[Tuple[BrowserContext, Page]]:
+        # Speculation must never delay real work: a warm-up holds its page for
+        # the whole LLM call, so one page stays free for queued submissions.
+        if self.concurrency - self._busy_pages < 2 or not self._queue.empty():
+            return None
+        await self._take_page()
+        try:
+            context, page = await self._open_context()
+        except Exception:
+            self._give_page()
+            raise
+        try:
+            timer = StepTimer("QTC form warm-up")
+            try:
+                await self._open_form(page, timer)
+            finally:
+                timer.log()
+        except Exception:
+            await context.close()
+            self._give_page()
+            raise
+        return context, page
+
+    async def _fill_prepared(self, warmup: "Future[Optional[Tuple[BrowserContext, Page]]]", data: QTCFormData) -> str:
+        try:
+            prepared = await asyncio.wrap_future(warmup)
+        except Exception as e:
+            logger.warning(f"Speculative warm-up failed ({e}), loading the form again.")
+            prepared = None
+        if prepared is None:
+            return await self._enqueue(data)
+
+        context, page = prepared
+        timer = StepTimer(f"QTC submission for {data.client_name}")
+        try:
+            return await self._fill_form(page, data, timer)
+        finally:
+            timer.log()
+            await context.close()
+            self._give_page()
+
+    async def _release_prepared(self, warmup: "Future[Optional[Tuple[BrowserContext, Page]]]") -> None:
+        try:
+            prepared = await asyncio.wrap_future(warmup)
+        except Exception:
+            return
+        if prepared is not None:
+            await prepared[0].close()
+            self._give_page()
+
+    async def _open_form(self, page: Page, timer: StepTimer) -> None:
+        async with timer.astep("navigate"):
+            await page.goto(settings.QTC_APP_URL, wait_until="domcontentloaded", timeout=settings.QTC_NAVIGATION_TIMEOUT_MS)
+
+        async with timer.astep("form_ready"):
+            await page.wait_for_selector(QTC_SELECTORS["form_ready"], state="visible", timeout=settings.QTC_NAVIGATION_TIMEOUT_MS)
+
+    async def _fill_form(self, page: Page, data: QTCFormData, timer: StepTimer) -> str:
+        # Callers log the timer when the attempt ends, failed or not
+        timeout = settings.QTC_STEP_TIMEOUT_MS
+
+        for step in build_fill_steps(data):
+            async with timer.astep(step.name):
+                if step.action == "fill":
+                    await page.fill(step.selector, step.value, timeout=timeout)
+                elif step.action == "click":
+                    await page.click(step.selector, timeout=timeout)
+                elif step.action == "check":
+                    await page.check(step.selector, timeout=timeout)
+
+        async with timer.astep("submit"):
+            async with page.expect_response(
+                lambda r: is_submit_response(r.request.method, r.url),
+                timeout=timeout,
+            ) as response_info:
+                await page.click(QTC_SELECTORS["submit"], timeout=timeout)
+            response = await response_info.value
+            if not response.ok:
+                raise RuntimeError(f"QTC submit returned HTTP {response.status}")
+
+        async with timer.astep("confirmation"):
+            await page.wait_for_selector(QTC_SELECTORS["success"], timeout=timeout)
+
+        return f"Successfully submitted QTC for {data.client_name}"
+
+    async def _close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Fail the forms still queued, then anything else still running on
+        # the loop (callers blocked on a full queue, warm-ups), so no caller
+        # is left waiting on a loop that is about to stop
+        while self._queue is not None and not self._queue.empty():
+            _, result, _ = self._queue.get_nowait()
+            if not result.done():
+                result.set_exception(RuntimeError("Async form engine shut down before the submission started"))
+        # Let their callers' tasks see that exception before the rest is cancelled
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+        if self._pw:
+            await self._pw.stop()
+            self._pw = None
+
+
+# --- Process-wide engine ---
+
+_engine: Optional[AsyncQTCFormEngine] = None
+_engine_lock = threading.Lock()
+
+def get_async_form_engine() -> AsyncQTCFormEngine:
+    """Returns the shared async engine, creating it from settings on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncQTCFormEngine(
+                auth_path=settings.AUTH_JSON_PATH,
+                concurrency=settings.PLAYWRIGHT_CONCURRENCY,
+                headless=settings.BROWSER_HEADLESS,
+                block_requests=settings.PLAYWRIGHT_FAST_MODE,
+                result_timeout=settings.QTC_SUBMISSION_TIMEOUT_SECONDS,
+            )
+        return _engine
+
+def shutdown_async_form_engine() -> None:
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
+            _engine = None
+
+# --- Helper function for backlogs ---
+def fill_qtc_forms_concurrently(items: List[QTCFormData]) -> List[str]:
+    """
+    Fills a batch of validated forms (e.g. the morning backlog) using the
+    shared async engine. Results are returned in the same order.
+    """
+    return get_async_form_engine().fill_many(items)
@@ -0,0 +1,165 @@
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncGenerator, Dict, Generator, List, Literal, Optional, Tuple
+
+from app.core import tracing
+from app.core.config import settings
+from app.models.qtc_models import QTCFormData
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# --- Form locators ---
+# The defaults follow the data-testid naming of the original automation
+# sketch; each deployment sets the locators of its own form in
+# QTC_SELECTORS_FILE. Entries with `{value}` are formatted with the field
+# value (e.g. the product button to click).
+DEFAULT_QTC_SELECTORS = {
+    "form_ready": "input[data-testid='client_name_field']",
+    "client_name": "input[data-testid='client_name_field']",
+    "inquiry_type": "button[data-value='{value}']",
+    "product": "button[data-value='{value}']",
+    "incoterms": "input[data-testid='incoterms_field']",
+    "ocean_type": "button[data-value='{value}']",
+    "containers": "input[data-testid='containers_field']",
+    "port_of_loading": "input[data-testid='pol_field']",
+    "port_of_discharge": "input[data-testid='pod_field']",
+    "commodity": "input[data-testid='commodity_field']",
+    "freetime_requirement": "input[data-testid='freetime_field']",
+    "dangerous_goods": "input[data-testid='dg_checkbox']",
+    "submit": "button[data-testid='submit_button']",
+    "success": "div[data-testid='success_message']",
+}
+
+def load_qtc_selectors(path: Optional[Path]) -> Dict[str, str]:
+    """The default locators with the overrides from `path` (a JSON object) applied."""
+    selectors = dict(DEFAULT_QTC_SELECTORS)
+    if path is None:
+        logger.warning("QTC_SELECTORS_FILE is not set; using the default form locators.")
+        return selectors
+    with open(path, "r") as f:
+        overrides = json.load(f)
+    unknown = set(overrides) - set(selectors)
+    if unknown:
+        raise ValueError(f"Unknown QTC selector(s) in {path}: {', '.join(sorted(unknown))}")
+    selectors.update(overrides)
+    logger.info(f"Loaded {len(overrides)} QTC form locator(s) from {path}")
+    return selectors
+
+QTC_SELECTORS = load_qtc_selectors(settings.QTC_SELECTORS_FILE)
+
+# Power Apps saves records through its connector gateway. The submit step
+# waits for this POST instead of sleeping.
+QTC_SUBMIT_RESPONSE_PATTERN = "/invoke"
+
+# --- Request interception (fast mode) ---
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+# Power Apps keeps polling these, which is why `networkidle` never fires.
+BLOCKED_URL_PATTERNS = (
+    "browser.events.data.microsoft.com",
+    "mobile.events.data.microsoft.com",
+    "browser.pipe.aria.microsoft.com",
+    "js.monitor.azure.com",
+    "dc.services.visualstudio.com",
+    "applicationinsights",
+    "clarity.ms",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "/telemetry",
+)
+
+def should_block_request(resource_type: str, url: str) -> bool:
+    """Returns True for requests the form does not need (media, analytics, telemetry)."""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    url = url.lower()
+    return any(pattern in url for pattern in BLOCKED_URL_PATTERNS)
+
+def is_submit_response(method: str, url: str) -> bool:
+    return method == "POST" and QTC_SUBMIT_RESPONSE_PATTERN in url
+
+
+def containers_summary(data: QTCFormData) -> str:
+    """Renders containers the way the form expects them, e.g. "2x20GP, 1x40HC"."""
+    return ", ".join(f"{c.quantity}x{c.container_type}" for c in data.containers)
+
+
+@dataclass
+class FillStep:
+    """One UI action needed to fill the QTC form."""
+    name: str
+    action: Literal["fill", "click", "check"]
+    selector: str
+    value: Optional[str] = None
+
+def build_fill_steps(data: QTCFormData) -> List[FillStep]:
+    """
+    Turns validated form data into the ordered list of UI actions.
+    Shared by the sync and async Playwright engines.
+    """
+    def button(field: str, value: str) -> FillStep:
+        return FillStep(f"select_{field}", "click", QTC_SELECTORS[field].format(value=value))
+
+    def text(field: str, value: str) -> FillStep:
+        return FillStep(f"fill_{field}", "fill", QTC_SELECTORS[field], value)
+
+    steps = [
+        text("client_name", data.client_name),
+        button("inquiry_type", data.inquiry_type),
+        button("product", data.product),
+        text("incoterms", data.incoterms),
+    ]
+    if data.ocean_type:
+        steps.append(button("ocean_type", data.ocean_type))
+    if data.containers:
+        steps.append(text("containers", containers_summary(data)))
+    steps += [
+        text("port_of_loading", data.port_of_loading),
+        text("port_of_discharge", data.port_of_discharge),
+        text("commodity", data.commodity),
+        text("freetime_requirement", str(data.freetime_requirement)),
+    ]
+    if data.dangerous_goods:
+        steps.append(FillStep("check_dangerous_goods", "check", QTC_SELECTORS["dangerous_goods"]))
+    return steps
+
+
+class StepTimer:
+    """Collects per-step durations for one submission and logs a breakdown."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.steps: List[Tuple[str, float]] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            # Each browser step is also a span in the job's trace, if one is active
+            with tracing.span(f"browser.{name}"):
+                yield
+        finally:
+            self.steps.append((name, (time.perf_counter() - start) * 1000))
+
+    @asynccontextmanager
+    async def astep(self, name: str) -> AsyncGenerator[None, None]:
+        with self.step(name):
+            yield
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def summary(self) -> str:
+        parts = [f"{name}={ms:.0f}ms" for name, ms in self.steps]
+        parts.append(f"total={self.total_ms:.0f}ms")
+        return " ".join(parts)
+
+    def log(self) -> None:
+        logger.info(f"[TIMING] {self.label}: {self.summary()}")
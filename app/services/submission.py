@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.metrics import observe_stage
+from app.models.qtc_models import QTCFormData
+from app.services.qtc_form import containers_summary
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# A cached delegated token is replaced this long before it expires
+TOKEN_RENEW_MARGIN_SECONDS = 300
+
+
+@dataclass
+class SubmissionResult:
+    """Outcome of one QTC submission, whichever backend made it."""
+    ok: bool
+    message: str
+    backend: str
+    elapsed_ms: float
+
+
+class SubmissionBackend(ABC):
+    """
+    Interface for getting a validated `QTCFormData` into the QTC app.
+    Implementations raise on failure; `submit()` times the call and turns
+    the outcome into a `SubmissionResult`.
+    """
+    name: str = "base"
+
+    def start(self) -> None:
+        """Warms up whatever the backend needs. No-op by default."""
+
+    def shutdown(self) -> None:
+        """Releases long-lived resources. No-op by default."""
+
+    def prepare(self) -> Optional[Any]:
+        """
+        Starts getting ready for a submission whose data is not known yet
+        (e.g. loading the form while the LLM runs). Returns a handle for
+        `submit(prepared=...)` or `release()`, or None if there is nothing
+        worth preparing.
+        """
+        return None
+
+    def release(self, prepared: Any) -> None:
+        """Gives back a prepared handle that will not be used."""
+
+    @abstractmethod
+    def _submit(self, data: QTCFormData, prepared: Optional[Any] = None) -> str:
+        """Submits the record and returns a success message. Raises on failure."""
+
+    def submit(self, data: QTCFormData, prepared: Optional[Any] = None) -> SubmissionResult:
+        start = time.perf_counter()
+        try:
+            with tracing.span("submit.backend", backend=self.name, speculative=prepared is not None):
+                message = self._submit(data, prepared)
+            ok = True
+        except FileNotFoundError:
+            message = "Automation failed: Auth file not found."
+            ok = False
+        except Exception as e:
+            logger.exception(f"Unhandled exception during {self.name} submission: {e}")
+            # HIL Trigger: Notify human that automation failed
+            message = f"Automation failed: {str(e)}"
+            ok = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        observe_stage(f"submit_{self.name}", elapsed_ms / 1000)
+        logger.info(f"[SUBMIT] backend={self.name} ok={ok} elapsed={elapsed_ms:.0f}ms")
+        return SubmissionResult(ok=ok, message=message, backend=self.name, elapsed_ms=elapsed_ms)
+
+
+class PlaywrightBackend(SubmissionBackend):
+    """Fills the Power App UI with Playwright (sync pool or async engine)."""
+    name = "playwright"
+
+    def start(self) -> None:
+        # Launch the browsers once, so jobs lease a warm page instead of
+        # launching Chromium themselves.
+        if settings.PLAYWRIGHT_ENGINE == "async":
+            from app.services.playwright_async import get_async_form_engine
+
+            get_async_form_engine().start()
+        elif settings.BROWSER_POOL_ENABLED:
+            from app.services.browser_pool import get_browser_pool
+
+            get_browser_pool().start()
+
+    def shutdown(self) -> None:
+        from app.services.browser_pool import shutdown_browser_pool
+        from app.services.playwright_async import shutdown_async_form_engine
+
+        shutdown_async_form_engine()
+        shutdown_browser_pool()
+
+    def prepare(self) -> Optional[Any]:
+        from app.services.playwright import prepare_qtc_form
+
+        return prepare_qtc_form()
+
+    def release(self, prepared: Any) -> None:
+        from app.services.playwright import release_qtc_form
+
+        release_qtc_form(prepared)
+
+    def _submit(self, data: QTCFormData, prepared: Optional[Any] = None) -> str:
+        from app.services.playwright import PlaywrightService
+
+        return PlaywrightService(data=data).submit(prepared=prepared)
+
+
+class HttpBackend(SubmissionBackend):
+    """
+    Posts the record straight to the app's data source, skipping the UI.
+    The payload follows the SharePoint list item shape: {"fields": {...}}.
+    """
+    name = "http"
+
+    def __init__(self, endpoint: str, auth: str = "graph", token: Optional[str] = None, timeout: int = 30,
+                 scopes: Optional[List[str]] = None):
+        if not endpoint:
+            raise ValueError("QTC_HTTP_ENDPOINT is required for the http submission backend.")
+        self.endpoint = endpoint
+        self.auth = auth
+        self.token = token
+        self.timeout = timeout
+        self.scopes = scopes or []
+        # One session per backend keeps the TLS connection alive between submissions
+        self.session = requests.Session()
+        # Delegated token for `scopes` (auth "graph") and when to fetch a new one
+        self._graph_token: Optional[str] = None
+        self._graph_token_renew_at = 0.0
+        self._token_lock = threading.Lock()
+
+    def _delegated_token(self) -> str:
+        """The cached delegated token for `scopes`, renewed a few minutes before it expires."""
+        with self._token_lock:
+            if self._graph_token is None or time.monotonic() >= self._graph_token_renew_at:
+                from app.services.graph_auth import get_cached_token_result
+
+                result = get_cached_token_result(self.scopes)
+                if result is None:
+                    raise RuntimeError(
+                        f"No cached token for {', '.join(self.scopes)}; run generate_user_tokens.py to consent to them."
+                    )
+                self._graph_token = result["access_token"]
+                self._graph_token_renew_at = time.monotonic() + max(0, int(result.get("expires_in", 0)) - TOKEN_RENEW_MARGIN_SECONDS)
+            return self._graph_token
+
+    def _auth_headers(self) -> Dict[str, str]:
+        if self.auth == "graph":
+            return {"Authorization": f"Bearer {self._delegated_token()}"}
+        if self.auth == "bearer":
+            if not self.token:
+                raise ValueError("QTC_HTTP_TOKEN must be set when QTC_HTTP_AUTH is 'bearer'.")
+            return {"Authorization": f"Bearer {self.token}"}
+        return {}
+
+    def _submit(self, data: QTCFormData, prepared: Optional[Any] = None) -> str:
+        response = self.session.post(
+            self.endpoint,
+            json={"fields": to_record_fields(data)},
+            headers=self._auth_headers(),
+            timeout=self.timeout,
+        )
+        if response.status_code == 401 and self.auth == "graph":
+            # Revoked or expired early: the next submission fetches a new one
+            with self._token_lock:
+                self._graph_token = None
+        response.raise_for_status()
+        record_id = response.json().get("id") if response.content else None
+        return f"Successfully submitted QTC for {data.client_name} (record {record_id})"
+
+
+def to_record_fields(data: QTCFormData) -> Dict[str, Any]:
+    """Flattens the form data into list columns (no nested values)."""
+    fields = data.model_dump(exclude={"containers"})
+    fields["containers"] = containers_summary(data)
+    return fields
+
+
+# --- Configured backend ---
+
+_backend: Optional[SubmissionBackend] = None
+_backend_lock = threading.Lock()
+
+def get_submission_backend() -> SubmissionBackend:
+    """Returns the backend chosen by SUBMISSION_BACKEND, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if settings.SUBMISSION_BACKEND == "http":
+                _backend = HttpBackend(
+                    endpoint=settings.QTC_HTTP_ENDPOINT,
+                    auth=settings.QTC_HTTP_AUTH,
+                    token=settings.QTC_HTTP_TOKEN,
+                    timeout=settings.QTC_HTTP_TIMEOUT,
+                    scopes=settings.QTC_HTTP_SCOPES,
+                )
+            else:
+                _backend = PlaywrightBackend()
+            logger.info(f"Using '{_backend.name}' submission backend.")
+        return _backend
+
+def shutdown_submission_backend() -> None:
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.shutdown()
+            _backend = None
+
+# --- Helper functions for our job ---
+def submit_qtc_record(data: QTCFormData, prepared: Optional[Any] = None) -> SubmissionResult:
+    return get_submission_backend().submit(data, prepared=prepared)
+
+def prepare_submission() -> Optional[Any]:
+    """Speculatively prepares the configured backend (see SPECULATIVE_WARMUP)."""
+    if not settings.SPECULATIVE_WARMUP:
+        return None
+    try:
+        return get_submission_backend().prepare()
+    except Exception as e:
+        logger.warning(f"Could not prepare submission speculatively: {e}")
+        return None
+
+def release_submission(prepared: Optional[Any]) -> None:
+    if prepared is None:
+        return
+    try:
+        get_submission_backend().release(prepared)
+    except Exception as e:
+        logger.warning(f"Ignoring error while releasing prepared submission: {e}")
@@ -0,0 +1,149 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.core.config import settings
+from app.core.metrics import SUBSCRIPTION_SECONDS_LEFT
+from app.services.graph_api import GraphApiService, get_graph_service_sync, notification_url, warm_up_access_token
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_left(subscription: Dict[str, Any]) -> float:
+    """Seconds until a subscription's expirationDateTime (negative once expired)."""
+    expires = datetime.fromisoformat(subscription["expirationDateTime"])
+    return (expires - datetime.now(timezone.utc)).total_seconds()
+
+def subscriptions_by_mailbox(existing: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Our subscriptions among `existing`, keyed by the configured mailbox they
+    notify for. Ones posting to the bare WEBHOOK_NOTIFICATION_URL predate
+    multi-mailbox support and count as MAILBOX_UPN's (resolve_mailbox
+    routes them there), so they are renewed rather than joined by another.
+    """
+    urls = {notification_url(mailbox): mailbox for mailbox in settings.mailboxes}
+    if settings.MAILBOX_UPN in settings.mailboxes:
+        urls.setdefault(settings.WEBHOOK_NOTIFICATION_URL, settings.MAILBOX_UPN)
+    found: Dict[str, List[Dict[str, Any]]] = {mailbox: [] for mailbox in settings.mailboxes}
+    for sub in existing:
+        mailbox = urls.get(sub.get("notificationUrl"))
+        if mailbox is not None:
+            found[mailbox].append(sub)
+    return found
+
+def keep_alive(service: GraphApiService, subs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Makes sure the service's mailbox has a live subscription: renews the
+    longest-lived one with PATCH when it is close to expiry, or creates one
+    if there is none (or it can no longer be renewed). Returns it.
+    """
+    renew_before = settings.SUBSCRIPTION_RENEW_BEFORE_MINUTES * 60
+    for sub in sorted(subs, key=seconds_left, reverse=True):
+        if seconds_left(sub) > renew_before:
+            return sub
+        try:
+            renewed = service.renew_subscription(sub["id"])
+            logger.info(f"Renewed subscription {sub['id']} for {service.mailbox} until {renewed['expirationDateTime']}.")
+            return renewed
+        except requests.HTTPError as e:
+            # 404: it already lapsed and Graph deleted it
+            logger.warning(f"Could not renew subscription {sub['id']} for {service.mailbox}: {e}")
+    created = service.create_subscription()
+    logger.info(f"Created subscription {created['id']} for {service.mailbox} until {created['expirationDateTime']}.")
+    return created
+
+def keep_all_alive(service: GraphApiService) -> Dict[str, Dict[str, Any]]:
+    """Runs keep_alive for every configured mailbox, concurrently. Returns {mailbox: subscription}."""
+    found = subscriptions_by_mailbox(service.list_subscriptions())
+    results: Dict[str, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=len(found), thread_name_prefix="subscription") as pool:
+        futures = {
+            mailbox: pool.submit(keep_alive, GraphApiService(service.session, mailbox), subs)
+            for mailbox, subs in found.items()
+        }
+        for mailbox, future in futures.items():
+            try:
+                results[mailbox] = future.result()
+            except Exception as e:
+                logger.error(f"Could not keep the subscription for {mailbox} alive: {e}")
+    return results
+
+
+class SubscriptionRenewer:
+    """
+    Background thread that keeps every mailbox's subscription alive. Only
+    the replica-group leader acts, so replicas don't race each other. Start
+    one per process group at most: with the memory coordination backend
+    each process leads itself (app.server runs it in the supervisor only).
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._was_leader = False
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="subscription-renewer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        # Give the coordinator a heartbeat to settle who leads
+        if self._stop.wait(settings.LEASE_HEARTBEAT_SECONDS):
+            return
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Subscription check failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def check(self) -> None:
+        from app.core.coordination import get_coordinator
+
+        if not get_coordinator().is_leader():
+            if self._was_leader:
+                # The new leader reports from now on (the gauge keeps the max)
+                for mailbox in settings.mailboxes:
+                    SUBSCRIPTION_SECONDS_LEFT.labels(mailbox=mailbox).set(0)
+                self._was_leader = False
+            return
+        self._was_leader = True
+        if not warm_up_access_token():
+            # Never start the interactive device flow from a background thread
+            logger.warning("No cached Graph token; skipping the subscription check.")
+            return
+        for mailbox, sub in keep_all_alive(get_graph_service_sync()).items():
+            SUBSCRIPTION_SECONDS_LEFT.labels(mailbox=mailbox).set(max(0.0, seconds_left(sub)))
+
+
+# --- Process-wide renewer ---
+
+_renewer: Optional[SubscriptionRenewer] = None
+_renewer_lock = threading.Lock()
+
+def start_subscription_renewer() -> None:
+    global _renewer
+    with _renewer_lock:
+        if _renewer is None:
+            _renewer = SubscriptionRenewer(settings.SUBSCRIPTION_CHECK_SECONDS)
+            _renewer.start()
+
+def shutdown_subscription_renewer() -> None:
+    global _renewer
+    with _renewer_lock:
+        if _renewer is not None:
+            _renewer.stop()
+            _renewer = None
@@ -0,0 +1,92 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Imported up front so the first attachment of each kind doesn't pay for them
+PARSER_MODULES = ["pandas", "openpyxl", "PyPDF2", "docx", "bs4"]
+# Steps whose failure still leaves the process ready: without master data,
+# client and port names just stay as extracted
+OPTIONAL_STEPS = {"master_data"}
+
+_ready = threading.Event()
+_steps: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _step(name: str, fn: Callable[[], Any]) -> None:
+    """Runs one warm-up step. A failed step is recorded, not fatal: the job retries it on demand."""
+    start = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Warm-up step '{name}' failed: {e}")
+    with _lock:
+        _steps[name] = {"seconds": round(time.perf_counter() - start, 3), "error": error}
+
+def _import_parsers() -> None:
+    for module in PARSER_MODULES:
+        importlib.import_module(module)
+
+def _load_master_data() -> None:
+    from app.parsing.clients import get_client_directory
+    from app.parsing.ports import get_port_directory
+
+    get_client_directory()
+    get_port_directory()
+
+def _warm_up_token() -> None:
+    from app.services.graph_api import warm_up_access_token
+
+    if not warm_up_access_token():
+        raise RuntimeError("No cached Graph token; run generate_user_tokens.py")
+
+def _warm_up_gemini() -> None:
+    from app.services.gemini import get_gemini_service
+
+    get_gemini_service()
+
+def _warm_up_submission() -> None:
+    from app.services.submission import get_submission_backend
+
+    get_submission_backend().start()
+
+def warm_up(run_jobs: bool = True) -> None:
+    """
+    Pays one-off startup costs before work arrives: parser imports, the job
+    code, the master-data indexes, the Graph token provider, the Gemini client and the submission
+    backend (browser pool). Processes that only enqueue (run_jobs=False)
+    skip all of it. Marks the process ready only if every required step
+    succeeded; `status()` lists the ones that failed.
+    """
+    start = time.perf_counter()
+    if run_jobs:
+        _step("parser_imports", _import_parsers)
+        _step("job_code", lambda: importlib.import_module("app.processing"))
+        _step("master_data", _load_master_data)
+        _step("graph_token", _warm_up_token)
+        _step("gemini_client", _warm_up_gemini)
+        _step("submission_backend", _warm_up_submission)
+    failed = failed_steps()
+    if any(name not in OPTIONAL_STEPS for name in failed):
+        logger.error(f"Warm-up failed ({', '.join(failed)}); not marking this process ready.")
+        return
+    _ready.set()
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.1f}s.")
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def failed_steps() -> List[str]:
+    with _lock:
+        return [name for name, step in _steps.items() if step["error"] is not None]
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        steps = dict(_steps)
+    return {"ready": _ready.is_set(), "steps": steps, "failed": failed_steps()}
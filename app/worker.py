@@ -0,0 +1,134 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from typing import List
+
+from app.core.config import settings
+from app.core.jobqueue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are remembered this long so redelivered notifications are ignored
+DONE_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+class JobWorker:
+    """
+    One job-worker process: warms up, then runs JOB_WORKER_THREADS threads
+    that claim emails from the shared job queue and run process_email_job.
+    The main thread heartbeats and requeues jobs of dead workers.
+    """
+    def __init__(self, threads: int):
+        self.threads = threads
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.job_queue = get_job_queue()
+        self._stop = threading.Event()
+        self._ready = False
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        from app.core.coordination import get_coordinator, shutdown_coordinator
+        from app.warmup import is_ready, warm_up
+
+        get_coordinator().start()
+        self.job_queue.register_worker(self.worker_id)
+        # Warm-up can outlast WORKER_HEARTBEAT_TIMEOUT; keep heartbeating through it
+        warmed_up = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_until, args=(warmed_up,), name="warm-up-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            warm_up(run_jobs=True)
+        finally:
+            warmed_up.set()
+            heartbeat.join()
+        if is_ready():
+            self._ready = True
+            self.job_queue.mark_worker_ready(self.worker_id)
+            logger.info(f"Job worker {self.worker_id} ready with {self.threads} thread(s).")
+        else:
+            # Still runs jobs (they retry the failed steps on demand), but /ready stays 503
+            logger.error(f"Job worker {self.worker_id} failed to warm up; not reporting ready.")
+
+        runners: List[threading.Thread] = []
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._claim_loop, name=f"job-{index}", daemon=True)
+            thread.start()
+            runners.append(thread)
+
+        while not self._stop.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                self.job_queue.heartbeat(self.worker_id, ready=self._ready)
+                self.job_queue.requeue_orphans(settings.WORKER_HEARTBEAT_TIMEOUT)
+                self.job_queue.prune(DONE_RETENTION_SECONDS)
+                # Also refreshes the gauge while nothing is enqueued or claimed
+                self.job_queue.publish_depth()
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+
+        logger.info(f"Job worker {self.worker_id} stopping, finishing running jobs...")
+        for thread in runners:
+            thread.join()
+        self.job_queue.remove_worker(self.worker_id)
+        shutdown_coordinator()
+
+        from app.services.llm_batch import shutdown_extraction_batcher
+        from app.services.submission import shutdown_submission_backend
+
+        shutdown_extraction_batcher()
+        shutdown_submission_backend()
+
+    def _heartbeat_until(self, done: threading.Event) -> None:
+        while not done.wait(settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                self.job_queue.heartbeat(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+
+    def _claim_loop(self) -> None:
+        from app.core.coordination import get_coordinator
+        from app.processing import process_email_job
+
+        while not self._stop.is_set():
+            try:
+                claimed = self.job_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {e}")
+                claimed = None
+            if claimed is None:
+                self._stop.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            email_id, mailbox = claimed
+            try:
+                # Retries and dead-lettering happen inside the job
+                ran = process_email_job(email_id, mailbox)
+            except Exception as e:
+                logger.error(f"Job {email_id} failed outside its retries: {e}", exc_info=True)
+                ran = False
+            try:
+                if ran or get_coordinator().email_completed(email_id):
+                    # Dead-lettered jobs are done too: redelivered notifications
+                    # for them are ignored for DONE_RETENTION_SECONDS.
+                    # manage_dead_letters.py replay runs them outside this queue.
+                    self.job_queue.complete(email_id)
+                else:
+                    # Skipped: another worker still holds its lease (e.g. this
+                    # job was requeued from a worker that is only stalled).
+                    # Try again once that lease could have expired.
+                    logger.info(f"{email_id} is leased elsewhere; putting it back in the queue.")
+                    self.job_queue.release(email_id, settings.LEASE_TTL_SECONDS)
+            except Exception as e:
+                # Left running: requeue_orphans picks it up if this worker dies
+                logger.error(f"Could not update the queue entry of {email_id}: {e}")
+
+
+def run_job_worker() -> None:
+    """Process entry point (see app/server.py)."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [worker %(process)d] %(message)s")
+    worker = JobWorker(settings.JOB_WORKER_THREADS)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.run()
@@ -0,0 +1,63 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import math
+import os
+import statistics
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Settings has required fields with no defaults. Offline benchmarks never
+# talk to the real services, so placeholders are enough.
+OFFLINE_ENV = {
+    "CLIENT_ID": "offline-client",
+    "TENANT_ID": "offline-tenant",
+    "GRAPH_USER_IDENTIFIER": "bench@example.com",
+    "MAILBOX_UPN": "bench@example.com",
+    "WEBHOOK_NOTIFICATION_URL": "http://127.0.0.1/notifications",
+    "CLIENT_STATE_SECRET": "offline-secret",
+    "GOOGLE_API_KEY": "offline-key",
+    "HARDCODED_ACCESS_TOKEN": "offline-token",
+    "AUTH_JSON_PATH": str(REPO_ROOT / "auth.json"),
+    # Leases stay in-process instead of a shared file
+    "COORDINATION_BACKEND": "memory",
+    # Replayed copies of one email share its thread; keep them first contacts
+    "CONVERSATIONS_ENABLED": "false",
+}
+
+def configure_offline_env(**overrides: str) -> None:
+    """
+    Fills in settings for an offline run. Must be called before anything
+    under `app` is imported, since settings are read at import time.
+    Values already in the environment win over the placeholders.
+    """
+    for key, value in OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
+    for key, value in overrides.items():
+        os.environ[key] = value
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+def format_summary(label: str, values: List[float], unit: str = "ms") -> str:
+    s = summarize(values)
+    return (f"{label:<28} n={s['count']:<5} mean={s['mean']:8.1f}{unit} "
+            f"p50={s['p50']:8.1f}{unit} p95={s['p95']:8.1f}{unit} max={s['max']:8.1f}{unit}")
@@ -0,0 +1,97 @@
+"""
+Measures master-data lookups: builds a client directory of --clients
+synthetic names (or loads --csv) and times exact, fuzzy and unmatched
+resolutions, then does the same for the bundled port index.
+
+    python -m benchmarks.entity_lookup
+    python -m benchmarks.entity_lookup --clients 100000
+    python -m benchmarks.entity_lookup --csv /path/to/client_master.csv
+"""
+import argparse
+import random
+import string
+import time
+from pathlib import Path
+from typing import List
+
+from benchmarks.common import configure_offline_env, format_summary
+
+# Words real client names are full of, so queries hit long postings
+COMMON_WORDS = ["AL", "GENERAL", "TRADING", "LOGISTICS", "GULF", "INTERNATIONAL", "GROUP", "SHIPPING", "STAR"]
+SUFFIXES = ["LLC", "FZE", "FZCO", "CO LLC", "LTD", "L.L.C", ""]
+
+
+def synthetic_names(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choices(string.ascii_uppercase, k=rng.randint(4, 9))) for _ in range(count // 5 + 100)]
+    names = []
+    for _ in range(count):
+        words = rng.sample(vocab, rng.randint(1, 3)) + rng.sample(COMMON_WORDS, rng.randint(0, 2))
+        rng.shuffle(words)
+        names.append(" ".join(words + [rng.choice(SUFFIXES)]).strip())
+    return names
+
+def typo(name: str, rng: random.Random) -> str:
+    """One dropped or swapped letter and a different legal suffix."""
+    chars = list(name)
+    i = rng.randrange(1, len(chars) - 1)
+    if rng.random() < 0.5:
+        del chars[i]
+    else:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars) + " Co."
+
+def timed(fn, queries: List[str]) -> List[float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50000)
+    parser.add_argument("--csv", type=Path, default=None)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    configure_offline_env()
+    from app.parsing.clients import Client, ClientDirectory
+
+    start = time.perf_counter()
+    if args.csv:
+        directory = ClientDirectory.load(args.csv)
+    else:
+        clients = [Client(str(i), name) for i, name in enumerate(synthetic_names(args.clients, args.seed))]
+        directory = ClientDirectory(clients, {}, {})
+    directory.names.build()
+    print(f"Indexed {len(directory.names)} names in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(args.seed + 1)
+    names = [client.name for client in rng.sample(directory.clients, min(args.queries, len(directory.clients)))]
+    matched = 0
+
+    def resolve(query: str) -> None:
+        nonlocal matched
+        if directory.resolve(query) is not None:
+            matched += 1
+
+    print(format_summary("exact", timed(resolve, names)))
+    matched = 0
+    print(format_summary("fuzzy (typo + suffix)", timed(resolve, [typo(name, rng) for name in names])))
+    print(f"{'':<28} matched {matched}/{len(names)}")
+    print(format_summary("unmatched", timed(resolve, synthetic_names(len(names), args.seed + 2))))
+
+    from app.parsing.ports import get_port_directory
+
+    ports = get_port_directory()
+    port_names = [port.name for port in ports.by_code.values()]
+    print(f"\nPort index: {len(ports.names)} names")
+    print(format_summary("ports exact", timed(ports.resolve, port_names)))
+    print(format_summary("ports with country", timed(ports.resolve, [f"{name}, somewhere" for name in port_names])))
+    print(format_summary("ports typo", timed(ports.resolve, [typo(name, rng) for name in port_names if len(name) > 3])))
+
+if __name__ == "__main__":
+    main()
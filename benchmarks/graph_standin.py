@@ -0,0 +1,74 @@
+"""
+A local stand-in for the Microsoft Graph mail endpoints the jobs use,
+serving recorded fixtures (see benchmarks/replay_fixtures.py):
+
+    GET /users/<upn>/messages/<id>
+    GET /users/<upn>/messages/<id>/attachments
+
+Point the app at it with GRAPH_BASE_URL=http://127.0.0.1:<port>.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import unquote, urlsplit
+
+
+class _GraphHandler(BaseHTTPRequestHandler):
+    server: "GraphStandinServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = [unquote(p) for p in urlsplit(self.path).path.split("/") if p]
+        # users/<upn>/messages/<id>[/attachments]
+        if len(parts) < 4 or parts[0] != "users" or parts[2] != "messages":
+            self._send_json(404, {"error": {"code": "ResourceNotFound", "message": self.path}})
+            return
+        fixture = self.server.fixtures.get(parts[3])
+        if fixture is None:
+            self._send_json(404, {"error": {"code": "ErrorItemNotFound", "message": parts[3]}})
+            return
+
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+        with self.server.lock:
+            self.server.requests += 1
+        if len(parts) == 5 and parts[4] == "attachments":
+            self._send_json(200, {"value": fixture["attachments"]})
+        else:
+            self._send_json(200, dict(fixture["message"], id=parts[3]))
+
+
+class GraphStandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], fixtures: Dict[str, Dict[str, Any]], latency_ms: int = 0):
+        super().__init__(address, _GraphHandler)
+        # Message id -> fixture; several ids may share one fixture
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_graph_standin(fixtures: Dict[str, Dict[str, Any]], port: int = 0, latency_ms: int = 0) -> GraphStandinServer:
+    """Starts the stand-in on a background thread and returns it."""
+    server = GraphStandinServer(("127.0.0.1", port), fixtures, latency_ms=latency_ms)
+    threading.Thread(target=server.serve_forever, name="graph-standin", daemon=True).start()
+    return server
@@ -0,0 +1,129 @@
+"""
+Measures API cold start: how long `import app.main` takes (with the
+heaviest modules from -X importtime) and how long until `GET /` answers
+after launching uvicorn.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --compare-ref HEAD~1 --runs 5
+
+--compare-ref checks the given git revision out into a temporary worktree
+and measures it the same way, to show the before/after.
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.common import OFFLINE_ENV, REPO_ROOT
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def offline_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    for key, value in OFFLINE_ENV.items():
+        env.setdefault(key, value)
+    # Keep warm-up from launching browsers while we measure
+    env.setdefault("SUBMISSION_BACKEND", "http")
+    env.setdefault("QTC_HTTP_ENDPOINT", "http://127.0.0.1:9/items")
+    return env
+
+def measure_import(root: Path) -> Tuple[float, List[Tuple[str, float]]]:
+    """Seconds to import app.main, and the top-level packages by cumulative ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=root, env=offline_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import app.main failed in {root}:\n{result.stderr[-2000:]}")
+    packages: Dict[str, float] = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:
+            # Top-level imports of the -c statement
+            total_us += cumulative_us
+            name = module.split(".")[0]
+            packages[name] = packages.get(name, 0) + cumulative_us / 1000
+    return total_us / 1e6, sorted(packages.items(), key=lambda item: -item[1])
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_first_response(root: Path, timeout: float = 60) -> float:
+    """Seconds from launching uvicorn until GET / returns 200."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=root, env=offline_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode} in {root}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"/ did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def measure(root: Path, runs: int, label: str) -> Dict[str, float]:
+    imports = []
+    first_response = []
+    packages: List[Tuple[str, float]] = []
+    for _ in range(runs):
+        seconds, packages = measure_import(root)
+        imports.append(seconds)
+        first_response.append(measure_first_response(root))
+    result = {"import": statistics.median(imports), "first_response": statistics.median(first_response)}
+    print(f"\n[{label}] median of {runs}: import app.main={result['import'] * 1000:.0f}ms "
+          f"uvicorn start -> GET / = {result['first_response'] * 1000:.0f}ms")
+    print("  heaviest top-level imports (last run):")
+    for name, ms in packages[:8]:
+        print(f"    {name:<24} {ms:8.1f}ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--compare-ref", help="Git revision to measure as the baseline")
+    args = parser.parse_args()
+
+    current = measure(REPO_ROOT, args.runs, "working tree")
+    if not args.compare_ref:
+        return
+
+    worktree = Path(tempfile.mkdtemp(prefix="import-time-")) / "tree"
+    subprocess.run(["git", "worktree", "add", "--detach", str(worktree), args.compare_ref],
+                   cwd=REPO_ROOT, check=True, capture_output=True)
+    try:
+        baseline = measure(worktree, args.runs, args.compare_ref)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=REPO_ROOT, check=False)
+
+    print(f"\nimport app.main: {baseline['import'] * 1000:.0f}ms -> {current['import'] * 1000:.0f}ms")
+    print(f"time to first GET /: {baseline['first_response'] * 1000:.0f}ms -> {current['first_response'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
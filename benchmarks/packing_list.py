@@ -0,0 +1,68 @@
+"""
+Measures the packing-list aggregator on synthetic sheets of --rows line
+items: time to total a sheet, and how much smaller the summary Gemini
+gets is than the raw df.to_string text it replaces.
+
+    python -m benchmarks.packing_list
+    python -m benchmarks.packing_list --rows 100 1000 10000
+"""
+import argparse
+import time
+from typing import Any, List
+
+from benchmarks.common import configure_offline_env, format_summary
+
+GOODS = ["Steel pipes", "Gate valves", "Flanges", "Pump spares", "Cable drums", "Insulation panels"]
+
+
+def synthetic_sheet(rows: int, seed: int) -> Any:
+    """A packing list with a title row above the header and a TOTAL row, as exported by shippers."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "S/N": np.arange(1, rows + 1),
+        "Description of Goods": rng.choice(GOODS, rows),
+        "Pkg Type": "Pallet",
+        "No. of Packages": rng.integers(1, 6, rows),
+        "L (cm)": rng.integers(40, 240, rows),
+        "W (cm)": rng.integers(40, 120, rows),
+        "H (cm)": rng.integers(30, 160, rows),
+        "Gross Weight (kg)": rng.uniform(5, 900, rows).round(1),
+        "Net Weight (kg)": rng.uniform(5, 800, rows).round(1),
+    })
+    total = {"S/N": "TOTAL", "No. of Packages": df["No. of Packages"].sum(), "Gross Weight (kg)": df["Gross Weight (kg)"].sum()}
+    title = pd.DataFrame([list(df.columns)], columns=[f"Unnamed: {i}" for i in range(len(df.columns))])
+    body = pd.concat([df, pd.DataFrame([total])]).fillna("")
+    body.columns = title.columns
+    # Header sits in the second row, under a title, like most real exports
+    heading = pd.DataFrame([["PACKING LIST"] + [""] * (len(df.columns) - 1)], columns=title.columns)
+    return pd.concat([heading, title, body], ignore_index=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    configure_offline_env()
+    from app.parsing.packing_list import summarize_packing_list
+
+    for rows in args.rows:
+        df = synthetic_sheet(rows, args.seed)
+        samples: List[float] = []
+        summary = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            summary = summarize_packing_list(df)
+            samples.append((time.perf_counter() - start) * 1000)
+        raw_chars = len(df.to_string(index=False))
+        summary_chars = len(summary.details) + len(summary.to_text("bench")) if summary else raw_chars
+        print(format_summary(f"{rows} rows", samples))
+        print(f"{'':<28} {raw_chars:,} chars raw -> {summary_chars:,} chars summary "
+              f"({raw_chars / max(summary_chars, 1):.0f}x smaller)")
+
+if __name__ == "__main__":
+    main()
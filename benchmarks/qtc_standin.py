@@ -0,0 +1,144 @@
+"""
+A local stand-in for the QTC app.
+
+It serves a minimal HTML form that uses the same locators as
+app/services/qtc_form.py (so the Playwright backend can drive it) and the
+JSON endpoints the HTTP backend posts to:
+
+    GET  /          the form
+    POST /invoke    what the form's submit button calls
+    POST /items     the list-items endpoint for the http backend
+    GET  /records   everything received so far
+
+Run it on its own with:  python -m benchmarks.qtc_standin --port 8090
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("qtc_standin")
+
+FORM_HTML = """<!doctype html>
+<html><head><title>QTC Stand-in</title></head>
+<body>
+  <form id="qtc" onsubmit="return false;">
+    <input data-testid="client_name_field" name="client_name">
+    <div>
+      <button type="button" data-group="inquiry_type" data-value="Budgetary">Budgetary</button>
+      <button type="button" data-group="inquiry_type" data-value="Bid to win">Bid to win</button>
+    </div>
+    <div>
+      <button type="button" data-group="product" data-value="Ocean">Ocean</button>
+      <button type="button" data-group="product" data-value="Air">Air</button>
+      <button type="button" data-group="product" data-value="Road">Road</button>
+      <button type="button" data-group="product" data-value="Brokerage">Brokerage</button>
+    </div>
+    <input data-testid="incoterms_field" name="incoterms">
+    <div>
+      <button type="button" data-group="ocean_type" data-value="FCL">FCL</button>
+      <button type="button" data-group="ocean_type" data-value="LCL">LCL</button>
+      <button type="button" data-group="ocean_type" data-value="RORO">RORO</button>
+      <button type="button" data-group="ocean_type" data-value="Break Bulk">Break Bulk</button>
+    </div>
+    <input data-testid="containers_field" name="containers">
+    <input data-testid="pol_field" name="port_of_loading">
+    <input data-testid="pod_field" name="port_of_discharge">
+    <input data-testid="commodity_field" name="commodity">
+    <input data-testid="freetime_field" name="freetime_requirement">
+    <input type="checkbox" data-testid="dg_checkbox" name="dangerous_goods">
+    <button type="button" data-testid="submit_button">Submit</button>
+  </form>
+  <div data-testid="success_message" style="display:none">Saved</div>
+  <script>
+    const picked = {};
+    document.querySelectorAll("button[data-group]").forEach(b => {
+      b.addEventListener("click", () => { picked[b.dataset.group] = b.dataset.value; });
+    });
+    document.querySelector("[data-testid=submit_button]").addEventListener("click", async () => {
+      const fields = Object.assign({}, picked);
+      document.querySelectorAll("#qtc input").forEach(i => {
+        fields[i.name] = i.type === "checkbox" ? i.checked : i.value;
+      });
+      const r = await fetch("/invoke", {method: "POST", headers: {"Content-Type": "application/json"},
+                                        body: JSON.stringify({fields})});
+      if (r.ok) document.querySelector("[data-testid=success_message]").style.display = "block";
+    });
+  </script>
+</body></html>
+"""
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    server: "StandinServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Keep benchmark output readable
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/records":
+            body = json.dumps(self.server.records).encode()
+            self._send(200, body, "application/json")
+        else:
+            self._send(200, FORM_HTML.encode(), "text/html")
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+        record_id = self.server.add_record(payload.get("fields", {}))
+        self._send(201, json.dumps({"id": record_id}).encode(), "application/json")
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency_ms: int = 0):
+        super().__init__(address, _StandinHandler)
+        self.latency_ms = latency_ms
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_record(self, fields: Dict[str, Any]) -> int:
+        with self._lock:
+            self.records.append(fields)
+            return len(self.records)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_standin(port: int = 0, latency_ms: int = 0) -> StandinServer:
+    """Starts the stand-in on a background thread and returns it."""
+    server = StandinServer(("127.0.0.1", port), latency_ms=latency_ms)
+    threading.Thread(target=server.serve_forever, name="qtc-standin", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the QTC app.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=int, default=0, help="Simulated data-source latency per save")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    server = StandinServer(("127.0.0.1", args.port), latency_ms=args.latency_ms)
+    logger.info(f"QTC stand-in listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
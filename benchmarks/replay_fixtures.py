@@ -0,0 +1,217 @@
+"""
+Email fixtures for the offline replay benchmark.
+
+A fixture is one JSON file holding everything a job would fetch or
+compute remotely for one email:
+
+    {
+      "id": "<Graph message id>",
+      "message": {... Graph message resource ...},
+      "attachments": [{... Graph fileAttachment, contentBytes base64 ...}],
+      "gemini": {"response": {... extracted JSON ...}, "latency_ms": 2400}
+    }
+
+    python -m benchmarks.replay_fixtures synthesize --count 25
+    python -m benchmarks.replay_fixtures record --limit 20
+
+`record` needs a live token and GOOGLE_API_KEY; it stores the real Gemini
+answer and how long it took. Recorded mail is customer data, so the
+default directory is git-ignored.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import REPO_ROOT
+
+logger = logging.getLogger("replay_fixtures")
+
+DEFAULT_FIXTURE_DIR = REPO_ROOT / "benchmarks" / "fixtures" / "replay"
+
+PORTS = [("Shanghai", "Jebel Ali"), ("Ningbo", "Dammam"), ("Rotterdam", "Mundra"),
+         ("Singapore", "Hamad"), ("Busan", "Sohar"), ("Qingdao", "Khalifa Port")]
+COMMODITIES = ["General Cargo", "Auto Parts", "Furniture", "Steel Coils", "Textiles", "Electronics"]
+CONTAINER_TYPES = ["20GP", "40GP", "40HC"]
+
+
+def load_corpus(directory: Path) -> List[Dict[str, Any]]:
+    """All fixtures in `directory`, sorted by file name."""
+    return [json.loads(path.read_text(encoding="utf-8")) for path in sorted(directory.glob("*.json"))]
+
+def save_fixture(directory: Path, fixture: Dict[str, Any]) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    # Graph IDs are long and not filename-safe
+    path = directory / f"{hashlib.sha256(fixture['id'].encode()).hexdigest()[:16]}.json"
+    path.write_text(json.dumps(fixture, indent=1), encoding="utf-8")
+    return path
+
+def file_attachment(name: str, content_type: str, content: bytes) -> Dict[str, Any]:
+    return {
+        "@odata.type": "#microsoft.graph.fileAttachment",
+        "name": name,
+        "contentType": content_type,
+        "size": len(content),
+        "contentBytes": base64.b64encode(content).decode("ascii"),
+    }
+
+
+# --- Synthetic corpus ---
+
+def _body_html(fields: Dict[str, str]) -> str:
+    rows = "".join(f"<tr><td>{key}</td><td>{value}</td></tr>" for key, value in fields.items())
+    return f"<html><body><p>Dear team, please quote.</p><table><tr><th>Description</th><th>Values</th></tr>{rows}</table></body></html>"
+
+def _packing_list_xlsx(rng: random.Random, rows: int) -> bytes:
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        "Item": [f"SKU-{rng.randint(10000, 99999)}" for _ in range(rows)],
+        "Description": [rng.choice(COMMODITIES) for _ in range(rows)],
+        "Packages": [rng.randint(1, 40) for _ in range(rows)],
+        "Gross Weight (kg)": [round(rng.uniform(5, 900), 2) for _ in range(rows)],
+        "Volume (cbm)": [round(rng.uniform(0.01, 3), 3) for _ in range(rows)],
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        frame.to_excel(writer, sheet_name="Packing List", index=False)
+    return buffer.getvalue()
+
+def _cover_letter_docx(rng: random.Random, client: str, pol: str, pod: str) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    doc.add_paragraph(f"Request for quotation on behalf of {client}.")
+    doc.add_paragraph(f"Routing: {pol} to {pod}. Please include free time and local charges.")
+    table = doc.add_table(rows=0, cols=2)
+    for key, value in (("Incoterms", "FOB"), ("Containers", f"{rng.randint(1, 5)} x 40HC")):
+        cells = table.add_row().cells
+        cells[0].text, cells[1].text = key, value
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def synthesize_fixture(index: int, rng: random.Random) -> Dict[str, Any]:
+    client = f"BENCH TRADING {index:03d} LLC"
+    pol, pod = rng.choice(PORTS)
+    commodity = rng.choice(COMMODITIES)
+    container_type = rng.choice(CONTAINER_TYPES)
+    quantity = rng.randint(1, 6)
+    freetime = rng.choice([7, 14, 21])
+    subject = f"RFQ {index:04d} - {pol} to {pod} - {client}"
+
+    attachments = []
+    # Mix of small and large packing lists so parser cost varies like real mail
+    if rng.random() < 0.8:
+        rows = rng.choice([20, 150, 600, 2500])
+        attachments.append(file_attachment(
+            f"packing_list_{index}.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            _packing_list_xlsx(rng, rows),
+        ))
+    if rng.random() < 0.4:
+        attachments.append(file_attachment(
+            f"cover_letter_{index}.docx",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            _cover_letter_docx(rng, client, pol, pod),
+        ))
+
+    message_id = f"BENCH-{index:06d}"
+    return {
+        "id": message_id,
+        "message": {
+            "id": message_id,
+            "conversationId": f"BENCH-CONV-{index:06d}",
+            "subject": subject,
+            "receivedDateTime": "2025-01-01T08:00:00Z",
+            "hasAttachments": bool(attachments),
+            "from": {"emailAddress": {"name": "Bench Shipper", "address": f"shipper{index}@example.com"}},
+            "toRecipients": [{"emailAddress": {"name": "Quotes", "address": "quotes@example.com"}}],
+            "ccRecipients": [],
+            "body": {"contentType": "html", "content": _body_html({
+                "Customer": client, "POL": pol, "POD": pod, "Commodity": commodity,
+                "Equipment": f"{quantity} x {container_type}", "Free time": f"{freetime} days",
+            })},
+        },
+        "attachments": attachments,
+        "gemini": {
+            "latency_ms": rng.randint(1500, 6000),
+            "response": {
+                "inquiry_type": "Bid to win",
+                "client_name": client,
+                "product": "Ocean",
+                "incoterms": "FOB",
+                "ocean_type": "FCL",
+                "containers": [{"container_type": container_type, "quantity": quantity}],
+                "port_of_loading": pol,
+                "port_of_discharge": pod,
+                "commodity": commodity,
+                "freetime_requirement": freetime,
+                "dangerous_goods": False,
+            },
+        },
+    }
+
+def synthesize_corpus(directory: Path, count: int, seed: int = 7) -> int:
+    """Writes `count` synthetic fixtures (deterministic for a given seed)."""
+    rng = random.Random(seed)
+    for index in range(count):
+        save_fixture(directory, synthesize_fixture(index, rng))
+    return count
+
+
+# --- Recording from a live mailbox ---
+
+def record_corpus(directory: Path, limit: int) -> int:
+    """Records the most recent `limit` emails, their attachments and Gemini's answers."""
+    from app.processing import EmailJob, extract_attachments, parse_email
+    from app.services.gemini import extract_single
+    from app.services.graph_api import get_graph_service_sync
+
+    graph_service = get_graph_service_sync()
+    recorded = 0
+    for message in graph_service.get_recent_emails(limit=limit):
+        attachments = graph_service.get_attachments(message["id"])
+        fixture = {
+            "id": message["id"],
+            "message": message,
+            "attachments": [
+                file_attachment(att["name"], att["content_type"], att["content_bytes"]) for att in attachments
+            ],
+        }
+        job = EmailJob(email_id=message["id"], email_data=message, attachments=attachments)
+        parse_email(job)
+        extract_attachments(job)
+        start = time.perf_counter()
+        try:
+            response = extract_single(job.full_context)
+        except Exception as e:
+            logger.warning(f"Skipping {message['id']}: Gemini failed ({e})")
+            continue
+        fixture["gemini"] = {"response": response, "latency_ms": round((time.perf_counter() - start) * 1000)}
+        logger.info(f"Recorded {message.get('subject')!r} -> {save_fixture(directory, fixture).name}")
+        recorded += 1
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create fixtures for the replay benchmark.")
+    parser.add_argument("command", choices=["synthesize", "record"])
+    parser.add_argument("--dir", type=Path, default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument("--count", type=int, default=25, help="synthesize: number of emails")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=20, help="record: most recent N emails")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if args.command == "synthesize":
+        written = synthesize_corpus(args.dir, args.count, args.seed)
+    else:
+        written = record_corpus(args.dir, args.limit)
+    logger.info(f"Wrote {written} fixture(s) to {args.dir}")
@@ -0,0 +1,212 @@
+"""
+Replays a corpus of recorded emails through `process_email_job` with
+everything remote replaced by local stand-ins:
+
+    Graph    benchmarks/graph_standin.py serving the fixtures
+    Gemini   the recorded answer, returned after the recorded latency
+    QTC      benchmarks/qtc_standin.py via the http submission backend
+
+Reports throughput, per-stage p50/p95 (from the job traces) and peak RSS.
+
+    python -m benchmarks.replay_pipeline --concurrency 8 --repeat 4
+    python -m benchmarks.replay_pipeline --llm-latency-scale 0 --save baseline.json
+    python -m benchmarks.replay_pipeline --llm-latency-scale 0 --baseline baseline.json
+    python -m benchmarks.replay_pipeline --concurrency 16 --no-llm-batching
+
+The run exits non-zero if any email was not submitted, and with --baseline
+also if any p95 regressed by more than --tolerance, so it can gate a deploy.
+"""
+import argparse
+import copy
+import json
+import logging
+import re
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import configure_offline_env, format_summary, summarize
+from benchmarks.graph_standin import start_graph_standin
+from benchmarks.qtc_standin import start_standin
+from benchmarks.replay_fixtures import DEFAULT_FIXTURE_DIR, load_corpus, synthesize_corpus
+
+logger = logging.getLogger("bench_replay")
+
+# Span names reported besides the stage.* spans
+REPORTED_SPANS = ("graph.request", "parse.attachment", "gemini.generate", "submit.backend")
+
+_SUBJECT = re.compile(r"Email Subject: (.*)")
+_DOCUMENT = re.compile(r'<DOCUMENT id="([^"]+)">(.*?)</DOCUMENT>', re.DOTALL)
+
+
+class ReplayGeminiService:
+    """Drop-in for GeminiService that answers from the fixtures."""
+    responses: Dict[str, Dict[str, Any]] = {}
+    latency_scale = 1.0
+
+    def __init__(self, api_key: str):
+        pass
+
+    def get_structured_json(self, prompt: str) -> Any:
+        documents = _DOCUMENT.findall(prompt)
+        if not documents:
+            recorded = self.recorded(prompt)
+            time.sleep(recorded["latency_ms"] / 1000 * self.latency_scale)
+            return copy.deepcopy(recorded["response"])
+        # A batch takes as long as its slowest email did alone
+        answers = [(doc_id, self.recorded(text)) for doc_id, text in documents]
+        time.sleep(max(recorded["latency_ms"] for _, recorded in answers) / 1000 * self.latency_scale)
+        return [dict(copy.deepcopy(recorded["response"]), document_id=doc_id) for doc_id, recorded in answers]
+
+    def recorded(self, text: str) -> Dict[str, Any]:
+        match = _SUBJECT.search(text)
+        recorded = self.responses.get(match.group(1).strip() if match else "")
+        if recorded is None:
+            raise ValueError("No recorded Gemini response for this prompt")
+        return recorded
+
+
+def load_fixtures(directory: Path, synthesize: int) -> List[Dict[str, Any]]:
+    corpus = load_corpus(directory) if directory.exists() else []
+    if not corpus:
+        print(f"No fixtures in {directory}; synthesizing {synthesize} emails.")
+        generated = Path(tempfile.mkdtemp(prefix="replay-fixtures-"))
+        synthesize_corpus(generated, synthesize)
+        corpus = load_corpus(generated)
+    return corpus
+
+def expand(corpus: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Job id -> fixture, with each fixture replayed `repeat` times under distinct ids."""
+    return {
+        fixture["id"] if n == 0 else f"{fixture['id']}-r{n}": fixture
+        for n in range(repeat)
+        for fixture in corpus
+    }
+
+def span_durations(trace_path: Path) -> Dict[str, List[float]]:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    if not trace_path.exists():
+        return durations
+    for line in trace_path.read_text(encoding="utf-8").splitlines():
+        trace = json.loads(line)
+        durations["job"].append(trace["duration_ms"])
+        for span in trace["spans"]:
+            if span["name"].startswith("stage.") or span["name"] in REPORTED_SPANS:
+                durations[span["name"]].append(span["duration_ms"])
+    return durations
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["spans"].items():
+        before = baseline.get("spans", {}).get(name)
+        if before and before["p95"] > 0 and current["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95']:.1f}ms -> {current['p95']:.1f}ms")
+    if results["throughput_per_s"] < baseline.get("throughput_per_s", 0) * (1 - tolerance):
+        regressions.append(f"throughput: {baseline['throughput_per_s']:.2f}/s -> {results['throughput_per_s']:.2f}/s")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument("--synthesize", type=int, default=25, help="Emails to synthesize if --fixtures is empty")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs run at once")
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0,
+                        help="Multiplier for recorded Gemini latency (0 measures only our code)")
+    parser.add_argument("--no-llm-batching", action="store_true",
+                        help="Send every extraction on its own (LLM_BATCHING_ENABLED=false)")
+    parser.add_argument("--graph-latency-ms", type=int, default=0)
+    parser.add_argument("--qtc-latency-ms", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Fail on regressions against saved results")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    corpus = load_fixtures(args.fixtures, args.synthesize)
+    jobs = expand(corpus, args.repeat)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="replay-run-"))
+    graph = start_graph_standin(jobs, latency_ms=args.graph_latency_ms)
+    qtc = start_standin(latency_ms=args.qtc_latency_ms)
+    configure_offline_env(
+        GRAPH_BASE_URL=graph.base_url,
+        SUBMISSION_BACKEND="http",
+        QTC_HTTP_ENDPOINT=f"{qtc.base_url}/items",
+        QTC_HTTP_AUTH="none",
+        CHECKPOINTS_ENABLED="false",
+        DEAD_LETTER_DIR=str(work_dir / "dead_letters"),
+        # A failure should show up in the numbers, not be retried with backoff
+        JOB_MAX_ATTEMPTS="1",
+        TRACING_ENABLED="true",
+        TRACE_EXPORT_PATH=str(work_dir / "traces.jsonl"),
+        TRACE_PROFILE_SAMPLE_RATE="0",
+        LLM_BATCHING_ENABLED=str(not args.no_llm_batching).lower(),
+    )
+
+    from app.core.checkpoints import dead_letter_store
+    from app.core.config import settings
+    from app.processing import process_email_job
+    from app.services import gemini
+
+    ReplayGeminiService.responses = {f["message"]["subject"]: f["gemini"] for f in corpus if "gemini" in f}
+    ReplayGeminiService.latency_scale = args.llm_latency_scale
+    gemini.GeminiService = ReplayGeminiService
+
+    print(f"Replaying {len(jobs)} emails ({len(corpus)} fixtures x{args.repeat}) with concurrency {args.concurrency}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(process_email_job, jobs))
+    wall = time.perf_counter() - start
+
+    durations = span_durations(settings.TRACE_EXPORT_PATH)
+    # ru_maxrss is KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results = {
+        "jobs": len(jobs),
+        "concurrency": args.concurrency,
+        "llm_latency_scale": args.llm_latency_scale,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_s": len(jobs) / wall,
+        "submitted": len(qtc.records),
+        "dead_lettered": len(dead_letter_store.list()),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "spans": {name: summarize(values) for name, values in sorted(durations.items())},
+    }
+
+    for name, values in sorted(durations.items()):
+        print(format_summary(name, values))
+    print(f"\nthroughput={results['throughput_per_s']:.2f} jobs/s wall={wall:.1f}s "
+          f"submitted={results['submitted']}/{len(jobs)} dead_lettered={results['dead_lettered']} "
+          f"peak_rss={peak_rss_mb:.0f}MB graph_requests={graph.requests}")
+    print(f"Traces: {settings.TRACE_EXPORT_PATH}")
+
+    graph.shutdown()
+    qtc.shutdown()
+
+    if results["submitted"] < len(jobs):
+        # Throughput of a run that dropped emails means nothing
+        print(f"\nFAILED: {len(jobs) - results['submitted']} of {len(jobs)} email(s) were not submitted "
+              f"({results['dead_lettered']} dead-lettered, see {settings.DEAD_LETTER_DIR}).")
+        sys.exit(1)
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results saved to {args.save}")
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS (tolerance {:.0%}):".format(args.tolerance))
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
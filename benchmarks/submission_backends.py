@@ -0,0 +1,87 @@
+"""
+Compares the Playwright and direct-HTTP submission backends against the
+local QTC stand-in.
+
+    python -m benchmarks.submission_backends --records 20
+    python -m benchmarks.submission_backends --backends http --latency-ms 50
+"""
+import argparse
+import logging
+import time
+from typing import Any, List
+
+from benchmarks.common import configure_offline_env, format_summary
+from benchmarks.qtc_standin import start_standin
+
+logger = logging.getLogger("bench_submission")
+
+
+def sample_records(count: int) -> List[Any]:
+    from app.models.qtc_models import QTCContainer, QTCFormData
+
+    return [
+        QTCFormData(
+            client_name=f"BENCH CLIENT {i} LLC",
+            product="Ocean",
+            incoterms="FOB",
+            ocean_type="FCL",
+            containers=[QTCContainer(container_type="40HC", quantity=1 + i % 3)],
+            port_of_loading="Shanghai",
+            port_of_discharge="Jebel Ali",
+            commodity="General Cargo",
+            freetime_requirement=14,
+        )
+        for i in range(count)
+    ]
+
+def run_backend(name: str, records: List[Any]) -> None:
+    from app.core.config import settings
+    from app.services import submission
+
+    settings.SUBMISSION_BACKEND = name
+    submission.shutdown_submission_backend()
+    backend = submission.get_submission_backend()
+
+    start = time.perf_counter()
+    backend.start()
+    warmup_ms = (time.perf_counter() - start) * 1000
+
+    timings: List[float] = []
+    failures = 0
+    start = time.perf_counter()
+    for record in records:
+        result = backend.submit(record)
+        timings.append(result.elapsed_ms)
+        failures += 0 if result.ok else 1
+    wall = time.perf_counter() - start
+    submission.shutdown_submission_backend()
+
+    print(format_summary(f"{name} per submission", timings))
+    print(f"{'':<28} warm-up={warmup_ms:.0f}ms throughput={len(records) / wall:.2f}/s failures={failures}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=0, help="Simulated data-source latency per save")
+    parser.add_argument("--backends", nargs="+", default=["http", "playwright"], choices=["http", "playwright"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    server = start_standin(latency_ms=args.latency_ms)
+    configure_offline_env(
+        QTC_APP_URL=f"{server.base_url}/",
+        QTC_HTTP_ENDPOINT=f"{server.base_url}/items",
+        QTC_HTTP_AUTH="none",
+    )
+
+    records = sample_records(args.records)
+    print(f"Submitting {len(records)} records per backend to {server.base_url}")
+    for name in args.backends:
+        run_backend(name, records)
+    print(f"Stand-in received {len(server.records)} records.")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Fires bursts of batched Graph change notifications at /notifications and
+reports sustained requests per second and latency percentiles.
+
+By default the app runs in-process with job dispatch replaced by a
+counter, so only the ingest path is measured. Use --url to hit a running
+deployment instead (its jobs will run, against whatever Graph it points at).
+
+    python -m benchmarks.webhook_burst --bursts 20 --burst-size 200 --batch 10
+    python -m benchmarks.webhook_burst --url http://127.0.0.1:8000/notifications
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import OFFLINE_ENV, configure_offline_env, format_summary, summarize
+
+logger = logging.getLogger("bench_webhook")
+
+
+def notification_body(batch: int, client_state: str) -> bytes:
+    """One POST body with `batch` message notifications, shaped like Graph's."""
+    value = []
+    for _ in range(batch):
+        message_id = f"AAMkBENCH{uuid.uuid4().hex}="
+        value.append({
+            "subscriptionId": "bench-subscription",
+            "subscriptionExpirationDateTime": "2030-01-01T00:00:00Z",
+            "changeType": "created",
+            "resource": f"Users/bench-user/Messages/{message_id}",
+            "resourceData": {
+                "@odata.type": "#Microsoft.Graph.Message",
+                "@odata.id": f"Users/bench-user/Messages/{message_id}",
+                "id": message_id,
+            },
+            "clientState": client_state,
+            "tenantId": "bench-tenant",
+        })
+    return json.dumps({"value": value}).encode()
+
+
+def start_local_app() -> Tuple[str, Any, List[int]]:
+    """Runs the app under uvicorn on a free port with job dispatch stubbed out."""
+    # The http backend has nothing to warm up, so startup stays quick
+    configure_offline_env(JOB_DISPATCH="inline", SUBMISSION_BACKEND="http", QTC_HTTP_ENDPOINT="http://127.0.0.1:9/items")
+    import uvicorn
+    import app.main as main
+
+    dispatched: List[int] = [0]
+    lock = threading.Lock()
+
+    def count_job(email_id: str, mailbox: Optional[str] = None) -> None:
+        with lock:
+            dispatched[0] += 1
+
+    main.process_email_job = count_job
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/notifications", server, dispatched
+
+
+async def fire(client: httpx.AsyncClient, url: str, body: bytes, latencies: List[float], statuses: "Counter[Any]") -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+        statuses[response.status_code] += 1
+    except httpx.HTTPError as e:
+        statuses[type(e).__name__] += 1
+    latencies.append((time.perf_counter() - start) * 1000)
+
+async def run_bursts(url: str, bursts: int, burst_size: int, batch: int, interval: float,
+                     concurrency: int, client_state: str) -> Tuple[List[float], "Counter[Any]", float]:
+    latencies: List[float] = []
+    statuses: "Counter[Any]" = Counter()
+    # Bodies are built up front so the client's own work stays out of the timings
+    bodies = [notification_body(batch, client_state) for _ in range(burst_size)]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        for index in range(bursts):
+            burst_start = time.perf_counter()
+            await asyncio.gather(*(fire(client, url, body, latencies, statuses) for body in bodies))
+            if index < bursts - 1:
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - burst_start)))
+        wall = time.perf_counter() - start
+    return latencies, statuses, wall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target /notifications URL (default: in-process app)")
+    parser.add_argument("--client-state", help="clientState to send (default: the offline placeholder)")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=200, help="Requests per burst, sent at once")
+    parser.add_argument("--batch", type=int, default=10, help="Notifications per request")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds from one burst start to the next (0 = back to back, for peak rps)")
+    parser.add_argument("--concurrency", type=int, default=100, help="Max open connections")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    server = None
+    dispatched: Optional[List[int]] = None
+    url = args.url
+    if url is None:
+        url, server, dispatched = start_local_app()
+    client_state = args.client_state or OFFLINE_ENV["CLIENT_STATE_SECRET"]
+
+    total = args.bursts * args.burst_size
+    print(f"Sending {args.bursts} bursts x {args.burst_size} requests x {args.batch} notifications to {url}")
+    latencies, statuses, wall = asyncio.run(run_bursts(
+        url, args.bursts, args.burst_size, args.batch, args.interval, args.concurrency, client_state,
+    ))
+
+    stats = summarize(latencies)
+    print(format_summary("request latency", latencies))
+    print(f"{'':<28} p99={stats['p99']:.1f}ms")
+    print(f"sustained={total / wall:.0f} req/s ({total * args.batch / wall:.0f} notifications/s) "
+          f"wall={wall:.1f}s statuses={dict(statuses)}")
+    if dispatched is not None:
+        print(f"jobs dispatched={dispatched[0]} (expected {total * args.batch})")
+    if server is not None:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("cert_generator")
+
+def generate_certificate(days: int) -> None:
+    """
+    Writes a self-signed RSA certificate and its private key to
+    NOTIFICATION_CERT_PATH / NOTIFICATION_KEY_PATH. Graph encrypts rich
+    notifications with the certificate; only the key can read them.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, settings.NOTIFICATION_CERT_ID)])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=days))
+        .sign(key, hashes.SHA256())
+    )
+
+    settings.NOTIFICATION_KEY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    settings.NOTIFICATION_KEY_PATH.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    settings.NOTIFICATION_KEY_PATH.chmod(0o600)
+    settings.NOTIFICATION_CERT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    settings.NOTIFICATION_CERT_PATH.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    logger.info(f"Wrote {settings.NOTIFICATION_CERT_PATH} and {settings.NOTIFICATION_KEY_PATH} (valid {days} days).")
+    logger.info("Set RICH_NOTIFICATIONS_ENABLED=true and run 'python manage_subscription.py recreate'.")
+
+def print_fixture(message_path: str, mailbox: str) -> None:
+    """
+    Prints a rich notification, as Graph would POST it, for the message
+    JSON in `message_path` (e.g. a saved GET /messages/{id} response).
+    """
+    from app.core.notification_crypto import encrypt_resource
+
+    with open(message_path, "r", encoding="utf-8") as f:
+        message = json.load(f)
+    email_id = message.get("id", "fixture-message-id")
+    notification = {
+        "subscriptionId": "fixture-subscription",
+        "clientState": settings.CLIENT_STATE_SECRET,
+        "changeType": "created",
+        "resource": f"Users/{mailbox}/Messages/{email_id}",
+        "resourceData": {"@odata.type": "#Microsoft.Graph.Message", "id": email_id},
+        "encryptedContent": encrypt_resource(
+            settings.NOTIFICATION_CERT_PATH.read_bytes(), settings.NOTIFICATION_CERT_ID, message
+        ),
+    }
+    json.dump({"value": [notification]}, sys.stdout, indent=2)
+    print()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Certificate for Graph rich notifications.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cert = commands.add_parser("cert", help="generate the certificate and private key")
+    cert.add_argument("--days", type=int, default=365)
+    fixture = commands.add_parser("fixture", help="print an encrypted notification for a message JSON file")
+    fixture.add_argument("message")
+    fixture.add_argument("--mailbox", default=settings.MAILBOX_UPN)
+    args = parser.parse_args()
+
+    if args.command == "cert":
+        generate_certificate(args.days)
+    else:
+        # e.g. ... fixture message.json | curl -X POST --data-binary @- "http://localhost:8000/notifications"
+        print_fixture(args.message, args.mailbox)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import asyncio
 import sys
 import logging
+from app.core.config import settings
 from app.services import graph_auth
 
 # Configure basic logging
@@ -15,6 +16,9 @@ async def main():
     logger.info("Starting one-time auth flow...")
     
     scopes = ['User.Read', 'Mail.Read', 'Mail.Send', 'Mail.ReadWrite']
+    if settings.SUBMISSION_BACKEND == "http" and settings.QTC_HTTP_AUTH == "graph":
+        # The http submission backend writes the QTC list with its own scopes
+        scopes += settings.QTC_HTTP_SCOPES
     
     try:
         await graph_auth.get_delegated_access_token(scopes=scopes)
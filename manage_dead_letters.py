@@ -0,0 +1,96 @@
+import sys
+import logging
+
+from app.core.checkpoints import checkpoint_store, dead_letter_store
+from app.core.coordination import get_coordinator, shutdown_coordinator
+from app.processing import process_email_job
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("dead_letters")
+
+USAGE = "\nUsage: python manage_dead_letters.py [list|show <email_id>|replay <email_id|all>|purge <email_id|all>]"
+
+def replay(email_id: str) -> None:
+    """
+    Runs the email again, resuming from its last checkpoint. The job left
+    its lease completed when it was dead-lettered (and, under app.server,
+    its job-queue row done), so redelivered notifications skip it for 7
+    days; replay reopens the lease and runs the job here, not via the queue.
+    """
+    record = dead_letter_store.get(email_id) or {}
+    get_coordinator().reopen_email(email_id)
+    dead_letter_store.remove(email_id)
+    logger.info(f"Replaying {email_id}...")
+    if not process_email_job(email_id, record.get("mailbox")):
+        # Another process holds the lease and is running it right now
+        dead_letter_store.add(
+            email_id, record.get("stage", "replay"), record.get("error", ""), record.get("attempts", 0), record.get("mailbox")
+        )
+        logger.error(f"Replay of {email_id} skipped: another process is running it. The dead letter is kept.")
+    elif dead_letter_store.get(email_id):
+        logger.error(f"Replay of {email_id} failed again; it is back in the dead-letter store.")
+    else:
+        logger.info(f"Replay of {email_id} succeeded.")
+
+def purge(email_id: str) -> None:
+    dead_letter_store.remove(email_id)
+    checkpoint_store.clear(email_id)
+    logger.info(f"Purged {email_id} (dead letter and checkpoint).")
+
+def manage_dead_letters() -> None:
+    """
+    CLI for inspecting and replaying emails that exhausted their retries.
+    """
+    if len(sys.argv) < 2:
+        print(USAGE)
+        return
+
+    command = sys.argv[1].lower()
+    target = sys.argv[2] if len(sys.argv) > 2 else None
+    records = dead_letter_store.list()
+
+    if command == "list":
+        if not records:
+            logger.info("Dead-letter store is empty.")
+            return
+        for record in records:
+            print(f"- ID: {record['email_id']}  Mailbox: {record.get('mailbox') or 'default'}")
+            print(f"  Stage: {record['stage']}  Attempts: {record['attempts']}  Failed: {record['failed_at']}")
+            print(f"  Error: {record['error']}")
+        return
+
+    if not target:
+        print(USAGE)
+        return
+
+    if command == "show":
+        record = dead_letter_store.get(target)
+        if not record:
+            logger.warning(f"No dead letter for {target}.")
+            return
+        print(record)
+        stages = checkpoint_store.load(target)
+        print(f"  Checkpointed stages: {', '.join(stages) or 'none'}")
+        return
+
+    if command in ("replay", "purge"):
+        action = replay if command == "replay" else purge
+        email_ids = [r["email_id"] for r in records] if target == "all" else [target]
+        if command == "replay":
+            # Keep the leases of long replays alive; never stand for leader
+            get_coordinator().start(lead=False)
+        try:
+            for email_id in email_ids:
+                try:
+                    action(email_id)
+                except Exception as e:
+                    logger.error(f"Failed to {command} {email_id}: {e}", exc_info=True)
+        finally:
+            shutdown_coordinator()
+        return
+
+    logger.warning(f"Unknown command: {command}")
+
+if __name__ == "__main__":
+    manage_dead_letters()
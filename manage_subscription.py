@@ -1,15 +1,38 @@
 import sys
 import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
 # --- UPDATED IMPORT ---
-from app.services.graph_api import get_graph_service_async
+from app.services.graph_api import GraphApiService, get_graph_service_async, notification_url
 from app.core.config import settings
+from app.subscriptions import keep_all_alive, seconds_left
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("sub_manager")
 
+# Graph calls are blocking; each runs in a thread so they overlap
+
+async def create_mailbox_subscription(service: GraphApiService, mailbox: str) -> None:
+    try:
+        logger.info(f"Creating new subscription for {mailbox} -> {notification_url(mailbox)}...")
+        new_sub = await asyncio.to_thread(GraphApiService(service.session, mailbox).create_subscription)
+        logger.info(f"Successfully created subscription for {mailbox}:")
+        print(f"  ID: {new_sub['id']}")
+        print(f"  Expires: {new_sub['expirationDateTime']}")
+    except Exception as e:
+        logger.error(f"Error creating subscription for {mailbox}: {e}", exc_info=True)
+
+async def delete_subscription(service: GraphApiService, sub: Dict[str, Any]) -> None:
+    try:
+        await asyncio.to_thread(service.delete_subscription, sub['id'])
+        logger.info(f"Deleted: {sub['id']}")
+    except Exception as e:
+        logger.error(f"Failed to delete {sub['id']}: {e}", exc_info=True)
+
+async def delete_all(service: GraphApiService, subs: List[Dict[str, Any]]) -> None:
+    await asyncio.gather(*(delete_subscription(service, sub) for sub in subs))
+
 async def manage_subscription():
     """
     CLI for managing Graph API webhook subscriptions.
@@ -25,15 +48,23 @@ async def manage_subscription():
         return
 
     if len(sys.argv) < 2:
-        print("\nUsage: python manage_subscription.py [create|list|delete|recreate]")
+        print("\nUsage: python manage_subscription.py [create|list|delete|recreate|renew]")
         return
 
     command = sys.argv[1].lower()
 
-    # ... (Rest of the file is identical) ...
+    if command == "renew":
+        # What the leader's renewal daemon does, once: PATCH near-expiry
+        # subscriptions and create missing ones
+        kept = await asyncio.to_thread(keep_all_alive, service)
+        for mailbox, sub in kept.items():
+            print(f"- {mailbox}: {sub['id']} expires {sub['expirationDateTime']} "
+                  f"({seconds_left(sub) / 3600:.1f}h left)")
+        return
+
     try:
         logger.info("Fetching existing subscriptions...")
-        existing = service.list_subscriptions()
+        existing = await asyncio.to_thread(service.list_subscriptions)
     except Exception as e:
         logger.error(f"Error fetching subscriptions: {e}", exc_info=True)
         return
@@ -46,7 +77,7 @@ async def manage_subscription():
         for sub in existing:
             print(f"- ID: {sub['id']}")
             print(f"  Resource: {sub['resource']}")
-            print(f"  Expires: {sub['expirationDateTime']}")
+            print(f"  Expires: {sub['expirationDateTime']} ({seconds_left(sub) / 3600:.1f}h left)")
             print(f"  URL: {sub.get('notificationUrl')}")
             print(f"  State: {sub.get('clientState')}")
         return
@@ -56,59 +87,40 @@ async def manage_subscription():
             logger.info("No active subscriptions to delete.")
             return
         logger.info("Deleting all active subscriptions...")
-        for sub in existing:
-            try:
-                service.delete_subscription(sub['id'])
-                logger.info(f"Deleted: {sub['id']}")
-            except Exception as e:
-                logger.error(f"Failed to delete {sub['id']}: {e}", exc_info=True)
+        await delete_all(service, existing)
         return
 
     if command == "create":
-        for sub in existing:
-            if sub.get('notificationUrl') == settings.WEBHOOK_NOTIFICATION_URL:
-                logger.warning("Subscription with this Notification URL already exists.")
+        # One subscription per mailbox, told apart by their notification URLs
+        existing_urls = {sub.get('notificationUrl'): sub for sub in existing}
+        missing = []
+        for mailbox in settings.mailboxes:
+            sub = existing_urls.get(notification_url(mailbox))
+            if sub:
+                logger.warning(f"Subscription for {mailbox} already exists.")
                 logger.warning("Run 'python manage_subscription.py recreate' to delete and re-add.")
                 print(f"  ID: {sub['id']}")
                 print(f"  Expires: {sub['expirationDateTime']}")
-                return
-        try:
-            logger.info(f"Creating new subscription for {settings.WEBHOOK_NOTIFICATION_URL}...")
-            new_sub = service.create_subscription()
-            logger.info("Successfully created subscription:")
-            print(f"  ID: {new_sub['id']}")
-            print(f"  Expires: {new_sub['expirationDateTime']}")
-        except Exception as e:
-            logger.error(f"Error creating subscription: {e}", exc_info=True)
+                continue
+            missing.append(mailbox)
+        await asyncio.gather(*(create_mailbox_subscription(service, mailbox) for mailbox in missing))
         return
 
     if command == "recreate":
+        # Prefer 'renew': recreating leaves a gap where notifications are lost
         logger.info("Recreating subscription...")
         if existing:
             logger.info("Deleting existing subscriptions...")
-            for sub in existing:
-                try:
-                    service.delete_subscription(sub['id'])
-                    logger.info(f"Deleted: {sub['id']}")
-                except Exception as e:
-                    logger.error(f"Failed to delete {sub['id']}: {e}", exc_info=True)
-        
-        try:
-            logger.info(f"Creating new subscription for {settings.WEBHOOK_NOTIFICATION_URL}...")
-            new_sub = service.create_subscription()
-            logger.info("Successfully created new subscription:")
-            print(f"  ID: {new_sub['id']}")
-            print(f"  Expires: {new_sub['expirationDateTime']}")
-        except Exception as e:
-            logger.error(f"Error creating subscription: {e}", exc_info=True)
+            await delete_all(service, existing)
+        await asyncio.gather(*(create_mailbox_subscription(service, mailbox) for mailbox in settings.mailboxes))
         return
-    
+
     logger.warning(f"Unknown command: {command}")
 
 if __name__ == "__main__":
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    
+
     asyncio.run(manage_subscription())
-    
-# docker exec 1855932c0710 python manage_subscription.py list
\ No newline at end of file
+
+# docker exec 1855932c0710 python manage_subscription.py list
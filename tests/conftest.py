@@ -0,0 +1,22 @@
+"""
+Settings are read when `app` is first imported, so the offline placeholders
+(and scratch directories for everything the jobs write) go in first.
+"""
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import configure_offline_env
+
+_scratch = Path(tempfile.mkdtemp(prefix="qtc-tests-"))
+
+configure_offline_env(
+    CHECKPOINTS_ENABLED="false",
+    CHECKPOINT_DIR=str(_scratch / "checkpoints"),
+    DEAD_LETTER_DIR=str(_scratch / "dead_letters"),
+    JOB_MAX_ATTEMPTS="1",
+    TRACING_ENABLED="true",
+    TRACE_EXPORT_PATH=str(_scratch / "traces.jsonl"),
+    TRACE_PROFILE_SAMPLE_RATE="0",
+    LLM_BATCHING_ENABLED="false",
+    PROFILE_DIR=str(_scratch / "profiles"),
+)
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.jobqueue import JobQueue
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite3")
+
+
+def test_claims_follow_priority_then_deadline(job_queue):
+    now = time.time()
+    job_queue.enqueue("low", "a@example.com", priority=-3, deadline=now + 14400)
+    job_queue.enqueue("normal", "a@example.com", priority=0, deadline=now + 1800)
+    job_queue.enqueue("high", "b@example.com", priority=3, deadline=now + 600)
+    # Low priority, but about to miss its deadline
+    job_queue.enqueue("due", "a@example.com", priority=-3, deadline=now + 60)
+
+    claimed = [job_queue.claim("worker")[0] for _ in range(4)]
+
+    assert claimed == ["due", "high", "normal", "low"]
+
+def test_equal_priorities_go_to_the_idle_mailbox(job_queue):
+    job_queue.enqueue("a-1", "a@example.com")
+    job_queue.enqueue("a-2", "a@example.com")
+    job_queue.enqueue("b-1", "b@example.com")
+
+    claimed = [job_queue.claim("worker")[0] for _ in range(3)]
+
+    assert claimed == ["a-1", "b-1", "a-2"]
+
+def test_depth_is_published(job_queue):
+    job_queue.enqueue("a-1", "a@example.com")
+    job_queue.enqueue("a-2", "a@example.com")
+    job_queue.claim("worker")
+
+    assert REGISTRY.get_sample_value("qtc_job_queue_depth", {"status": "pending"}) == 1
+    assert REGISTRY.get_sample_value("qtc_job_queue_depth", {"status": "running"}) == 1
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from app.parsing.packing_list import summarize_packing_list
+from benchmarks.packing_list import synthetic_sheet
+
+
+def rate_request_sheet() -> pd.DataFrame:
+    """A rate request laid out like a packing list: a title row, then POL/POD/container lines."""
+    columns = ["Rate request"] + [f"Unnamed: {i}" for i in range(1, 5)]
+    rows = [
+        ["Shipper: ACME LLC; POL: Jebel Ali; POD: Nhava Sheva", "", "", "", ""],
+        ["POL", "POD", "Container size", "Qty", "Weight (kg)"],
+    ]
+    rows += [["Jebel Ali", "Nhava Sheva", "40HC" if i % 2 else "20GP", 2, 20000] for i in range(12)]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_container_size_is_not_read_as_dimensions():
+    summary = summarize_packing_list(rate_request_sheet())
+
+    assert summary is not None
+    assert "dimensions" not in summary.columns
+    assert summary.packages == 24
+    assert summary.gross_weight_kg == 240000
+
+def test_text_columns_and_title_rows_are_kept():
+    summary = summarize_packing_list(rate_request_sheet())
+
+    assert "Shipper: ACME LLC; POL: Jebel Ali; POD: Nhava Sheva" in summary.details
+    for text in ("Jebel Ali", "Nhava Sheva", "20GP", "40HC"):
+        assert text in summary.details
+    # Distinct rows only: two container types, not twelve lines
+    assert summary.details.count("Nhava Sheva") == 3
+
+def test_packing_list_is_totalled():
+    summary = summarize_packing_list(synthetic_sheet(50, seed=7))
+
+    assert summary is not None
+    assert summary.line_items == 50
+    assert "length" in summary.columns
+    assert "Description of Goods" in summary.details
@@ -0,0 +1,26 @@
+import pytest
+
+from app.parsing.ports import get_port_directory
+
+
+@pytest.fixture(scope="module")
+def ports():
+    return get_port_directory()
+
+
+@pytest.mark.parametrize("text, locode", [
+    ("Jebel Ali", "AEJEA"),
+    ("Port of Jebel Ali", "AEJEA"),
+    ("Jebel Ali (JAFZA)", "AEJEA"),
+    ("Manzanillo, Mexico", "MXZLO"),
+    ("Manzanillo (Panama)", "PAMIT"),
+])
+def test_resolves(ports, text, locode):
+    assert ports.resolve(text).locode == locode
+
+@pytest.mark.parametrize("text", ["Jebel Ali / Abu Dhabi", "Jebel Ali or Abu Dhabi", "Jebel Ali & Abu Dhabi"])
+def test_alternatives_are_left_unmatched(ports, text):
+    assert ports.resolve(text) is None
+
+def test_name_shared_by_two_ports_is_left_unmatched(ports):
+    assert ports.resolve("Manzanillo") is None
@@ -0,0 +1,122 @@
+import base64
+import random
+from typing import Any, Dict, List
+
+import pytest
+
+from app import processing
+from app.core.checkpoints import dead_letter_store
+from app.core.config import settings
+from app.services.submission import SubmissionResult
+from benchmarks.replay_fixtures import synthesize_fixture
+
+
+class FixtureGraphService:
+    """Serves one synthetic fixture the way GraphApiService returns it."""
+    def __init__(self, fixture: Dict[str, Any]):
+        self.fixture = fixture
+
+    def get_email_by_id(self, email_id: str) -> Dict[str, Any]:
+        return dict(self.fixture["message"])
+
+    def get_attachments(self, email_id: str) -> List[Dict[str, Any]]:
+        return [
+            {"name": att["name"], "content_type": att["contentType"], "content_bytes": base64.b64decode(att["contentBytes"])}
+            for att in self.fixture["attachments"]
+        ]
+
+
+@pytest.fixture
+def fixture_with_attachments() -> Dict[str, Any]:
+    rng = random.Random(1)
+    for index in range(100):
+        fixture = synthesize_fixture(index, rng)
+        if fixture["attachments"]:
+            return fixture
+    raise AssertionError("no synthetic fixture with attachments")
+
+@pytest.fixture
+def offline_job(monkeypatch, fixture_with_attachments):
+    """Graph, Gemini and the submission backend replaced; returns the submitted records."""
+    fixture = fixture_with_attachments
+    submitted: List[Any] = []
+    contexts: List[str] = []
+
+    def extract(full_context, email_id=None):
+        contexts.append(full_context)
+        return dict(fixture["gemini"]["response"])
+
+    def submit(data, prepared=None):
+        submitted.append(data)
+        return SubmissionResult(ok=True, message="submitted", backend="test", elapsed_ms=0.0)
+
+    monkeypatch.setattr(processing, "get_graph_service_sync", lambda mailbox=None: FixtureGraphService(fixture))
+    monkeypatch.setattr(processing, "get_structured_data_from_ai", extract)
+    monkeypatch.setattr(processing, "submit_qtc_record", submit)
+    monkeypatch.setattr(processing, "prepare_submission", lambda: None)
+    monkeypatch.setattr(processing, "release_submission", lambda prepared: None)
+    return fixture, submitted, contexts
+
+
+@pytest.mark.parametrize("tracing_enabled", [True, False])
+def test_email_with_attachment_is_submitted(monkeypatch, offline_job, tracing_enabled):
+    fixture, submitted, contexts = offline_job
+    monkeypatch.setattr(settings, "TRACING_ENABLED", tracing_enabled)
+    email_id = f"{fixture['id']}-{tracing_enabled}"
+
+    processing.process_email_job(email_id)
+
+    assert len(submitted) == 1
+    assert submitted[0].client_name == fixture["gemini"]["response"]["client_name"]
+    assert all(f"--- Attachment: {att['name']} ---" in contexts[0] for att in fixture["attachments"])
+    assert email_id not in {entry["email_id"] for entry in dead_letter_store.list()}
+
+def test_failed_submission_is_not_retried(monkeypatch, offline_job):
+    fixture, submitted, _ = offline_job
+    attempts: List[Any] = []
+
+    def submit(data, prepared=None):
+        attempts.append(data)
+        raise TimeoutError("no confirmation from QTC")
+
+    monkeypatch.setattr(processing, "submit_qtc_record", submit)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 4)
+    email_id = f"{fixture['id']}-submit"
+
+    processing.process_email_job(email_id)
+
+    assert len(attempts) == 1
+    record = dead_letter_store.get(email_id)
+    assert record is not None and record["stage"] == "submit"
+
+@pytest.fixture
+def conversations(monkeypatch, tmp_path):
+    from app.core.conversations import ConversationStore
+
+    store = ConversationStore(tmp_path / "conversations.sqlite3")
+    monkeypatch.setattr(settings, "CONVERSATIONS_ENABLED", True)
+    monkeypatch.setattr(processing, "get_conversation_store", lambda: store)
+    return store
+
+def test_follow_up_without_changes_is_not_submitted_again(monkeypatch, offline_job, conversations):
+    fixture, submitted, _ = offline_job
+    monkeypatch.setattr(processing, "get_structured_delta_from_ai", lambda form, message: dict(form))
+
+    processing.process_email_job(f"{fixture['id']}-first")
+    fixture["message"]["receivedDateTime"] = "2099-01-01T00:00:00Z"
+    processing.process_email_job(f"{fixture['id']}-thanks")
+
+    assert len(submitted) == 1
+    assert conversations.get(fixture["message"]["conversationId"])["email_id"] == f"{fixture['id']}-first"
+
+def test_failed_submission_is_not_remembered(monkeypatch, offline_job, conversations):
+    fixture, _, _ = offline_job
+
+    def submit(data, prepared=None):
+        raise TimeoutError("no confirmation from QTC")
+
+    monkeypatch.setattr(processing, "submit_qtc_record", submit)
+
+    processing.process_email_job(f"{fixture['id']}-unsubmitted")
+
+    assert conversations.get(fixture["message"]["conversationId"]) is None
@@ -0,0 +1,13 @@
+from app.core.config import settings
+from app.services.graph_api import notification_url
+from app.subscriptions import subscriptions_by_mailbox
+
+
+def test_bare_url_belongs_to_the_default_mailbox():
+    legacy = {"id": "legacy", "notificationUrl": settings.WEBHOOK_NOTIFICATION_URL}
+    current = {"id": "current", "notificationUrl": notification_url(settings.MAILBOX_UPN)}
+    other = {"id": "other", "notificationUrl": "https://elsewhere.example.com/webhook"}
+
+    found = subscriptions_by_mailbox([legacy, current, other])
+
+    assert [sub["id"] for sub in found[settings.MAILBOX_UPN]] == ["legacy", "current"]